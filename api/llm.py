@@ -0,0 +1,107 @@
+import asyncio
+import json
+import time
+from collections import deque
+import numpy as np
+import aiohttp
+class LLMError(RuntimeError):
+    pass
+class OllamaClient:
+    def __init__(self, base_url="http://localhost:11434", model="llama3.2:latest", max_concurrency=2,
+                 pool_size=8, connect_timeout=5.0, read_timeout=120.0, stats_window=256):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+        self._session = None
+        self._semaphore = None
+        self.active = 0
+        self.waiting = 0
+        self.requests = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.errors = 0
+        self._ttft_ms = deque(maxlen=stats_window)
+        self._tokens_per_s = deque(maxlen=stats_window)
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+    async def generate_stream(self, prompt, options=None, model=None):
+        await self.start()
+        self.requests += 1
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        t0 = time.perf_counter()
+        first_token_at = None
+        tokens = 0
+        try:
+            payload = {"model": model or self.model, "prompt": prompt, "stream": True, "options": options or {}}
+            async with self._session.post(f"{self.base_url}/api/generate", json=payload) as resp:
+                if resp.status != 200:
+                    raise LLMError(f"Ollama returned {resp.status}: {(await resp.text())[:200]}")
+                try:
+                    async for line in resp.content:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            chunk = json.loads(line)
+                        except ValueError:
+                            continue
+                        if chunk.get("error"):
+                            raise LLMError(chunk["error"])
+                        token = chunk.get("response", "")
+                        if token:
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                                self._ttft_ms.append((first_token_at - t0) * 1000)
+                            tokens += 1
+                            yield token
+                        if chunk.get("done"):
+                            break
+                except (asyncio.CancelledError, GeneratorExit):
+                    resp.close()
+                    self.cancelled += 1
+                    raise
+            self.completed += 1
+            if first_token_at is not None and tokens > 1:
+                elapsed = time.perf_counter() - first_token_at
+                if elapsed > 0:
+                    self._tokens_per_s.append((tokens - 1) / elapsed)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.errors += 1
+            raise LLMError(f"Ollama request failed: {e}") from e
+        except LLMError:
+            self.errors += 1
+            raise
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+    def get_stats(self):
+        ttft = np.array(self._ttft_ms) if self._ttft_ms else np.zeros(1)
+        tps = np.array(self._tokens_per_s) if self._tokens_per_s else np.zeros(1)
+        return {
+            "model": self.model,
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "errors": self.errors,
+            "ttft_p50_ms": float(np.percentile(ttft, 50)),
+            "ttft_p99_ms": float(np.percentile(ttft, 99)),
+            "tokens_per_s_avg": float(np.mean(tps)),
+        }
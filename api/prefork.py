@@ -0,0 +1,81 @@
+import os
+import gc
+import sys
+import signal
+import socket
+import argparse
+from pathlib import Path
+os.environ.setdefault("INDEX_MMAP", "1")
+sys.path.append(str(Path(__file__).parent.parent))
+import uvicorn
+from api import server
+def bind(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+def serve_child(sock, args):
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(server.app, log_level=args.log_level, timeout_graceful_shutdown=args.graceful_timeout)
+    uvicorn.Server(config).run(sockets=[sock])
+def main():
+    parser = argparse.ArgumentParser(description="Pre-forking server: load the index once, fork N workers that share it.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="warning")
+    parser.add_argument("--graceful-timeout", type=int, default=10)
+    args = parser.parse_args()
+    if not hasattr(os, "fork"):
+        sys.exit("api.prefork needs fork(); use `uvicorn api.server:app --workers N` on this platform")
+    # Every child sizes its own search pool: split the CPUs instead of giving
+    # each child all of them. Explicit SEARCH_WORKERS is taken as per-child.
+    if "SEARCH_WORKERS" not in os.environ:
+        server.SEARCH_WORKERS = max(1, (os.cpu_count() or 1) // max(1, args.workers))
+        if "ADMISSION_CONCURRENCY" not in os.environ:
+            server.ADMISSION_CONCURRENCY = server.SEARCH_WORKERS * 4
+    print(f"\n🚀 PRE-LOADING INDEX FOR {args.workers} WORKERS...")
+    server.preload()
+    # Move everything loaded so far out of the GC's reach: collections in the
+    # children would otherwise touch (and copy) every preloaded object's page.
+    gc.collect()
+    gc.freeze()
+    sock = bind(args.host, args.port)
+    children = set()
+    stopping = False
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                serve_child(sock, args)
+            finally:
+                os._exit(0)
+        children.add(pid)
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(args.workers):
+        spawn()
+    print(f"✅ Serving on {args.host}:{args.port} with {args.workers} workers (parent {os.getpid()}: {sorted(children)})")
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"⚠️ Worker {pid} exited with status {status}, restarting")
+            spawn()
+    sock.close()
+if __name__ == "__main__":
+    main()
@@ -1,178 +1,490 @@
+import os
 import time
+import struct
+import asyncio
 import numpy as np
 import sys
-import json
 from pathlib import Path
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-import requests
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 sys.path.append(str(Path(__file__).parent.parent))
-from minivector.binary_engine import BinaryIndex
+from minivector.binary_engine import BinaryIndex, pack_codes
 from minivector.embedder import Embedder
-state = {"embedder": None, "engine": None, "metadata": [], "cache": None}
-class QueryCache:
-    def __init__(self, max_size=1000, similarity_threshold=0.95):
-        self.cache = []
-        self.max_size = max_size
-        self.similarity_threshold = similarity_threshold
-        self.hits = 0
-        self.misses = 0
-    def _cosine_similarity(self, vec1, vec2):
-        dot = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-        return dot / (norm1 * norm2 + 1e-10)
-    def lookup(self, query_vec):
-        for cached_vec, cached_results, _ in self.cache:
-            similarity = self._cosine_similarity(query_vec, cached_vec)
-            if similarity >= self.similarity_threshold:
-                self.hits += 1
-                return cached_results
-        self.misses += 1
-        return None
-    def store(self, query_vec, results):
-        if len(self.cache) >= self.max_size:
-            self.cache.pop(0)
-        self.cache.append((query_vec.copy(), results, time.time()))
-    def get_stats(self):
-        total = self.hits + self.misses
-        hit_rate = (self.hits / total * 100) if total > 0 else 0
-        return {
-            "hits": self.hits,
-            "misses": self.misses,
-            "hit_rate": f"{hit_rate:.1f}%",
-            "cache_size": len(self.cache)
-        }
+from minivector.batching import EmbeddingBatcher
+from minivector.cache import AnswerCache, EmbeddingCache, QueryCache, normalize_text
+from minivector.singleflight import SingleFlight, StreamSingleFlight
+from minivector.executor import ComputeExecutor, ExecutorSaturated
+from minivector.graph import CitationGraph
+from minivector.passages import PassageIndex
+from minivector.columnar import ColumnarMetadata
+from minivector.lexical import LexicalIndex, corpus_fingerprint, reciprocal_rank_fusion
+from minivector.encoding import render
+from minivector.metrics import CONTENT_TYPE, REGISTRY, STAGE_LATENCY, MetricsMiddleware
+from minivector.admission import CACHE_ONLY, NORMAL, AdmissionController, Deadline, DeadlineExceeded, LoadShed, Overloaded
+from minivector.reload import IndexReloader
+from minivector.sessions import ResultSessions, SessionExpired, cursor_replay
+from minivector.wire import MAX_K
+from api.llm import OllamaClient
+VECTORS_PATH = Path(os.getenv("VECTORS_PATH", "data/processed/vectors.npy"))
+METADATA_PATH = Path(os.getenv("METADATA_PATH", "data/processed/metadata.json"))
+METADATA_COLUMNAR = Path(os.getenv("METADATA_COLUMNAR", "data/processed/metadata_columnar"))
+INDEX_MMAP = os.getenv("INDEX_MMAP", "0") != "0"
+INDEX_WATCH_S = float(os.getenv("INDEX_WATCH_S", "0"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "2.0"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "10000"))
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR") or None
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1000"))
+QUERY_CACHE_TTL_S = float(os.getenv("QUERY_CACHE_TTL_S", "0")) or None
+QUERY_CACHE_MAX_MB = float(os.getenv("QUERY_CACHE_MAX_MB", "64"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+SEARCH_EXECUTOR = os.getenv("SEARCH_EXECUTOR", "thread")
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", str(os.cpu_count() or 1)))
+SEARCH_QUEUE = int(os.getenv("SEARCH_QUEUE", "64"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+GRAPH_DIR = Path(os.getenv("GRAPH_DIR", "data/processed/citation_graph"))
+GRAPH_JSON = Path("data/processed/citation_graph.json")
+GRAPH_MAX_DEPTH = int(os.getenv("GRAPH_MAX_DEPTH", "3"))
+GRAPH_MAX_NODES = int(os.getenv("GRAPH_MAX_NODES", "200"))
+PASSAGES_DIR = Path(os.getenv("PASSAGES_DIR", "data/processed/passages"))
+LEXICAL_DIR = Path(os.getenv("LEXICAL_DIR", "data/processed/lexical"))
+LEXICAL_CANDIDATES = int(os.getenv("LEXICAL_CANDIDATES", "200"))
+RRF_DEPTH = int(os.getenv("RRF_DEPTH", "100"))
+RRF_K = float(os.getenv("RRF_K", "60"))
+RETRIEVAL_METHODS = {"lexical": "BM25", "rerank": "BM25 + Hamming Rerank", "rrf": "Reciprocal Rank Fusion"}
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "250"))
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "256"))
+SESSION_RESULTS = int(os.getenv("SESSION_RESULTS", "1000"))
+SESSION_TTL_S = float(os.getenv("SESSION_TTL_S", "300"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))
+SEARCH_TIMEOUT_MS = float(os.getenv("SEARCH_TIMEOUT_MS", "2000"))
+ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", str(SEARCH_WORKERS * 4)))
+ADMISSION_QUEUE = int(os.getenv("ADMISSION_QUEUE", "128"))
+DEGRADE_AT = float(os.getenv("DEGRADE_AT", "0.5"))
+CACHE_ONLY_AT = float(os.getenv("CACHE_ONLY_AT", "0.9"))
+DEGRADED_MAX_K = int(os.getenv("DEGRADED_MAX_K", "10"))
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:latest")
+OLLAMA_OPTIONS = {"temperature": 0.7, "num_predict": 200}
+OLLAMA_CONCURRENCY = int(os.getenv("OLLAMA_CONCURRENCY", "2"))
+state = {"embedder": None, "batcher": None, "text_cache": None, "engine": None, "metadata": [], "cache": None, "search_flights": None, "answers": None, "chat_flights": None, "embed_executor": None, "search_executor": None, "admission": None, "graph": None, "passages": None, "lexical": None, "bundle": None, "llm": None, "reloader": None, "sessions": None}
+PRELOADED = {}
+def doc_ids(metadata):
+    if isinstance(metadata, ColumnarMetadata): return metadata.column(metadata.id_field)
+    return [doc.get("id") for doc in metadata]
+def load_graph(metadata):
+    if (GRAPH_DIR / "offsets.npy").exists():
+        return CitationGraph.load(GRAPH_DIR)
+    if GRAPH_JSON.exists():
+        print("⚠️ Binary citation graph missing, building CSR from JSON. Run scripts/build_citation_graph.py")
+        return CitationGraph.from_json(GRAPH_JSON, ids=doc_ids(metadata))
+    return None
+def load_bundle():
+    metadata_path = METADATA_PATH
+    if (METADATA_COLUMNAR / "columns.json").exists():
+        if not METADATA_PATH.exists() or ColumnarMetadata.is_current(METADATA_COLUMNAR, METADATA_PATH):
+            metadata_path = METADATA_COLUMNAR
+        else:
+            print(f"⚠️ {METADATA_COLUMNAR} was not built from the current {METADATA_PATH}. Serving {METADATA_PATH}; run scripts/build_columnar.py")
+    engine = BinaryIndex()
+    engine.load(str(VECTORS_PATH), str(metadata_path), mmap=INDEX_MMAP)
+    if engine.vectors.shape[0] != len(engine.metadata):
+        raise ValueError(f"{VECTORS_PATH} has {engine.vectors.shape[0]} rows but {metadata_path} has {len(engine.metadata)} entries")
+    passages = PassageIndex.load(PASSAGES_DIR) if (PASSAGES_DIR / "ids.json").exists() else None
+    lexical = LexicalIndex.load(LEXICAL_DIR) if (LEXICAL_DIR / "lexical.json").exists() else None
+    if lexical is not None and lexical.fingerprint != corpus_fingerprint(doc_ids(engine.metadata)):
+        print(f"⚠️ Lexical index ({lexical.num_docs} docs) was not built from the current metadata ({len(engine.metadata)} docs). Lexical search disabled; run scripts/build_lexical.py")
+        lexical = None
+    return {"engine": engine, "metadata": engine.metadata, "graph": load_graph(engine.metadata), "passages": passages, "lexical": lexical}
+def _init_search_child():
+    bundle = load_bundle()
+    state.update(bundle)
+    state["bundle"] = bundle
+def preload():
+    PRELOADED["embedder"] = Embedder()
+    if VECTORS_PATH.exists():
+        bundle = load_bundle()
+        bundle["engine"].warmup()
+        PRELOADED["bundle"] = bundle
+def swap_bundle(bundle):
+    old = {key: state[key] for key in bundle}
+    state.update(bundle)
+    state["bundle"] = bundle
+    state["cache"].invalidate()
+    state["answers"].invalidate()
+    state["sessions"].clear()
+    if state["search_executor"] is not None and state["search_executor"].kind == "process":
+        state["search_executor"].recycle()
+    return old
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("\n🚀 INITIALIZING SERVER...")
-    state["embedder"] = Embedder()
+    state["embedder"] = PRELOADED.get("embedder") or Embedder()
+    state["embed_executor"] = ComputeExecutor("embed", max_workers=EMBED_WORKERS, max_queue=SEARCH_QUEUE)
+    state["text_cache"] = EmbeddingCache(dim=state["embedder"].dim, model_name=state["embedder"].model_name, max_entries=EMBED_CACHE_SIZE, path=EMBED_CACHE_DIR)
+    state["batcher"] = EmbeddingBatcher(state["embedder"], max_batch_size=EMBED_BATCH_SIZE, max_wait_ms=EMBED_BATCH_WAIT_MS, executor=state["embed_executor"].pool, cache=state["text_cache"])
     state["engine"] = BinaryIndex()
-    state["cache"] = QueryCache()
-    try:
-        if not Path("data/processed/vectors.npy").exists():
-            print("⚠️ Data missing. Run process_data.py")
+    state["search_flights"] = SingleFlight()
+    state["answers"] = AnswerCache(max_size=ANSWER_CACHE_SIZE)
+    state["chat_flights"] = StreamSingleFlight()
+    state["llm"] = await OllamaClient(OLLAMA_URL, OLLAMA_MODEL, max_concurrency=OLLAMA_CONCURRENCY).start()
+    state["cache"] = QueryCache(max_size=QUERY_CACHE_SIZE, ttl_s=QUERY_CACHE_TTL_S, max_bytes=int(QUERY_CACHE_MAX_MB * 1024 * 1024))
+    state["sessions"] = ResultSessions(max_sessions=SESSION_MAX, ttl_s=SESSION_TTL_S)
+    state["reloader"] = IndexReloader("index", load=load_bundle, swap=swap_bundle, paths=[VECTORS_PATH, METADATA_PATH, METADATA_COLUMNAR / "columns.json", LEXICAL_DIR / "lexical.json"], warmup=lambda b: b["engine"].warmup(), size_of=lambda b: b["engine"].get_stats()["bytes"], handle=lambda b: b["engine"])
+    if "bundle" in PRELOADED:
+        state["reloader"].adopt(PRELOADED.pop("bundle"))
+        print(f"✅ WORKER {os.getpid()} READY. Attached to {len(state['metadata'])} preloaded docs.")
+    elif not VECTORS_PATH.exists():
+        print("⚠️ Data missing. Run process_data.py")
+    else:
+        report = await state["reloader"].reload(force=True)
+        if report["status"] == "failed":
+            print(f"❌ ERROR: {report['error']}")
         else:
-            state["engine"].load("data/processed/vectors.npy", "data/processed/metadata.json")
-            state["metadata"] = state["engine"].metadata
             print(f"✅ SYSTEM READY. Loaded {len(state['metadata'])} docs.")
-    except Exception as e:
-        print(f"❌ ERROR: {e}")
+    if INDEX_WATCH_S > 0:
+        state["reloader"].start_watching(INDEX_WATCH_S)
+    state["search_executor"] = ComputeExecutor("search", max_workers=SEARCH_WORKERS, max_queue=SEARCH_QUEUE, kind=SEARCH_EXECUTOR,
+                                               initializer=_init_search_child if VECTORS_PATH.exists() else None)
+    state["admission"] = AdmissionController("search", max_concurrency=ADMISSION_CONCURRENCY, max_queue=ADMISSION_QUEUE, reduce_at=DEGRADE_AT, cache_only_at=CACHE_ONLY_AT)
     yield
+    await state["reloader"].stop()
+    await state["batcher"].close()
+    state["search_executor"].shutdown()
+    state["embed_executor"].shutdown()
+    await state["llm"].close()
 app = FastAPI(lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(MetricsMiddleware)
+def stats_of(key):
+    return lambda: state[key].get_stats() if state[key] is not None else None
+REGISTRY.register_stats("index", stats_of("engine"), counters=["search_count"])
+REGISTRY.register_stats("query_cache", stats_of("cache"), counters=["hits", "misses", "evictions", "expirations"])
+REGISTRY.register_stats("search_flights", stats_of("search_flights"), counters=["started", "coalesced"])
+REGISTRY.register_stats("answer_cache", stats_of("answers"), counters=["hits", "near_duplicate_hits", "misses"])
+REGISTRY.register_stats("text_cache", stats_of("text_cache"), counters=["hits", "disk_hits", "misses"])
+REGISTRY.register_stats("embed_batcher", stats_of("batcher"), counters=["batches", "items"])
+REGISTRY.register_stats("executor", stats_of("embed_executor"), counters=["submitted", "completed", "rejected", "failed"], labels={"executor": "embed"})
+REGISTRY.register_stats("executor", stats_of("search_executor"), counters=["submitted", "completed", "rejected", "failed"], labels={"executor": "search"})
+REGISTRY.register_stats("admission", stats_of("admission"), counters=["admitted", "rejected", "shed", "degraded"])
+REGISTRY.register_stats("llm", stats_of("llm"), counters=["requests", "completed", "cancelled", "errors"])
+REGISTRY.register_stats("graph", stats_of("graph"))
+REGISTRY.register_stats("result_sessions", stats_of("sessions"), counters=["created", "pages", "expired", "evictions", "restored"])
+REGISTRY.register_stats("reload", stats_of("reloader"), counters=["reloads", "failures", "released"])
+REGISTRY.register_stats("lexical", stats_of("lexical"), counters=["search_count"])
+REGISTRY.register_stats("passages", stats_of("passages"))
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc):
+    return JSONResponse({"detail": str(exc)}, status_code=429, headers={"Retry-After": "1"})
+@app.exception_handler(LoadShed)
+async def load_shed_handler(request, exc):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "1"})
 class SearchRequest(BaseModel):
     query: str
-    k: int = 10
+    k: int = Field(10, ge=1, le=MAX_K)
+    timeout_ms: Optional[float] = None
+    paginate: bool = False
+    retrieval: Literal["vector", "lexical", "rerank", "rrf"] = "vector"
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    k: int = Field(10, ge=1, le=MAX_K)
+    timeout_ms: Optional[float] = None
+def request_deadline(timeout_ms):
+    return Deadline(timeout_ms if timeout_ms is not None else SEARCH_TIMEOUT_MS)
 class ChatRequest(BaseModel):
     paper_id: str
     message: str
-def optimize_context(abstract, query):
-    return abstract[:1000]
+def respond(request, payload, table_key="results"):
+    body, media_type = render(payload, request.headers.get("accept"), table_key)
+    return Response(body, media_type=media_type)
+def _search_job(q_vec, k, deadline=None):
+    engine = state["engine"]
+    if deadline is not None: deadline.check("search")
+    return engine.search(q_vec, k=k)
+def _search_batch_job(q_vecs, k, deadline=None):
+    engine = state["engine"]
+    if deadline is not None: deadline.check("search")
+    return engine.search_batch(q_vecs, k=k)
+def _search_session_job(q_code, n, k, deadline=None):
+    engine = state["engine"]
+    if deadline is not None: deadline.check("search")
+    indices, distances = engine.search_packed(q_code, min(n, engine.num_vectors))
+    return engine.format_results(indices[0][:k], distances[0][:k]), indices[0], distances[0]
+# A session's cursor carries its index version, depth and packed query, so any
+# process serving the same files can recompute the list (prefork, --workers).
+SESSION_REPLAY = struct.Struct("<8sI")
+def session_replay(version, n, q_code):
+    return SESSION_REPLAY.pack(bytes.fromhex(version), n) + q_code.tobytes()
+def _hybrid_job(retrieval, query, q_vec, k, deadline=None):
+    # One snapshot: rows from the lexical index are only valid for its own engine
+    bundle = state["bundle"]
+    engine, lexical = bundle["engine"], bundle["lexical"]
+    if lexical is None: return None
+    if deadline is not None: deadline.check("search")
+    if retrieval == "lexical":
+        rows, scores = lexical.search(query, k)
+        return engine.format_results(rows, None, scores)
+    if retrieval == "rerank":
+        rows, _ = lexical.search(query, LEXICAL_CANDIDATES)
+        if len(rows) == 0: return engine.search(q_vec, k=k)
+        distances = engine.rescore(q_vec, rows)
+        order = np.argsort(distances, kind="stable")[:k]
+        return engine.format_results(rows[order], distances[order])
+    lex_rows, _ = lexical.search(query, RRF_DEPTH)
+    vec_rows, _ = engine.search_raw(q_vec, min(RRF_DEPTH, engine.num_vectors))
+    rows, scores = reciprocal_rank_fusion([vec_rows[0], lex_rows], k=k, rrf_k=RRF_K)
+    return engine.format_results(rows, None, scores)
+def check_admin(request):
+    if ADMIN_TOKEN is not None and request.headers.get("x-admin-token") != ADMIN_TOKEN: raise HTTPException(403, "Admin token required")
+def optimize_context(abstract, query, paper_id=None, query_vec=None):
+    if state["passages"] is not None and paper_id is not None and query_vec is not None:
+        context = state["passages"].select(paper_id, query_vec, token_budget=CONTEXT_TOKEN_BUDGET)
+        if context: return context
+    return abstract[:CONTEXT_TOKEN_BUDGET * 4]
 @app.post("/search")
-async def search(req: SearchRequest):
+async def search(req: SearchRequest, request: Request):
+    if state["engine"].vectors is None: raise HTTPException(500, "Index not loaded")
+    t0 = time.time()
+    deadline = request_deadline(req.timeout_ms)
+    async with state["admission"].admit(deadline) as mode:
+        k = req.k if mode == NORMAL else min(req.k, DEGRADED_MAX_K)
+        if req.retrieval != "vector":
+            if req.paginate: raise HTTPException(400, "paginate is only supported with retrieval='vector'")
+            return await search_hybrid(req, request, k, mode, deadline, t0)
+        if req.paginate:
+            return await search_session(req, request, k, mode, deadline, t0)
+        generation = state["cache"].generation
+        # Shared by every caller of the same key: no per-request deadline checks in
+        # here; each caller bounds its own wait below.
+        async def compute():
+            with STAGE_LATENCY.time(stage="embed"):
+                q_vec = await state["batcher"].embed_query(req.query)
+            with STAGE_LATENCY.time(stage="cache_lookup"):
+                cached_results = state["cache"].lookup(q_vec, k)
+            if cached_results is not None:
+                return cached_results, True, 0.0
+            if mode == CACHE_ONLY:
+                raise LoadShed("Overloaded: serving cached results only")
+            with STAGE_LATENCY.time(stage="search"):
+                results, queue_ms = await state["search_executor"].run_timed(_search_job, q_vec, k)
+            state["cache"].store(q_vec, results, k, generation)
+            return results, False, queue_ms
+        key = (normalize_text(req.query, state["text_cache"].lowercase), k, mode == CACHE_ONLY, generation)
+        deadline.check("embedding")
+        try:
+            (results, cache_hit, queue_ms), coalesced = await asyncio.wait_for(state["search_flights"].do(key, compute), deadline.remaining_s())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"deadline of {deadline.timeout_ms:.0f}ms exceeded while waiting for search")
+        except ExecutorSaturated:
+            raise HTTPException(503, "Search queue full")
+    t_took = (time.time() - t0) * 1000
+    if cache_hit:
+        return respond(request, {"results": results, "took_ms": t_took, "method": "Cached", "cache_hit": True, "coalesced": coalesced, "mode": mode})
+    return respond(request, {"results": results, "took_ms": t_took, "queue_ms": queue_ms, "method": "Binary Quantization", "cache_hit": False, "coalesced": coalesced, "mode": mode})
+async def search_session(req, request, k, mode, deadline, t0):
+    deadline.check("embedding")
+    with STAGE_LATENCY.time(stage="embed"):
+        q_vec = await state["batcher"].embed_query(req.query)
+    if mode == CACHE_ONLY:
+        raise LoadShed("Overloaded: serving cached results only")
+    generation, version = state["reloader"].generation, state["reloader"].version
+    q_code, n = pack_codes(q_vec), max(k, SESSION_RESULTS)
+    deadline.check("search")
+    try:
+        with STAGE_LATENCY.time(stage="search"):
+            (results, rows, distances), queue_ms = await state["search_executor"].run_timed(_search_session_job, q_code, n, k, deadline)
+    except ExecutorSaturated:
+        raise HTTPException(503, "Search queue full")
+    cursor = state["sessions"].create(rows, distances, len(results), session_replay(version, n, q_code)) if generation == state["reloader"].generation else None
+    t_took = (time.time() - t0) * 1000
+    return respond(request, {"results": results, "took_ms": t_took, "queue_ms": queue_ms, "method": "Binary Quantization", "cache_hit": False, "coalesced": False, "mode": mode, "cursor": cursor, "total": len(rows)})
+async def search_hybrid(req, request, k, mode, deadline, t0):
+    if state["lexical"] is None: raise HTTPException(400, "Lexical index not built. Run scripts/build_lexical.py")
+    if mode == CACHE_ONLY:
+        raise LoadShed("Overloaded: serving cached results only")
+    async def compute():
+        q_vec = None
+        if req.retrieval != "lexical":
+            with STAGE_LATENCY.time(stage="embed"):
+                q_vec = await state["batcher"].embed_query(req.query)
+        with STAGE_LATENCY.time(stage=req.retrieval):
+            results, queue_ms = await state["search_executor"].run_timed(_hybrid_job, req.retrieval, req.query, q_vec, k)
+        # Counted here: the job may have run on another process's copy of the index
+        if results is not None and state["lexical"] is not None: state["lexical"].search_count += 1
+        return results, queue_ms
+    key = (req.retrieval, normalize_text(req.query, state["text_cache"].lowercase), k, state["cache"].generation)
+    deadline.check("search")
+    try:
+        (results, queue_ms), coalesced = await asyncio.wait_for(state["search_flights"].do(key, compute), deadline.remaining_s())
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"deadline of {deadline.timeout_ms:.0f}ms exceeded while waiting for search")
+    except ExecutorSaturated:
+        raise HTTPException(503, "Search queue full")
+    if results is None: raise HTTPException(400, "Lexical index not built. Run scripts/build_lexical.py")
+    t_took = (time.time() - t0) * 1000
+    return respond(request, {"results": results, "took_ms": t_took, "queue_ms": queue_ms, "method": RETRIEVAL_METHODS[req.retrieval], "cache_hit": False, "coalesced": coalesced, "mode": mode})
+async def replay_session(cursor, expired):
+    # Session created by another process, or evicted here: recompute it from the
+    # cursor if it was made on the index this process is serving now
+    try:
+        replay = cursor_replay(cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    version = state["reloader"].version
+    if replay is None or len(replay) < SESSION_REPLAY.size or replay[:8] != bytes.fromhex(version):
+        raise HTTPException(410, expired)
+    _, n = SESSION_REPLAY.unpack_from(replay)
+    q_code = np.frombuffer(replay, dtype=np.uint8, offset=SESSION_REPLAY.size).reshape(1, -1)
+    if q_code.shape[1] != state["engine"].bytes_per_vector: raise HTTPException(400, f"malformed cursor: {cursor!r}")
+    deadline = request_deadline(None)
+    async with state["admission"].admit(deadline):
+        try:
+            (_, rows, distances), _ = await state["search_executor"].run_timed(_search_session_job, q_code, n, 0, deadline)
+        except ExecutorSaturated:
+            raise HTTPException(503, "Search queue full")
+    if version != state["reloader"].version: raise HTTPException(410, expired)
+    state["sessions"].restore(cursor, rows, distances)
+@app.get("/search/page")
+async def search_page(cursor: str, request: Request, limit: int = 10):
+    t0 = time.time()
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    try:
+        rows, distances, next_cursor, total = state["sessions"].page(cursor, limit)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except SessionExpired as e:
+        await replay_session(cursor, e.args[0])
+        rows, distances, next_cursor, total = state["sessions"].page(cursor, limit)
+    results = state["engine"].format_results(rows, distances)
+    return respond(request, {"results": results, "took_ms": (time.time() - t0) * 1000, "method": "Result Session", "cursor": next_cursor, "total": total})
+@app.post("/search/batch")
+async def search_batch(req: BatchSearchRequest, request: Request):
     if state["engine"].vectors is None: raise HTTPException(500, "Index not loaded")
+    if len(req.queries) > MAX_BATCH_QUERIES: raise HTTPException(413, f"At most {MAX_BATCH_QUERIES} queries per batch")
     t0 = time.time()
-    q_vec = state["embedder"].embed_query(req.query)
-    cached_results = state["cache"].lookup(q_vec)
-    if cached_results is not None:
-        t_took = (time.time() - t0) * 1000
-        print(f"⚡ CACHE HIT! Latency: {t_took:.2f}ms")
-        return {"results": cached_results, "took_ms": t_took, "method": "Cached", "cache_hit": True}
-    results = state["engine"].search(q_vec, k=req.k)
-    state["cache"].store(q_vec, results)
+    if not req.queries: return respond(request, {"results": [], "took_ms": 0.0, "cache_hits": 0})
+    deadline = request_deadline(req.timeout_ms)
+    async with state["admission"].admit(deadline) as mode:
+        k = req.k if mode == NORMAL else min(req.k, DEGRADED_MAX_K)
+        generation = state["cache"].generation
+        deadline.check("embedding")
+        with STAGE_LATENCY.time(stage="embed"):
+            q_vecs = await state["batcher"].embed(req.queries)
+        with STAGE_LATENCY.time(stage="cache_lookup"):
+            results = [state["cache"].lookup(v, k) for v in q_vecs]
+        hits = [r is not None for r in results]
+        misses = [i for i, hit in enumerate(hits) if not hit]
+        queue_ms = 0.0
+        if misses:
+            if mode == CACHE_ONLY:
+                raise LoadShed("Overloaded: serving cached results only")
+            deadline.check("search")
+            try:
+                with STAGE_LATENCY.time(stage="search_batch"):
+                    found, queue_ms = await state["search_executor"].run_timed(_search_batch_job, q_vecs[misses], k, deadline)
+            except ExecutorSaturated:
+                raise HTTPException(503, "Search queue full")
+            for i, res in zip(misses, found):
+                results[i] = res
+                state["cache"].store(q_vecs[i], res, k, generation)
     t_took = (time.time() - t0) * 1000
-    print(f"⏱️ End-to-end latency: {t_took:.2f}ms")
-    return {"results": results, "took_ms": t_took, "method": "Binary Quantization", "cache_hit": False}
+    return respond(request, {
+        "results": [{"query": q, "results": r, "cache_hit": hit} for q, r, hit in zip(req.queries, results, hits)],
+        "took_ms": t_took,
+        "queue_ms": queue_ms,
+        "cache_hits": sum(hits),
+        "mode": mode,
+    })
 @app.post("/chat")
 async def chat(req: ChatRequest):
-    paper = next((p for p in state["metadata"] if p['id'] == req.paper_id), None)
+    paper = state["engine"].get_document(req.paper_id)
     if not paper: raise HTTPException(404, "Not found")
-    query_vec = state["embedder"].embed_query(req.message)
-    cached_response = state["cache"].lookup(query_vec)
+    query_vec = await state["batcher"].embed_query(req.message)
+    cached_response = state["answers"].lookup(req.paper_id, req.message, OLLAMA_MODEL, OLLAMA_OPTIONS, question_vec=query_vec)
     if cached_response:
         def cached_stream():
             yield cached_response + " (Cached ⚡)"
         return StreamingResponse(cached_stream(), media_type="text/plain")
     abstract = paper.get('abstract') or paper.get('text') or ""
-    context = optimize_context(abstract, req.message)
-    print(f"🤖 Chat request for: {paper['title'][:50]}...")
+    context = optimize_context(abstract, req.message, paper_id=req.paper_id, query_vec=query_vec)
     prompt = f"""You are an AI research assistant analyzing the paper titled "{paper['title']}".
 Paper Abstract:
 {context}
 User Question: {req.message}
 Provide a concise, helpful answer based on the paper's content."""
-    def stream_generator():
+    async def produce():
         full_response = ""
         try:
-            print("🔄 Calling Ollama (Streaming)...")
-            with requests.post(
-                "http://localhost:11434/api/generate",
-                json={
-                    "model": "llama3.2:latest",
-                    "prompt": prompt,
-                    "stream": True,
-                    "options": {
-                        "temperature": 0.7,
-                        "num_predict": 200
-                    }
-                },
-                stream=True,
-                timeout=120
-            ) as r:
-                for line in r.iter_lines():
-                    if line:
-                        try:
-                            chunk = json.loads(line.decode('utf-8'))
-                            token = chunk.get("response", "")
-                            if token:
-                                full_response += token
-                                yield token
-                        except:
-                            pass
+            async for token in state["llm"].generate_stream(prompt, OLLAMA_OPTIONS):
+                full_response += token
+                yield token
             if full_response:
-                state["cache"].store(query_vec, full_response)
-                print(f"✅ Stream complete. Cached {len(full_response)} chars.")
+                state["answers"].store(req.paper_id, req.message, OLLAMA_MODEL, OLLAMA_OPTIONS, full_response, question_vec=query_vec)
         except Exception as e:
             print(f"❌ Stream error: {e}")
             yield f"Error: {str(e)}"
-    return StreamingResponse(stream_generator(), media_type="text/plain")
+    key = AnswerCache.key(req.paper_id, req.message, OLLAMA_MODEL, OLLAMA_OPTIONS)
+    return StreamingResponse(state["chat_flights"].subscribe(key, produce), media_type="text/plain")
 @app.get("/article/{doc_id}")
 async def get_article(doc_id: str):
-    doc = next((d for d in state["metadata"] if d['id'] == doc_id), None)
+    doc = state["engine"].get_document(doc_id)
     if doc: return doc
     raise HTTPException(404, "Not found")
 @app.get("/graph/{doc_id}")
-async def get_graph(doc_id: str):
-    path = Path("data/processed/citation_graph.json")
-    if not path.exists(): return {"nodes": [], "edges": []}
-    with open(path) as f: full = json.load(f)
-    queue = [(doc_id, 0)]; visited = set(); nodes = []; edges = []
-    added_ids = set()
-    while queue:
-        curr, depth = queue.pop(0)
-        if curr in visited or depth > 1: continue
-        visited.add(curr)
-        if curr not in added_ids:
-            doc = next((d for d in state["metadata"] if d['id'] == curr), None)
-            if doc:
-                nodes.append({"id": curr, "label": doc['title'], "isCenter": curr == doc_id})
-                added_ids.add(curr)
-        for n_id in full.get(curr, []):
-             n_doc = next((d for d in state["metadata"] if d['id'] == n_id), None)
-             if n_doc:
-                 edges.append({"source": curr, "target": n_id})
-                 if n_id not in added_ids:
-                    nodes.append({"id": n_id, "label": n_doc['title'], "isCenter": False})
-                    added_ids.add(n_id)
-                 if n_id not in visited: queue.append((n_id, depth+1))
+async def get_graph(doc_id: str, depth: int = 1, max_nodes: int = GRAPH_MAX_NODES):
+    graph = state["graph"]
+    if graph is None: return {"nodes": [], "edges": []}
+    row = graph.row_of(doc_id)
+    if row is None:
+        doc = state["engine"].get_document(doc_id)
+        return {"nodes": [{"id": doc_id, "label": doc['title'], "isCenter": True}] if doc else [], "edges": []}
+    rows, src, dst = graph.neighborhood(row, depth=max(0, min(depth, GRAPH_MAX_DEPTH)), max_nodes=max(1, min(max_nodes, GRAPH_MAX_NODES)))
+    ids = graph.ids
+    node_ids = [ids[r] for r in rows.tolist()]
+    nodes = []
+    present = set()
+    for n_id, doc in zip(node_ids, state["engine"].get_documents(node_ids)):
+        if doc:
+            nodes.append({"id": n_id, "label": doc['title'], "isCenter": n_id == doc_id})
+            present.add(n_id)
+    edges = [{"source": ids[a], "target": ids[b]} for a, b in zip(src.tolist(), dst.tolist()) if ids[a] in present and ids[b] in present]
     return {"nodes": nodes, "edges": edges}
 @app.get("/cache/stats")
 async def get_cache_stats():
-    return state["cache"].get_stats()
+    return {**state["cache"].get_stats(), "searches": state["search_flights"].get_stats(), "sessions": state["sessions"].get_stats(), "answers": {**state["answers"].get_stats(), **state["chat_flights"].get_stats()}}
+@app.get("/embedder/stats")
+async def get_embedder_stats():
+    return {**state["batcher"].get_stats(), "text_cache": state["text_cache"].get_stats()}
+@app.get("/llm/stats")
+async def get_llm_stats():
+    return state["llm"].get_stats()
+@app.get("/executor/stats")
+async def get_executor_stats():
+    return {"embed": state["embed_executor"].get_stats(), "search": state["search_executor"].get_stats()}
+@app.get("/admission/stats")
+async def get_admission_stats():
+    return state["admission"].get_stats()
+@app.post("/admin/reload")
+async def admin_reload(request: Request, force: bool = False):
+    check_admin(request)
+    report = await state["reloader"].reload(force=force)
+    return JSONResponse(report, status_code=500 if report["status"] == "failed" else 200)
+@app.get("/admin/reload")
+async def admin_reload_stats(request: Request):
+    check_admin(request)
+    return state["reloader"].get_stats()
+@app.get("/metrics")
+async def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+@app.get("/health")
+async def health():
+    return {"status": "ready" if state["engine"] is not None and state["engine"].vectors is not None else "loading", "docs": len(state["metadata"]), "generation": state["reloader"].generation if state["reloader"] is not None else 0}
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,48 +1,340 @@
 import os
 import sys
 import asyncio
-import aiohttp
+import json
+import time
 from pathlib import Path
-from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional
 import numpy as np
 sys.path.append(str(Path(__file__).parent.parent))
 from minivector.embedder import Embedder
-app = FastAPI()
-WORKER_URLS = os.getenv("WORKER_URLS", "http://localhost:8001,http://localhost:8002,http://localhost:8003").split(",")
-embedder = Embedder()
+from minivector.encoding import JSON, MSGPACK, available_formats, decode, encode, render, vector_field
+from minivector.metrics import CONTENT_TYPE, REGISTRY, PARTIAL_RESULTS, SHARD_LATENCY, SHARD_OVERHEAD, SHARDS_PROBED, STAGE_LATENCY, MetricsMiddleware
+from minivector.shard_client import ShardClient
+from minivector.binary_engine import make_hit, pack_codes
+from minivector.merge import global_ids, merge_topk, split_ids
+from minivector.replicas import ReplicaSet, parse_groups
+from minivector.routing import ShardRouter
+from minivector.wire import MAX_K, MEDIA_TYPE as WIRE, decode_results, encode_query, is_wire
+from minivector.admission import NORMAL, AdmissionController, Deadline, DeadlineExceeded, LoadShed, Overloaded
+WORKER_GROUPS = parse_groups(os.getenv("WORKER_URLS", "http://localhost:8001,http://localhost:8002,http://localhost:8003"))
+WORKER_ENCODING = os.getenv("WORKER_ENCODING", WIRE)
+DOCS_ENCODING = os.getenv("DOCS_ENCODING", MSGPACK if MSGPACK in available_formats() else JSON)
+STALE_RETRIES = int(os.getenv("STALE_RETRIES", "1"))
+SHARD_PHASE_FRACTION = float(os.getenv("SHARD_PHASE_FRACTION", "0.7"))
+SHARD_TIMEOUT_MS = float(os.getenv("SHARD_TIMEOUT_MS", "0"))
+SHARD_MANIFEST = os.getenv("SHARD_MANIFEST") or None
+NPROBE = int(os.getenv("NPROBE", "0"))
+ADAPTIVE_K = os.getenv("ADAPTIVE_K", "1") != "0"
+ADAPTIVE_K_MIN = int(os.getenv("ADAPTIVE_K_MIN", "10"))
+SEARCH_TIMEOUT_MS = float(os.getenv("SEARCH_TIMEOUT_MS", "2000"))
+ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", "64"))
+ADMISSION_QUEUE = int(os.getenv("ADMISSION_QUEUE", "256"))
+DEGRADE_AT = float(os.getenv("DEGRADE_AT", "0.5"))
+DEGRADED_MAX_K = int(os.getenv("DEGRADED_MAX_K", "10"))
+WORKER_POOL_LIMIT = int(os.getenv("WORKER_POOL_LIMIT", "256"))
+WORKER_POOL_PER_HOST = int(os.getenv("WORKER_POOL_PER_HOST", "32"))
+WORKER_KEEPALIVE_S = float(os.getenv("WORKER_KEEPALIVE_S", "30"))
+WORKER_CONNECT_TIMEOUT_MS = float(os.getenv("WORKER_CONNECT_TIMEOUT_MS", "500"))
+WORKER_READ_TIMEOUT_MS = float(os.getenv("WORKER_READ_TIMEOUT_MS", "10000"))
+HEALTH_INTERVAL_S = float(os.getenv("HEALTH_INTERVAL_S", "2"))
+HEALTH_TIMEOUT_MS = float(os.getenv("HEALTH_TIMEOUT_MS", "500"))
+EJECT_AFTER_FAILURES = int(os.getenv("EJECT_AFTER_FAILURES", "3"))
+HEDGE = os.getenv("HEDGE", "1") != "0"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_MS = float(os.getenv("HEDGE_MIN_MS", "2"))
+HEDGE_INITIAL_MS = float(os.getenv("HEDGE_INITIAL_MS", "50"))
+state = {"embedder": None, "embedder_task": None, "client": None, "router": None, "health_task": None,
+         "replicas": ReplicaSet(WORKER_GROUPS, hedge=HEDGE, hedge_percentile=HEDGE_PERCENTILE, hedge_min_s=HEDGE_MIN_MS / 1000, hedge_initial_s=HEDGE_INITIAL_MS / 1000 if HEDGE_INITIAL_MS > 0 else None, fail_threshold=EJECT_AFTER_FAILURES if HEALTH_INTERVAL_S > 0 else 0), "admission": AdmissionController("coordinator", max_concurrency=ADMISSION_CONCURRENCY, max_queue=ADMISSION_QUEUE, reduce_at=DEGRADE_AT, cache_only_at=float("inf"))}
+def embedder_error():
+    task = state["embedder_task"]
+    if task is None or not task.done():
+        return None
+    if task.cancelled():
+        return "embedder load was cancelled"
+    error = task.exception()
+    return None if error is None else f"{type(error).__name__}: {error}"
+async def get_embedder():
+    if state["embedder"] is None:
+        try:
+            state["embedder"] = await asyncio.shield(state["embedder_task"])
+        except Exception:
+            raise HTTPException(status_code=503, detail=f"Embedder failed to load: {embedder_error()}")
+    return state["embedder"]
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    state["embedder_task"] = asyncio.create_task(asyncio.to_thread(Embedder))
+    state["client"] = ShardClient(state["replicas"].urls, limit=WORKER_POOL_LIMIT, limit_per_host=WORKER_POOL_PER_HOST, keepalive_s=WORKER_KEEPALIVE_S,
+                                  connect_timeout_s=WORKER_CONNECT_TIMEOUT_MS / 1000, read_timeout_s=WORKER_READ_TIMEOUT_MS / 1000)
+    await state["client"].start()
+    await check_shard_map()
+    if SHARD_MANIFEST is not None:
+        router = ShardRouter.load(SHARD_MANIFEST, adaptive_k=ADAPTIVE_K, min_k=ADAPTIVE_K_MIN)
+        if router is not None and router.num_shards != len(WORKER_GROUPS):
+            print(f"⚠️ {SHARD_MANIFEST} has {router.num_shards} shards but WORKER_URLS lists {len(WORKER_GROUPS)}; probing all shards")
+            router = None
+        state["router"] = router
+    if HEALTH_INTERVAL_S > 0:
+        state["health_task"] = asyncio.create_task(state["replicas"].probe_forever(probe_worker, HEALTH_INTERVAL_S))
+    yield
+    if state["health_task"] is not None:
+        state["health_task"].cancel()
+    await state["client"].close()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+def stats_of(key):
+    return lambda: state[key].get_stats() if state[key] is not None else None
+REGISTRY.register_stats("routing", stats_of("router"), counters=["queries", "probes"])
+REGISTRY.register_stats("replicas", stats_of("replicas"), counters=["calls", "hedges", "hedge_wins", "failovers", "unavailable", "probes"])
+REGISTRY.register_stats("shard_pool", stats_of("client"), counters=["requests", "errors", "timeouts", "new_connections", "reused_connections"])
+REGISTRY.register_stats("admission", stats_of("admission"), counters=["admitted", "rejected", "shed", "degraded"])
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc):
+    return JSONResponse({"detail": str(exc)}, status_code=429, headers={"Retry-After": "1"})
+@app.exception_handler(LoadShed)
+async def load_shed_handler(request, exc):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "1"})
+def respond(request, payload, table_key):
+    body, media_type = render(payload, request.headers.get("accept"), table_key)
+    return Response(body, media_type=media_type)
+class StaleShard(Exception):
+    pass
+async def post_worker(url, path, make_body, deadline, encoding=WORKER_ENCODING):
+    headers = {"Content-Type": encoding, "Accept": encoding}
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        deadline.check(path)
+        # 0 means "no deadline" to workers and to aiohttp: never send an exhausted budget
+        timeout_ms = max(1.0, deadline.remaining_ms()) if deadline.timeout_ms else None
+        status, content_type, body = await state["client"].post(url, path, make_body(timeout_ms), headers, deadline.remaining_s())
+        outcome = "ok" if status == 200 else f"http_{status}"
+        if status == 409:
+            raise StaleShard(url)
+        if status != 200:
+            return None
+        result = decode_results(body) if is_wire(content_type) else decode(body, content_type)
+        if "took_ms" in result:
+            SHARD_OVERHEAD.observe(max(0.0, time.perf_counter() - start - result["took_ms"] / 1000), shard=url)
+        return result
+    except StaleShard:
+        raise
+    except (asyncio.TimeoutError, DeadlineExceeded):
+        outcome = "timeout"
+        return None
+    except Exception as e:
+        print(f"Failed to connect to {url}{path}: {e}")
+        return None
+    finally:
+        SHARD_LATENCY.observe(time.perf_counter() - start, shard=url, outcome=outcome)
+async def check_shard_map():
+    # Routing, replica groups and the manifest's centroids are all indexed by
+    # position in WORKER_URLS: refuse to start if a worker serves another shard
+    counts = None
+    if SHARD_MANIFEST is not None:
+        with open(SHARD_MANIFEST, "r", encoding="utf-8") as f:
+            counts = json.load(f).get("counts")
+    listed = [(shard, url) for shard, urls in enumerate(WORKER_GROUPS) for url in urls]
+    async def health(url):
+        try:
+            status, _, body = await state["client"].get(url, "/health", HEALTH_TIMEOUT_MS / 1000)
+            return json.loads(body) if status == 200 else None
+        except Exception:
+            return None
+    errors = []
+    for (shard, url), report in zip(listed, await asyncio.gather(*(health(url) for _, url in listed))):
+        # Workers that are down or still loading are checked by probe_worker later
+        if report is None:
+            continue
+        if report.get("shard_id") != shard:
+            errors.append(f"{url} serves shard {report.get('shard_id')} but is listed as shard {shard}")
+        elif counts is not None and shard < len(counts) and report.get("vectors") and report["vectors"] != counts[shard]:
+            errors.append(f"{url} has {report['vectors']} vectors, {SHARD_MANIFEST} expects {counts[shard]} for shard {shard}")
+    if errors:
+        raise RuntimeError("WORKER_URLS does not match the shards the workers serve:\n  " + "\n  ".join(errors))
+async def probe_worker(shard, url):
+    try:
+        status, _, body = await state["client"].get(url, "/health", HEALTH_TIMEOUT_MS / 1000)
+    except Exception:
+        return False
+    if status != 200:
+        return False
+    health = json.loads(body)
+    if health.get("shard_id") != shard:
+        print(f"⚠️ {url} serves shard {health.get('shard_id')} but is listed as shard {shard}")
+        return False
+    return health.get("vectors", 0) > 0
 class QueryRequest(BaseModel):
     text: str
-    k: int = 10
-async def query_worker(session, url, vector, k):
+    k: int = Field(10, ge=1, le=MAX_K)
+    timeout_ms: Optional[float] = None
+    nprobe: Optional[int] = None
+class BatchQueryRequest(BaseModel):
+    texts: List[str]
+    k: int = Field(10, ge=1, le=MAX_K)
+    timeout_ms: Optional[float] = None
+    nprobe: Optional[int] = None
+def request_deadline(timeout_ms):
+    return Deadline(timeout_ms if timeout_ms is not None else SEARCH_TIMEOUT_MS)
+def search_body(vectors, codes, k):
+    if WORKER_ENCODING == WIRE:
+        return lambda t: encode_query(codes, k, vectors.shape[1], t, with_docs=False)
+    return lambda t: encode({"query_vectors": [vector_field(v, WORKER_ENCODING) for v in vectors], "k": k, "timeout_ms": t, "with_docs": False}, WORKER_ENCODING)
+async def search_shard(shard, entries, vectors, codes, deadline):
+    queries = [q for q, _ in entries]
+    body = search_body(vectors[queries], codes[queries], max(shard_k for _, shard_k in entries))
+    async def send(url):
+        frame = await post_worker(url, "/search/batch", body, deadline)
+        # Hits from another shard would be merged under the wrong routing decision
+        if frame is not None and frame["shard_id"] != shard:
+            print(f"⚠️ {url} answered for shard {frame['shard_id']}, expected shard {shard}")
+            return None
+        return frame
+    return await state["replicas"].call(shard, send, timeout_s=deadline.remaining_s())
+async def fetch_docs(shard, url, rows, generation, deadline):
+    body = lambda t: encode({"rows": rows, "generation": generation}, DOCS_ENCODING)
+    answer = await state["replicas"].call(shard, lambda replica: post_worker(replica, "/docs", body, deadline, DOCS_ENCODING), op="docs", prefer=url, timeout_s=deadline.remaining_s())
+    return None if answer is None else answer[1]["docs"]
+async def gather_or_cancel(aws):
+    # Like gather, but a raising call (e.g. StaleShard) cancels its siblings
+    # instead of leaving them running against shards we are about to re-query
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
     try:
-        async with session.post(f"{url}/search", json={"query_vector": vector, "k": k}) as resp:
-            if resp.status == 200:
-                return await resp.json()
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+def route(codes, k, nprobe):
+    router = state["router"]
+    if router is None:
+        probes = [[(shard, k) for shard in range(len(WORKER_GROUPS))] for _ in range(len(codes))]
+    else:
+        probes = router.route(codes, NPROBE if nprobe is None else nprobe, k)
+    plan = {}
+    for q, probe in enumerate(probes):
+        SHARDS_PROBED.observe(len(probe))
+        for shard, shard_k in probe:
+            plan.setdefault(shard, []).append((q, shard_k))
+    return plan
+async def two_phase_search(vectors, codes, k, deadline, nprobe=None):
+    plan = route(codes, k, nprobe)
+    for attempt in range(STALE_RETRIES + 1):
+        deadline.check("fan-out")
+        # Phase one gets part of the budget: a hung shard is then reported as
+        # failed with time left to fetch the other shards' documents
+        phase = deadline.sub(SHARD_PHASE_FRACTION, SHARD_TIMEOUT_MS)
+        with STAGE_LATENCY.time(stage="fanout"):
+            answers = await gather_or_cancel(search_shard(shard, entries, vectors, codes, phase) for shard, entries in plan.items())
+        answered = {}
+        per_query = [[] for _ in range(len(vectors))]
+        with STAGE_LATENCY.time(stage="merge"):
+            for (shard, entries), answer in zip(plan.items(), answers):
+                if answer is None:
+                    continue
+                url, frame = answer
+                answered[frame["shard_id"]] = (url, frame)
+                for i, (q, shard_k) in enumerate(entries):
+                    per_query[q].append((global_ids(frame["shard_id"], frame["rows"][i][:shard_k]), frame["distances"][i][:shard_k]))
+            merged = []
+            for lists in per_query:
+                ids, dists = merge_topk(lists, k)
+                merged.append((ids, dists, sum(len(ids) for ids, _ in lists)))
+            wanted = {}
+            for ids, _, _ in merged:
+                shards, rows = split_ids(ids)
+                for shard, row in zip(shards.tolist(), rows.tolist()):
+                    wanted.setdefault(shard, set()).add(row)
+            wanted = {shard: sorted(rows) for shard, rows in wanted.items()}
+        deadline.check("fetch")
+        try:
+            with STAGE_LATENCY.time(stage="fetch"):
+                fetched = await gather_or_cancel(fetch_docs(shard, answered[shard][0], rows, answered[shard][1]["generation"], deadline) for shard, rows in wanted.items())
+        except StaleShard:
+            if attempt < STALE_RETRIES:
+                continue
+            raise HTTPException(status_code=503, detail="Shards were reloaded during the search, retry")
+        docs = {}
+        missing = {shard for shard in plan if shard not in answered}
+        for (shard, rows), shard_docs in zip(wanted.items(), fetched):
+            if shard_docs is None:
+                missing.add(shard)
             else:
-                print(f"Error from {url}: {resp.status}")
-                return None
-    except Exception as e:
-        print(f"Failed to connect to {url}: {e}")
-        return None
+                docs.update(((shard, row), doc) for row, doc in zip(rows, shard_docs))
+        failed = [set() for _ in range(len(vectors))]
+        for shard, entries in plan.items():
+            if shard in missing:
+                for q, _ in entries:
+                    failed[q].add(shard)
+        out = []
+        for (ids, dists, total), failed_shards in zip(merged, failed):
+            hits = []
+            for shard, row, dist in zip(*(a.tolist() for a in split_ids(ids)), dists.tolist()):
+                doc = docs.get((shard, row))
+                if doc is None:
+                    # A fetch that came back short: the hit is lost, so say so
+                    failed_shards.add(shard)
+                    continue
+                hit = make_hit(doc, 1.0 - dist / answered[shard][1]["vector_dim"])
+                hit["_shard"] = shard
+                hits.append(hit)
+            for shard in failed_shards:
+                PARTIAL_RESULTS.inc(shard=str(shard))
+            out.append((hits, total, sorted(failed_shards)))
+        return out
 @app.post("/search")
-async def distributed_search(req: QueryRequest):
-    query_vec = embedder.embed([req.text])[0].tolist()
-    async with aiohttp.ClientSession() as session:
-        tasks = [query_worker(session, url, query_vec, req.k) for url in WORKER_URLS]
-        results = await asyncio.gather(*tasks)
-    all_hits = []
-    for res in results:
-        if res and "results" in res:
-            for hit in res["results"]:
-                hit["_shard"] = res["shard_id"]
-                all_hits.append(hit)
-    all_hits.sort(key=lambda x: x["score"], reverse=True)
-    return {
-        "total_hits": len(all_hits),
-        "top_k": all_hits[:req.k]
-    }
+async def distributed_search(req: QueryRequest, request: Request):
+    deadline = request_deadline(req.timeout_ms)
+    async with state["admission"].admit(deadline) as mode:
+        k = req.k if mode == NORMAL else min(req.k, DEGRADED_MAX_K)
+        embedder = await get_embedder()
+        deadline.check("embedding")
+        with STAGE_LATENCY.time(stage="embed"):
+            query_vecs = embedder.embed([req.text])
+            codes = pack_codes(query_vecs)
+        [(hits, total, failed)] = await two_phase_search(query_vecs, codes, k, deadline, req.nprobe)
+    return respond(request, {
+        "total_hits": total,
+        "top_k": hits,
+        "mode": mode,
+        "partial": bool(failed),
+        "failed_shards": failed
+    }, "top_k")
+@app.post("/search/batch")
+async def distributed_search_batch(req: BatchQueryRequest, request: Request):
+    if not req.texts:
+        return respond(request, {"results": []}, "results")
+    deadline = request_deadline(req.timeout_ms)
+    async with state["admission"].admit(deadline) as mode:
+        k = req.k if mode == NORMAL else min(req.k, DEGRADED_MAX_K)
+        embedder = await get_embedder()
+        deadline.check("embedding")
+        with STAGE_LATENCY.time(stage="embed"):
+            query_vecs = embedder.embed(req.texts)
+            codes = pack_codes(query_vecs)
+        per_query = await two_phase_search(query_vecs, codes, k, deadline, req.nprobe)
+    out = [{"text": text, "total_hits": total, "top_k": hits, "partial": bool(failed), "failed_shards": failed} for text, (hits, total, failed) in zip(req.texts, per_query)]
+    return respond(request, {"results": out, "mode": mode}, "results")
+@app.get("/pool/stats")
+async def pool_stats():
+    return state["client"].get_stats()
+@app.get("/replicas/stats")
+async def replica_stats():
+    return state["replicas"].get_stats(detail=True)
+@app.get("/admission/stats")
+async def admission_stats():
+    return state["admission"].get_stats()
+@app.get("/metrics")
+async def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
 @app.get("/health")
 async def health():
-    return {"status": "coordinator_ready", "workers": len(WORKER_URLS)}
+    error = embedder_error()
+    if error is not None:
+        return JSONResponse({"status": "embedder_failed", "error": error, "workers": len(state["replicas"].urls), "shards": len(WORKER_GROUPS)}, status_code=503)
+    return {"status": "coordinator_ready" if state["embedder_task"] is not None and state["embedder_task"].done() else "loading_embedder", "workers": len(state["replicas"].urls), "shards": len(WORKER_GROUPS), "healthy_replicas": state["replicas"].get_stats()["healthy_replicas"]}
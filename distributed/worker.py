@@ -1,36 +1,212 @@
 import os
 import sys
+import time
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Dict, Any, Optional, Union
 import numpy as np
 sys.path.append(str(Path(__file__).parent.parent))
-from minivector.binary_engine import BinaryIndex
+from minivector.binary_engine import BinaryIndex, pack_codes
+from minivector.executor import ComputeExecutor, ExecutorSaturated
+from minivector.encoding import decode, render, unpack_vector
+from minivector.admission import Deadline, DeadlineExceeded
+from minivector.metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware
+from minivector.reload import IndexReloader, content_generation
+from minivector.wire import MAX_K, MEDIA_TYPE as WIRE, WireError, decode_query, encode_results, is_wire
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
 SHARD_ID = int(os.getenv("SHARD_ID", "0"))
 DATA_DIR = Path(os.getenv("DATA_DIR", "data/sharded"))
+WORKER_MMAP = os.getenv("WORKER_MMAP", "1") != "0"
+SEARCH_EXECUTOR = os.getenv("SEARCH_EXECUTOR", "thread")
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", str(os.cpu_count() or 1)))
+SEARCH_QUEUE = int(os.getenv("SEARCH_QUEUE", "64"))
+INDEX_WATCH_S = float(os.getenv("INDEX_WATCH_S", "0"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+VECTORS_PATH = DATA_DIR / f"shard_{SHARD_ID}.npy"
+META_PATH = DATA_DIR / f"shard_{SHARD_ID}_meta.json"
 index = BinaryIndex()
+index.generation = 0
+executor = None
+def load_index():
+    new_index = BinaryIndex()
+    new_index.load(str(VECTORS_PATH), str(META_PATH), mmap=WORKER_MMAP)
+    if new_index.vectors.shape[0] != len(new_index.metadata):
+        raise ValueError(f"{VECTORS_PATH} has {new_index.vectors.shape[0]} rows but {META_PATH} has {len(new_index.metadata)} entries")
+    # Same files, same generation: in pool children, replicas and after restarts
+    new_index.generation = content_generation([VECTORS_PATH, META_PATH])
+    return new_index
+def swap_index(new_index):
+    global index
+    old, index = index, new_index
+    if executor is not None and executor.kind == "process":
+        executor.recycle()
+    return old
+def _init_search_child():
+    global index
+    index = load_index()
+reloader = IndexReloader(f"shard_{SHARD_ID}", load=load_index, swap=swap_index, paths=[VECTORS_PATH, META_PATH], warmup=lambda i: i.warmup(), size_of=lambda i: i.get_stats()["bytes"])
+REGISTRY.register_stats("index", lambda: {**index.get_stats(), "docs": len(index.metadata)} if index.vectors is not None else None, counters=["search_count"], labels={"shard": str(SHARD_ID)})
+REGISTRY.register_stats("executor", lambda: executor.get_stats() if executor is not None else None, counters=["submitted", "completed", "rejected", "failed"], labels={"executor": "search"})
+REGISTRY.register_stats("reload", reloader.get_stats, counters=["reloads", "failures", "released"], labels={"shard": str(SHARD_ID)})
+def _search_job(query_vec, k, deadline=None):
+    shard_index = index
+    if deadline is not None:
+        deadline.check("search")
+    return shard_index.search(query_vec, k=k)
+def _search_batch_job(query_vecs, k, deadline=None):
+    shard_index = index
+    if deadline is not None:
+        deadline.check("search")
+    return shard_index.search_batch(query_vecs, k=k)
+def _search_packed_job(codes, k, with_docs, deadline=None):
+    shard_index = index
+    if deadline is not None:
+        deadline.check("search")
+    rows, distances = shard_index.search_packed(codes, k)
+    docs = [[shard_index.metadata[int(r)] for r in q_rows] for q_rows in rows] if with_docs else None
+    return rows, distances, docs, shard_index.vector_dim, shard_index.generation
 class SearchRequest(BaseModel):
-    query_vector: List[float]
-    k: int = 10
+    query_vector: Union[bytes, List[float]]
+    k: int = Field(10, ge=1, le=MAX_K)
+    timeout_ms: Optional[float] = None
+    with_docs: bool = True
+class BatchSearchRequest(BaseModel):
+    query_vectors: List[Union[bytes, List[float]]]
+    k: int = Field(10, ge=1, le=MAX_K)
+    timeout_ms: Optional[float] = None
+    with_docs: bool = True
+class DocsRequest(BaseModel):
+    rows: List[int]
+    generation: Optional[int] = None
+async def read_request(request, model):
+    try:
+        return model(**decode(await request.body(), request.headers.get("content-type")))
+    except (ValueError, TypeError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+def respond(request, payload):
+    body, media_type = render(payload, request.headers.get("accept"))
+    return Response(body, media_type=media_type)
 @app.on_event("startup")
 async def load_shard():
+    global executor
     print(f"Worker {SHARD_ID}: Loading shard...")
-    vectors_path = DATA_DIR / f"shard_{SHARD_ID}.npy"
-    meta_path = DATA_DIR / f"shard_{SHARD_ID}_meta.json"
-    if not vectors_path.exists():
-        print(f"Worker {SHARD_ID}: Shard not found at {vectors_path}!")
-        return
-    index.load(str(vectors_path), str(meta_path))
-    print(f"Worker {SHARD_ID}: Loaded {len(index.metadata)} vectors.")
+    if not VECTORS_PATH.exists():
+        print(f"Worker {SHARD_ID}: Shard not found at {VECTORS_PATH}!")
+    else:
+        report = await reloader.reload(force=True)
+        if report["status"] == "failed":
+            print(f"Worker {SHARD_ID}: Failed to load shard: {report['error']}")
+        else:
+            print(f"Worker {SHARD_ID}: Loaded {len(index.metadata)} vectors.")
+    executor = ComputeExecutor("search", max_workers=SEARCH_WORKERS, max_queue=SEARCH_QUEUE, kind=SEARCH_EXECUTOR,
+                               initializer=_init_search_child if index.vectors is not None else None)
+    if INDEX_WATCH_S > 0:
+        reloader.start_watching(INDEX_WATCH_S)
+@app.on_event("shutdown")
+async def stop_watching():
+    await reloader.stop()
+def check_admin(request):
+    if ADMIN_TOKEN is not None and request.headers.get("x-admin-token") != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+async def run_packed(codes, k, with_docs, timeout_ms):
+    try:
+        return await executor.run_timed(_search_packed_job, codes, k, with_docs, Deadline(timeout_ms))
+    except ExecutorSaturated:
+        raise HTTPException(status_code=503, detail="Search queue full")
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+async def search_ids(request, query_vecs, req, start):
+    (rows, distances, _, vector_dim, generation), queue_ms = await run_packed(pack_codes(query_vecs), req.k, False, req.timeout_ms)
+    if np.ndim(query_vecs) == 1:
+        rows, distances = rows[0], distances[0]
+    return respond(request, {"shard_id": SHARD_ID, "generation": generation, "vector_dim": vector_dim, "rows": rows.tolist(), "distances": distances.tolist(),
+                             "queue_ms": queue_ms, "took_ms": (time.perf_counter() - start) * 1000})
+async def search_wire(request, start):
+    try:
+        query = decode_query(await request.body())
+    except WireError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if index.vectors is None:
+        raise HTTPException(status_code=503, detail="Shard not loaded")
+    if query["codes"].shape[1] != index.bytes_per_vector:
+        raise HTTPException(status_code=422, detail=f"query codes are {query['codes'].shape[1]} bytes, shard vectors are {index.bytes_per_vector}")
+    (rows, distances, docs, vector_dim, generation), queue_ms = await run_packed(query["codes"], query["k"], query["with_docs"], query["timeout_ms"])
+    body = encode_results(rows, distances, SHARD_ID, vector_dim, (time.perf_counter() - start) * 1000, queue_ms, docs, generation)
+    return Response(body, media_type=WIRE)
 @app.post("/search")
-async def search_shard(req: SearchRequest):
+async def search_shard(request: Request):
+    start = time.perf_counter()
+    if is_wire(request.headers.get("content-type")):
+        return await search_wire(request, start)
+    req = await read_request(request, SearchRequest)
     if index.vectors is None:
         raise HTTPException(status_code=503, detail="Shard not loaded")
-    query_vec = np.array(req.query_vector, dtype=np.float32)
-    results = index.search(query_vec, k=req.k)
-    return {"shard_id": SHARD_ID, "results": results}
+    try:
+        query_vec = unpack_vector(req.query_vector)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not req.with_docs:
+        return await search_ids(request, query_vec, req, start)
+    try:
+        results, queue_ms = await executor.run_timed(_search_job, query_vec, req.k, Deadline(req.timeout_ms))
+    except ExecutorSaturated:
+        raise HTTPException(status_code=503, detail="Search queue full")
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return respond(request, {"shard_id": SHARD_ID, "results": results, "queue_ms": queue_ms, "took_ms": (time.perf_counter() - start) * 1000})
+@app.post("/search/batch")
+async def search_shard_batch(request: Request):
+    start = time.perf_counter()
+    if is_wire(request.headers.get("content-type")):
+        return await search_wire(request, start)
+    req = await read_request(request, BatchSearchRequest)
+    if index.vectors is None:
+        raise HTTPException(status_code=503, detail="Shard not loaded")
+    if not req.query_vectors:
+        return respond(request, {"shard_id": SHARD_ID, "results": []})
+    try:
+        query_vecs = np.stack([unpack_vector(v) for v in req.query_vectors])
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not req.with_docs:
+        return await search_ids(request, query_vecs, req, start)
+    try:
+        results, queue_ms = await executor.run_timed(_search_batch_job, query_vecs, req.k, Deadline(req.timeout_ms))
+    except ExecutorSaturated:
+        raise HTTPException(status_code=503, detail="Search queue full")
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return respond(request, {"shard_id": SHARD_ID, "results": results, "queue_ms": queue_ms, "took_ms": (time.perf_counter() - start) * 1000})
+@app.post("/docs")
+async def fetch_docs(request: Request):
+    req = await read_request(request, DocsRequest)
+    shard_index = index
+    if shard_index.vectors is None:
+        raise HTTPException(status_code=503, detail="Shard not loaded")
+    if req.generation is not None and req.generation != shard_index.generation:
+        raise HTTPException(status_code=409, detail=f"Shard reloaded (generation {shard_index.generation}, rows are from {req.generation})")
+    n = len(shard_index.metadata)
+    if any(row < 0 or row >= n for row in req.rows):
+        raise HTTPException(status_code=422, detail=f"Row out of range for shard of {n} documents")
+    return respond(request, {"shard_id": SHARD_ID, "generation": shard_index.generation, "docs": [shard_index.metadata[row] for row in req.rows]})
+@app.get("/executor/stats")
+async def executor_stats():
+    return executor.get_stats()
+@app.post("/admin/reload")
+async def admin_reload(request: Request, force: bool = False):
+    check_admin(request)
+    report = await reloader.reload(force=force)
+    return JSONResponse(report, status_code=500 if report["status"] == "failed" else 200)
+@app.get("/admin/reload")
+async def admin_reload_stats(request: Request):
+    check_admin(request)
+    return reloader.get_stats()
+@app.get("/metrics")
+async def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
 @app.get("/health")
 async def health():
-    return {"status": "ready", "shard_id": SHARD_ID, "vectors": len(index.metadata) if index.vectors is not None else 0}
+    return {"status": "ready", "shard_id": SHARD_ID, "vectors": len(index.metadata) if index.vectors is not None else 0, "generation": reloader.generation}
@@ -63,14 +63,49 @@ function App() {
   const [chat, setChat] = useState([]);
   const [msg, setMsg] = useState("");
   const [meta, setMeta] = useState(null);
+  const [cursor, setCursor] = useState(null);
+  const [searched, setSearched] = useState("");
+  const [hasMore, setHasMore] = useState(false);
+  const PAGE = 9;
   const search = async () => {
     if (!query) return;
     try {
-        const res = await axios.post(`${API_URL}/search`, { query, k: 9 });
+        // Plain search (cacheable, coalesced); a result session is only opened on "load more"
+        const res = await axios.post(`${API_URL}/search`, { query, k: PAGE });
         setResults(res.data.results);
+        setSearched(query);
+        setCursor(null);
+        setHasMore(res.data.results.length === PAGE);
         setMeta({ latency: res.data.took_ms, method: res.data.method });
     } catch (e) { alert("Backend Offline"); }
   };
+  const append = (more) => setResults(prev => {
+    const seen = new Set(prev.map(r => r.id));
+    return [...prev, ...more.filter(r => !seen.has(r.id))];
+  });
+  const openSession = async () => {
+    // Session whose first page covers what is already shown; keep only the hits after it
+    const shown = results.length;
+    const res = await axios.post(`${API_URL}/search`, { query: searched, k: shown + PAGE, paginate: true });
+    append(res.data.results.slice(shown));
+    setCursor(res.data.cursor);
+    setHasMore(Boolean(res.data.cursor));
+    setMeta({ latency: res.data.took_ms, method: res.data.method });
+  };
+  const loadMore = async () => {
+    try {
+        if (!cursor) return await openSession();
+        const res = await axios.get(`${API_URL}/search/page`, { params: { cursor, limit: PAGE } });
+        append(res.data.results);
+        setCursor(res.data.cursor);
+        setHasMore(Boolean(res.data.cursor));
+        setMeta({ latency: res.data.took_ms, method: res.data.method });
+    } catch (e) {
+        // Session expired or the index changed: fetch the same offset from a new session
+        if (e.response && e.response.status === 410) openSession().catch(console.error);
+        else console.error(e);
+    }
+  };
   const openPaper = async (id) => {
     try {
         const res = await axios.get(`${API_URL}/article/${id}`);
@@ -138,6 +173,11 @@ function App() {
                 </div>
             ))}
         </div>
+        {hasMore && (
+            <div style={{textAlign: 'center', margin: '20px 0'}}>
+                <button className="btn" onClick={loadMore}>LOAD MORE</button>
+            </div>
+        )}
       </div>
       {paper && (
         <div className="overlay" onClick={() => setPaper(null)}>
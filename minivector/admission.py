@@ -0,0 +1,180 @@
+"""
+MiniVector Admission Control - Deadlines and load shedding
+==========================================================
+Accepting every request under overload only moves the problem into the
+queue: latency grows until clients time out, and the work done for them is
+wasted. Admission control bounds what the server takes on:
+    - Deadline: per-request time budget, checked before each expensive stage
+    - AdmissionController: concurrency limit plus a bounded wait queue;
+      requests beyond it are rejected immediately (HTTP 429), and requests
+      that cannot start before their deadline are shed (HTTP 503)
+    - Degraded modes: as load rises the controller reports 'reduced'
+      (serve fewer results) and then 'cache_only' (answer from cache or shed)
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+import numpy as np
+NORMAL = "normal"
+REDUCED = "reduced"
+CACHE_ONLY = "cache_only"
+class Overloaded(RuntimeError):
+    """Raised when the wait queue is full; maps to HTTP 429."""
+class LoadShed(RuntimeError):
+    """Raised when an admitted request is dropped to protect latency; maps to HTTP 503."""
+class DeadlineExceeded(LoadShed):
+    """Raised when a request runs out of time before a stage."""
+class Deadline:
+    """
+    Absolute monotonic deadline for one request.
+    Uses CLOCK_MONOTONIC, so it stays valid when checked inside executor
+    threads or forked worker processes.
+    Example:
+        >>> deadline = Deadline(250)
+        >>> deadline.check("embedding")
+    """
+    def __init__(self, timeout_ms: Optional[float] = None):
+        """
+        Args:
+            timeout_ms: Time budget in milliseconds (None or <= 0 = no deadline)
+        """
+        self.timeout_ms = timeout_ms if timeout_ms and timeout_ms > 0 else None
+        self.expires_at = time.monotonic() + self.timeout_ms / 1000 if self.timeout_ms else float("inf")
+    def remaining_ms(self) -> float:
+        """Milliseconds left (inf without a deadline, never negative)."""
+        return max(0.0, (self.expires_at - time.monotonic()) * 1000)
+    def remaining_s(self) -> Optional[float]:
+        """Seconds left, or None without a deadline (for ``asyncio.wait_for``)."""
+        return None if self.timeout_ms is None else self.remaining_ms() / 1000
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+    def sub(self, fraction: float = 1.0, cap_ms: Optional[float] = None) -> "Deadline":
+        """
+        Deadline for one stage of the request: ``fraction`` of the time left,
+        at most ``cap_ms``, and never later than this deadline.
+        """
+        budget = self.remaining_ms() * fraction if self.timeout_ms else None
+        if cap_ms:
+            budget = cap_ms if budget is None else min(budget, cap_ms)
+        # Deadline(0) would mean "no deadline": an exhausted budget stays exhausted
+        return Deadline(None if budget is None else max(budget, 1e-3))
+    def check(self, stage: str) -> None:
+        """
+        Raise if the deadline has passed.
+        Raises:
+            DeadlineExceeded: If no time is left to start ``stage``
+        """
+        if self.expired():
+            raise DeadlineExceeded(f"deadline of {self.timeout_ms:.0f}ms exceeded before {stage}")
+class AdmissionController:
+    """
+    Concurrency limiter with a bounded queue and load-based degradation.
+    Example:
+        >>> admission = AdmissionController("search", max_concurrency=16, max_queue=64)
+        >>> async with admission.admit(deadline) as mode:
+        ...     results = await search(k=10 if mode == REDUCED else k)
+    """
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 16,
+        max_queue: int = 64,
+        reduce_at: float = 0.5,
+        cache_only_at: float = 0.9,
+        stats_window: int = 1024
+    ):
+        """
+        Initialize the controller.
+        Args:
+            name: Label used in stats
+            max_concurrency: Requests allowed to run at once
+            max_queue: Requests allowed to wait for a slot before rejecting
+            reduce_at: Load (in-flight / capacity) at which mode becomes 'reduced'
+            cache_only_at: Load at which mode becomes 'cache_only'
+            stats_window: Number of recent queue-wait samples kept
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.reduce_at = reduce_at
+        self.cache_only_at = cache_only_at
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.shed = 0
+        self.degraded = 0
+        self._wait_ms: Deque[float] = deque(maxlen=stats_window)
+    @property
+    def load(self) -> float:
+        """In-flight requests (running + waiting) as a fraction of capacity."""
+        return (self.active + self.waiting) / max(1, self.max_concurrency + self.max_queue)
+    def mode(self) -> str:
+        """Current degradation mode based on load."""
+        load = self.load
+        if load >= self.cache_only_at:
+            return CACHE_ONLY
+        if load >= self.reduce_at:
+            return REDUCED
+        return NORMAL
+    @asynccontextmanager
+    async def admit(self, deadline: Optional[Deadline] = None) -> AsyncIterator[str]:
+        """
+        Hold a concurrency slot for the duration of the block.
+        Yields:
+            The degradation mode observed at admission
+        Raises:
+            Overloaded: If the wait queue is full
+            DeadlineExceeded: If no slot frees up before the deadline
+        LoadShed raised inside the block is counted as shed and re-raised.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        mode = self.mode()
+        if self.active + self.waiting >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise Overloaded(f"{self.name}: {self.waiting} requests queued")
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            timeout = deadline.remaining_s() if deadline is not None else None
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            raise DeadlineExceeded(f"{self.name}: deadline passed while queued")
+        finally:
+            self.waiting -= 1
+        self._wait_ms.append((time.perf_counter() - start) * 1000)
+        self.active += 1
+        self.admitted += 1
+        if mode != NORMAL:
+            self.degraded += 1
+        try:
+            yield mode
+        except LoadShed:
+            self.shed += 1
+            raise
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+    def get_stats(self) -> Dict[str, Any]:
+        """Get admission statistics."""
+        waits = np.array(self._wait_ms) if self._wait_ms else np.zeros(1)
+        return {
+            "name": self.name,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "load": self.load,
+            "mode": self.mode(),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "shed": self.shed,
+            "degraded": self.degraded,
+            "queue_wait_p50_ms": float(np.percentile(waits, 50)),
+            "queue_wait_p99_ms": float(np.percentile(waits, 99)),
+        }
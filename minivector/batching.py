@@ -0,0 +1,161 @@
+"""
+MiniVector Embedding Batcher - Dynamic micro-batching for query embeddings
+==========================================================================
+Concurrent requests that each need a single query embedding are collected
+for up to ``max_wait_ms`` (or until ``max_batch_size`` texts are queued) and
+embedded with one ``Embedder.embed`` call. Each caller gets its own row back.
+The forward pass runs in an executor so the event loop keeps accepting work
+while a batch is being computed.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import numpy as np
+from .metrics import EMBED_BATCH_SIZE, STAGE_LATENCY
+class EmbeddingBatcher:
+    """
+    Asyncio scheduler that coalesces concurrent embedding requests.
+    Example:
+        >>> batcher = EmbeddingBatcher(Embedder(), max_batch_size=32, max_wait_ms=2.0)
+        >>> vec = await batcher.embed_query("binary quantization")
+    """
+    def __init__(
+        self,
+        embedder,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2.0,
+        executor=None,
+        stats_window: int = 1024,
+        cache=None
+    ):
+        """
+        Initialize the batcher.
+        Args:
+            embedder: Object exposing ``embed(texts) -> np.ndarray``
+            max_batch_size: Maximum number of texts per forward pass
+            max_wait_ms: Maximum time the first queued text waits for company
+            executor: Executor for the forward pass (default: loop default)
+            stats_window: Number of recent samples kept for percentiles
+            cache: Optional ``EmbeddingCache``; hits skip the queue entirely
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.embedder = embedder
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self.executor = executor
+        self.cache = cache
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._batches = 0
+        self._items = 0
+        self._max_batch_seen = 0
+        self._queue_times_ms: Deque[float] = deque(maxlen=stats_window)
+        self._batch_sizes: Deque[int] = deque(maxlen=stats_window)
+        self._embed_times_ms: Deque[float] = deque(maxlen=stats_window)
+    def _ensure_worker(self) -> asyncio.Queue:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        return self._queue
+    async def embed_query(self, text: str) -> np.ndarray:
+        """Embed a single text, sharing a forward pass with concurrent callers."""
+        if self.cache is not None:
+            cached = self.cache.get(text)
+            if cached is not None:
+                return cached
+        queue = self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((text, future, time.perf_counter()))
+        return await future
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed several texts; they may be split across or merged into batches."""
+        if not texts:
+            return np.zeros((0, getattr(self.embedder, "dim", 0)), dtype=np.float32)
+        vectors = await asyncio.gather(*(self.embed_query(t) for t in texts))
+        return np.vstack(vectors)
+    async def _collect(self) -> List[Tuple[str, asyncio.Future, float]]:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        vectors = self.embedder.embed(texts)
+        if self.cache is not None:
+            self.cache.put_many(texts, vectors)
+            # Runs in the executor: keep lookups on the loop current with
+            # rows that other processes appended
+            self.cache.refresh()
+        return vectors
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self._queue_times_ms.append((started - enqueued) * 1000)
+            texts = [text for text, _, _ in batch]
+            try:
+                vectors = await loop.run_in_executor(self.executor, self._embed_batch, texts)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self._embed_times_ms.append((time.perf_counter() - started) * 1000)
+            EMBED_BATCH_SIZE.observe(len(batch))
+            STAGE_LATENCY.observe(time.perf_counter() - started, stage="embed_batch")
+            self._batches += 1
+            self._items += len(batch)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._batch_sizes.append(len(batch))
+            for i, (_, future, _) in enumerate(batch):
+                if not future.done():
+                    future.set_result(vectors[i])
+    async def close(self) -> None:
+        """Stop the background worker. Pending callers are cancelled."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, future, _ = self._queue.get_nowait()
+                if not future.done():
+                    future.cancel()
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batching and queue-time statistics."""
+        queue_times = np.array(self._queue_times_ms) if self._queue_times_ms else np.zeros(1)
+        embed_times = np.array(self._embed_times_ms) if self._embed_times_ms else np.zeros(1)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_s * 1000,
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+            "max_batch_seen": self._max_batch_seen,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "queue_time_avg_ms": float(np.mean(queue_times)),
+            "queue_time_p50_ms": float(np.percentile(queue_times, 50)),
+            "queue_time_p99_ms": float(np.percentile(queue_times, 99)),
+            "embed_time_avg_ms": float(np.mean(embed_times)),
+        }
@@ -14,8 +14,9 @@ import numpy as np
 import json
 import time
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Union
 import os
+from .columnar import ColumnarMetadata
 _CPP_AVAILABLE = False
 _cpp_core = None
 _simd_type = "NumPy (fallback)"
@@ -39,6 +40,23 @@ try:
         _simd_type = "C++ (Generic)"
 except ImportError:
     pass
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+def _popcount_rows(x: np.ndarray) -> np.ndarray:
+    """Sum of set bits along the last axis of a uint8 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x).sum(axis=-1, dtype=np.uint32)
+    return _POPCOUNT8[x].sum(axis=-1, dtype=np.uint32)
+def pack_codes(query_vecs: np.ndarray) -> np.ndarray:
+    """Pack a (Q, dim) or (dim,) float query matrix into (Q, bytes) binary codes."""
+    query_vecs = np.atleast_2d(np.asarray(query_vecs, dtype=np.float32))
+    return np.ascontiguousarray(np.packbits(query_vecs > 0, axis=1))
+def make_hit(doc: Dict[str, Any], score: float) -> Dict[str, Any]:
+    """Result dict for one document: a copy of its metadata plus 'score' and 'text_preview'."""
+    hit = dict(doc)
+    hit['score'] = score
+    abstract = hit.get('abstract') or hit.get('text') or ""
+    hit['text_preview'] = abstract[:200] + "..." if abstract else "No preview available."
+    return hit
 def get_backend_info() -> Dict[str, Any]:
     """Get information about the current backend."""
     return {
@@ -66,7 +84,8 @@ class BinaryIndex:
             use_cpp: Whether to use C++ backend when available (default: True)
         """
         self.vectors: Optional[np.ndarray] = None
-        self.metadata: List[Dict[str, Any]] = []
+        self.metadata: Union[List[Dict[str, Any]], ColumnarMetadata] = []
+        self.id_to_row: Dict[str, int] = {}
         self.vector_dim = vector_dim
         self.use_cpp = use_cpp and _CPP_AVAILABLE
         self._search_count = 0
@@ -93,6 +112,8 @@ class BinaryIndex:
             "num_vectors": self.num_vectors,
             "vector_dim": self.vector_dim,
             "bytes_per_vector": self.bytes_per_vector,
+            "bytes": int(self.vectors.nbytes) if self.vectors is not None else 0,
+            "metadata_bytes": self.metadata.get_stats()["bytes"] if isinstance(self.metadata, ColumnarMetadata) else None,
             "backend": self.backend,
             "search_count": self._search_count,
             "avg_search_time_ms": avg_time,
@@ -118,30 +139,69 @@ class BinaryIndex:
         bits = (normalized > 0).astype(np.uint8)
         packed = np.packbits(bits, axis=1)
         packed = np.ascontiguousarray(packed)
-        np.save(save_path, packed)
-        with open(metadata_path, 'w', encoding='utf-8') as f:
+        # Rename into place so servers memory-mapping the old files keep a valid mapping.
+        tmp_path = Path(str(save_path) + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, packed)
+        os.replace(tmp_path, save_path)
+        tmp_path = Path(str(metadata_path) + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(metadata, f)
+        os.replace(tmp_path, metadata_path)
         print(f"  -> Saved index to {save_path}")
         print(f"  -> Compression: {float_vectors.nbytes / packed.nbytes:.1f}x")
     def load(
         self,
         vectors_path: str,
         metadata_path: str,
-        keep_originals: bool = False
+        keep_originals: bool = False,
+        mmap: bool = False
     ) -> None:
         """
         Load binary index from disk.
         Args:
             vectors_path: Path to packed binary vectors (.npy)
-            metadata_path: Path to metadata JSON
+            metadata_path: Path to metadata JSON, or to a ColumnarMetadata directory
             keep_originals: Ignored (for API compatibility)
+            mmap: Memory-map the packed vectors (and columnar metadata) instead of reading them eagerly
         """
-        self.vectors = np.load(vectors_path)
+        self.vectors = np.load(vectors_path, mmap_mode='r' if mmap else None)
         if not self.vectors.flags['C_CONTIGUOUS']:
             self.vectors = np.ascontiguousarray(self.vectors)
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            self.metadata = json.load(f)
+        if Path(metadata_path).is_dir():
+            self.metadata = ColumnarMetadata.load(metadata_path, mmap=mmap)
+        else:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                self.metadata = json.load(f)
         self.vector_dim = self.vectors.shape[1] * 8
+        self.build_id_index()
+    def build_id_index(self) -> None:
+        """Rebuild the document id -> row hash index from ``self.metadata``."""
+        if isinstance(self.metadata, ColumnarMetadata):
+            self.id_to_row = self.metadata
+            return
+        self.id_to_row = {str(doc.get('id')): row for row, doc in enumerate(self.metadata)}
+    def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a document by id in O(1).
+        Args:
+            doc_id: Document id
+        Returns:
+            The metadata dict, or None if the id is unknown
+        """
+        row = self.id_to_row.get(doc_id)
+        return self.metadata[row] if row is not None else None
+    def get_documents(self, doc_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Look up many documents by id in one call.
+        Args:
+            doc_ids: Document ids
+        Returns:
+            Metadata dicts in the same order (None for unknown ids)
+        """
+        get = self.id_to_row.get
+        metadata = self.metadata
+        return [metadata[row] if row is not None else None for row in map(get, doc_ids)]
     def _pack_query(self, query_vec: np.ndarray) -> np.ndarray:
         """Pack a float query vector into binary format."""
         q_norm = query_vec / (np.linalg.norm(query_vec) + 1e-12)
@@ -176,27 +236,113 @@ class BinaryIndex:
                 indices, distances = self._numpy_search(q_packed, k)
         else:
             indices, distances = self._numpy_search(q_packed, k)
-        results = []
-        for i, idx in enumerate(indices):
-            doc = self.metadata[idx].copy()
-            doc['score'] = 1.0 - (distances[i] / self.vector_dim)
-            abstract = doc.get('abstract') or doc.get('text') or ""
-            doc['text_preview'] = abstract[:200] + "..." if abstract else "No preview available."
-            results.append(doc)
+        results = self.format_results(indices, distances)
         elapsed_ms = (time.perf_counter() - start_time) * 1000
         self._search_count += 1
         self._total_search_time_ms += elapsed_ms
         return results
+    def format_results(self, indices, distances, scores=None) -> List[Dict[str, Any]]:
+        """
+        Turn row ids and Hamming distances into result dicts.
+        Args:
+            indices: Row ids in rank order
+            distances: Hamming distances (ignored when ``scores`` is given)
+            scores: Optional scores to report instead (e.g. BM25 or fused scores)
+        """
+        return [
+            make_hit(self.metadata[int(idx)], float(scores[i]) if scores is not None else 1.0 - (float(distances[i]) / self.vector_dim))
+            for i, idx in enumerate(indices)
+        ]
     def _numpy_search(
         self,
         q_packed: np.ndarray,
         k: int
     ) -> Tuple[List[int], List[int]]:
         """NumPy-based Hamming distance search (fallback)."""
-        xor_result = np.bitwise_xor(self.vectors, q_packed)
-        distances = np.unpackbits(xor_result, axis=1).sum(axis=1)
-        indices = np.argsort(distances)[:k]
-        return indices.tolist(), distances[indices].tolist()
+        indices, distances = self._numpy_search_batch(q_packed.reshape(1, -1), k)
+        return indices[0].tolist(), distances[0].tolist()
+    def _pack_queries(self, query_vecs: np.ndarray) -> np.ndarray:
+        """Pack a (Q, dim) float query matrix into (Q, bytes) binary codes."""
+        return pack_codes(query_vecs)
+    def _numpy_search_batch(
+        self,
+        q_packed: np.ndarray,
+        k: int,
+        chunk_bytes: int = 64 << 20
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized multi-query Hamming top-k (fallback), chunked to bound memory."""
+        n = self.vectors.shape[0]
+        k = max(0, min(k, n))
+        nq = q_packed.shape[0]
+        indices = np.zeros((nq, k), dtype=np.int64)
+        distances = np.zeros((nq, k), dtype=np.uint32)
+        if k <= 0:
+            return indices, distances
+        step = max(1, chunk_bytes // max(1, self.vectors.nbytes))
+        for start in range(0, nq, step):
+            block = q_packed[start:start + step]
+            dist = _popcount_rows(np.bitwise_xor(self.vectors[None, :, :], block[:, None, :]))
+            key = dist.astype(np.int64) * n + np.arange(n)
+            top = np.argpartition(key, k - 1, axis=1)[:, :k] if k < n else np.tile(np.arange(n), (len(block), 1))
+            top = np.take_along_axis(top, np.argsort(np.take_along_axis(key, top, axis=1), axis=1), axis=1)
+            indices[start:start + len(block)] = top
+            distances[start:start + len(block)] = np.take_along_axis(dist, top, axis=1)
+        return indices, distances
+    def search_packed(
+        self,
+        q_packed: np.ndarray,
+        k: int = 10
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k row ids and Hamming distances for packed binary queries.
+        Uses one C++ pass over the database for all queries when available.
+        Args:
+            q_packed: Packed queries of shape (Q, bytes_per_vector)
+            k: Number of results per query
+        Returns:
+            Tuple of (indices (Q, k) int64, distances (Q, k) uint32)
+        """
+        q_packed = np.ascontiguousarray(np.atleast_2d(q_packed), dtype=np.uint8)
+        if self.use_cpp and _cpp_core is not None and hasattr(_cpp_core, 'multi_search'):
+            try:
+                return _cpp_core.multi_search(q_packed, self.vectors, k)
+            except Exception:
+                pass
+        return self._numpy_search_batch(q_packed, k)
+    def rescore(
+        self,
+        query_vec: np.ndarray,
+        rows: np.ndarray
+    ) -> np.ndarray:
+        """
+        Hamming distances from the query to selected rows only.
+        Used to re-rank a candidate set (e.g. lexical matches) without scanning
+        the whole index.
+        Args:
+            query_vec: Float query vector of shape (dim,)
+            rows: Candidate row ids
+        Returns:
+            uint32 distances, one per row
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if rows.size == 0:
+            return np.empty(0, dtype=np.uint32)
+        q_packed = self._pack_queries(query_vec)[0]
+        return _popcount_rows(np.bitwise_xor(self.vectors[rows], q_packed))
+    def search_raw(
+        self,
+        query_vecs: np.ndarray,
+        k: int = 10
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k row ids and Hamming distances for float queries (no metadata).
+        Args:
+            query_vecs: Float query vectors of shape (Q, dim) or (dim,)
+            k: Number of results per query
+        Returns:
+            Tuple of (indices (Q, k) int64, distances (Q, k) uint32)
+        """
+        return self.search_packed(self._pack_queries(query_vecs), k)
     def search_batch(
         self,
         query_vecs: np.ndarray,
@@ -204,15 +350,19 @@ class BinaryIndex:
     ) -> List[List[Dict[str, Any]]]:
         """
         Search for multiple queries (batch mode).
+        All queries are packed at once and scored in a single kernel pass.
         Args:
             query_vecs: Float query vectors of shape (Q, dim)
             k: Number of results per query
         Returns:
             List of result lists (one per query)
         """
-        results = []
-        for query_vec in query_vecs:
-            results.append(self.search(query_vec, k))
+        start_time = time.perf_counter()
+        indices, distances = self.search_raw(query_vecs, k)
+        results = [self.format_results(i, d) for i, d in zip(indices, distances)]
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        self._search_count += len(results)
+        self._total_search_time_ms += elapsed_ms
         return results
     def hybrid_search(
         self,
@@ -231,6 +381,32 @@ class BinaryIndex:
             List of result dicts
         """
         return self.search(query_vec, k)
+    def warmup(
+        self,
+        num_queries: int = 4,
+        k: int = 10,
+        chunk_rows: int = 65536
+    ) -> float:
+        """
+        Fault in the packed vectors and run a few throwaway searches.
+        Used before a freshly loaded (possibly memory-mapped) index starts
+        serving, so the first real queries do not pay for page faults.
+        Args:
+            num_queries: Number of random queries to run
+            k: Number of results per query
+            chunk_rows: Rows read per step when touching the vectors
+        Returns:
+            Warmup time in ms
+        """
+        if self.vectors is None:
+            raise ValueError("Index not loaded. Call load() first.")
+        start = time.perf_counter()
+        for row in range(0, self.vectors.shape[0], chunk_rows):
+            np.bitwise_or.reduce(self.vectors[row:row + chunk_rows], axis=0)
+        if num_queries > 0 and self.num_vectors > 0:
+            rng = np.random.default_rng(0)
+            self.search_raw(rng.standard_normal((num_queries, self.vector_dim)).astype(np.float32), k)
+        return (time.perf_counter() - start) * 1000
     def benchmark(
         self,
         num_queries: int = 100,
@@ -1 +1,523 @@
-
+"""
+MiniVector Caches - Embedding and query result caches
+=====================================================
+Caches for the serving path:
+    - EmbeddingCache: exact normalized text -> embedding, so popular queries
+      and unchanged documents never reach the model twice
+    - QueryCache: semantic query embedding -> results, vectorized lookup
+    - AnswerCache: paper-scoped LLM answers with near-duplicate matching
+EmbeddingCache tiers:
+    - Memory: bounded LRU of float32 vectors
+    - Disk (optional): append-only mmap'd vector file plus a hash index,
+      reloaded on startup so the cache survives restarts; appends take a
+      file lock, so forked server processes can share one directory, and
+      lookups never touch the files (``refresh`` indexes rows appended by
+      other processes, from a thread rather than the event loop)
+"""
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows: single-process serving only
+    fcntl = None
+def normalize_text(text: str, lowercase: bool = True) -> str:
+    """Normalize text for cache keys (NFKC, collapsed whitespace, casefold)."""
+    text = " ".join(unicodedata.normalize("NFKC", text).split())
+    return text.casefold() if lowercase else text
+class EmbeddingCache:
+    """
+    Two-tier LRU cache mapping normalized text to embedding vectors.
+    Disk layout (``path`` directory):
+        - ``meta.json``: dim and model name, checked on open
+        - ``vectors.f32``: raw float32 rows, memory-mapped for reads
+        - ``keys.bin``: 16-byte BLAKE2b digests, row-aligned with the vectors
+        - ``lock``: held while appending; row numbers come from the file
+          sizes under the lock, so several processes can share the tier
+    Example:
+        >>> cache = EmbeddingCache(dim=384, path="data/cache/embeddings")
+        >>> cache.put("quantum computing", vec)
+        >>> cache.get("Quantum   computing")
+    """
+    KEY_BYTES = 16
+    def __init__(
+        self,
+        dim: int = 384,
+        max_entries: int = 10000,
+        path: Optional[Union[str, Path]] = None,
+        model_name: str = "",
+        lowercase: bool = True,
+        refresh_interval_s: float = 1.0
+    ):
+        """
+        Initialize the cache.
+        Args:
+            dim: Embedding dimension
+            max_entries: Capacity of the in-memory LRU tier
+            path: Directory for the persistent tier (None = memory only)
+            model_name: Mixed into keys so a model change never serves stale vectors
+            lowercase: Casefold text when building keys (safe for uncased models)
+            refresh_interval_s: Minimum time between ``refresh`` rescans of the disk tier
+        """
+        self.dim = dim
+        self.max_entries = max_entries
+        self.model_name = model_name
+        self.lowercase = lowercase
+        self.refresh_interval_s = refresh_interval_s
+        self.path = Path(path) if path is not None else None
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._disk_rows: Dict[bytes, int] = {}
+        self._disk_count = 0
+        self._disk_view: Optional[np.ndarray] = None
+        self._synced_at = 0.0
+        # _lock guards the in-memory state and is only held briefly; file
+        # reads and appends run under _sync_lock and the cross-process lock
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.path is not None:
+            self._open_disk()
+    def _key(self, text: str) -> bytes:
+        raw = f"{self.model_name}\0{normalize_text(text, self.lowercase)}".encode("utf-8")
+        return hashlib.blake2b(raw, digest_size=self.KEY_BYTES).digest()
+    def _open_disk(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta_path = self.path / "meta.json"
+        meta = {"dim": self.dim, "model_name": self.model_name}
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored != meta:
+                raise ValueError(f"Embedding cache at {self.path} was built for {stored}, expected {meta}")
+        else:
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        (self.path / "vectors.f32").touch(exist_ok=True)
+        (self.path / "keys.bin").touch(exist_ok=True)
+        with self._file_lock():
+            # Drop a torn tail left by a crash mid-append; safe under the lock
+            rows = self._complete_rows()
+            with open(self.path / "keys.bin", "r+b") as f:
+                f.truncate(rows * self.KEY_BYTES)
+            with open(self.path / "vectors.f32", "r+b") as f:
+                f.truncate(rows * self.dim * 4)
+            self._sync_disk()
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        with open(self.path / "lock", "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    def _complete_rows(self) -> int:
+        keys = (self.path / "keys.bin").stat().st_size // self.KEY_BYTES
+        return min(keys, (self.path / "vectors.f32").stat().st_size // (self.dim * 4))
+    def _sync_disk(self) -> None:
+        """Index rows appended since the last sync, by this or another process."""
+        with self._sync_lock:
+            self._synced_at = time.monotonic()
+            # Vectors are written before keys, so every complete key has its row
+            known = self._disk_count
+            rows = self._complete_rows()
+            if rows <= known:
+                return
+            with open(self.path / "keys.bin", "rb") as f:
+                f.seek(known * self.KEY_BYTES)
+                keys = f.read((rows - known) * self.KEY_BYTES)
+            view = np.memmap(self.path / "vectors.f32", dtype=np.float32, mode="r", shape=(rows, self.dim))
+            with self._lock:
+                for i in range(rows - known):
+                    self._disk_rows.setdefault(keys[i * self.KEY_BYTES:(i + 1) * self.KEY_BYTES], known + i)
+                self._disk_count = rows
+                self._disk_view = view
+    def refresh(self) -> None:
+        """
+        Index rows other processes appended to the disk tier.
+        Reads files, so call it off the event loop; rescans at most once per
+        ``refresh_interval_s``.
+        """
+        if self.path is not None and time.monotonic() - self._synced_at >= self.refresh_interval_s:
+            self._sync_disk()
+    def _remember(self, key: bytes, vec: np.ndarray) -> None:
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Return the cached vector for ``text`` or None."""
+        key = self._key(text)
+        with self._lock:
+            vec = self._memory.get(key)
+            if vec is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return vec
+            row = self._disk_rows.get(key)
+            if row is not None:
+                vec = np.array(self._disk_view[row], dtype=np.float32)
+                self._remember(key, vec)
+                self.hits += 1
+                self.disk_hits += 1
+                return vec
+            self.misses += 1
+            return None
+    def put(self, text: str, vec: np.ndarray) -> None:
+        """Store ``vec`` for ``text`` in memory and, if enabled, on disk."""
+        self.put_many([text], np.asarray(vec, dtype=np.float32).reshape(1, -1))
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        """Store a batch of vectors with a single disk append."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            new = {}
+            for text, vec in zip(texts, vectors):
+                key = self._key(text)
+                self._remember(key, vec.copy())
+                if self.path is not None and key not in self._disk_rows:
+                    new[key] = vec
+        if not new:
+            return
+        # Lookups keep running from memory while this waits for other writers
+        with self._file_lock():
+            # Pick up other writers' rows so keys are appended once
+            self._sync_disk()
+            with self._lock:
+                new = {key: vec for key, vec in new.items() if key not in self._disk_rows}
+            if not new:
+                return
+            with open(self.path / "vectors.f32", "ab") as f:
+                f.write(np.vstack(list(new.values())).tobytes())
+            with open(self.path / "keys.bin", "ab") as f:
+                f.write(b"".join(new))
+            self._sync_disk()
+    def __len__(self) -> int:
+        return max(len(self._memory), len(self._disk_rows))
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": f"{(self.hits / total * 100) if total else 0:.1f}%",
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._disk_rows),
+        }
+class CachedEmbedder:
+    """
+    Drop-in ``Embedder`` wrapper that consults an ``EmbeddingCache`` first.
+    Only texts missing from the cache are sent to the model, deduplicated,
+    in a single ``embed`` call.
+    """
+    def __init__(self, embedder, cache: Optional[EmbeddingCache] = None):
+        self.embedder = embedder
+        self.dim = getattr(embedder, "dim", 384)
+        self.cache = cache if cache is not None else EmbeddingCache(dim=self.dim)
+    def embed(self, texts: List[str], **kwargs) -> np.ndarray:
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        pending: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            vec = self.cache.get(text)
+            if vec is not None:
+                out[i] = vec
+            else:
+                pending.setdefault(normalize_text(text, self.cache.lowercase), []).append(i)
+        if pending:
+            miss_texts = [texts[rows[0]] for rows in pending.values()]
+            vectors = self.embedder.embed(miss_texts, **kwargs)
+            self.cache.put_many(miss_texts, vectors)
+            for vec, rows in zip(vectors, pending.values()):
+                out[rows] = vec
+        return out
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+def _approx_bytes(value: Any) -> int:
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return 64 + sum(_approx_bytes(k) + _approx_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + sum(_approx_bytes(v) for v in value)
+    return 16
+class QueryCache:
+    """
+    Semantic cache mapping query embeddings to results.
+    Cached queries live in one contiguous, L2-normalized float32 matrix so a
+    lookup is a single matrix-vector product over the occupied slots.
+    Eviction is LRU, bounded by entry count and approximate payload bytes,
+    with an optional TTL. ``invalidate()`` drops everything when the index
+    behind the cached results changes. Entries stored with a ``k`` only serve
+    lookups asking for at most that many results.
+    """
+    def __init__(
+        self,
+        max_size: int = 1000,
+        similarity_threshold: float = 0.95,
+        ttl_s: Optional[float] = None,
+        max_bytes: Optional[int] = None
+    ):
+        """
+        Initialize the cache.
+        Args:
+            max_size: Maximum number of cached queries (0 disables the cache)
+            similarity_threshold: Minimum cosine similarity for a hit
+            ttl_s: Entry lifetime in seconds (None = no expiry)
+            max_bytes: Approximate bound on cached payload size (None = unbounded)
+        """
+        max_size = max(0, max_size)
+        self.max_size = max_size
+        self.similarity_threshold = similarity_threshold
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._values: List[Any] = [None] * max_size
+        self._sizes = np.zeros(max_size, dtype=np.int64)
+        self._ks = np.zeros(max_size, dtype=np.int64)
+        self._expires = np.full(max_size, np.inf)
+        self._valid = np.zeros(max_size, dtype=bool)
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._free = list(range(max_size - 1, -1, -1))
+        self._high_water = 0
+        self._bytes = 0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_stores = 0
+    @staticmethod
+    def _normalize(vec: np.ndarray) -> np.ndarray:
+        vec = np.asarray(vec, dtype=np.float32).ravel()
+        return vec / (np.linalg.norm(vec) + 1e-10)
+    def _drop(self, slot: int) -> None:
+        self._valid[slot] = False
+        self._values[slot] = None
+        self._bytes -= int(self._sizes[slot])
+        self._sizes[slot] = 0
+        self._lru.pop(slot, None)
+        self._free.append(slot)
+    def lookup(self, query_vec: np.ndarray, k: Optional[int] = None) -> Optional[Any]:
+        """
+        Return the results of the most similar cached query above threshold.
+        Args:
+            query_vec: Query embedding
+            k: Number of results wanted; entries stored for a smaller k are skipped
+               and larger result lists are truncated to ``k``
+        """
+        q = self._normalize(query_vec)
+        with self._lock:
+            if self._matrix is None or not self._lru:
+                self.misses += 1
+                return None
+            n = self._high_water
+            sims = self._matrix[:n] @ q
+            live = self._valid[:n]
+            if self.ttl_s is not None:
+                expired = live & (self._expires[:n] <= time.monotonic())
+                for slot in np.flatnonzero(expired):
+                    self._drop(int(slot))
+                    self.expirations += 1
+                live = self._valid[:n]
+            if k is not None:
+                live = live & (self._ks[:n] >= k)
+            sims = np.where(live, sims, -np.inf)
+            best = int(np.argmax(sims))
+            if sims[best] >= self.similarity_threshold:
+                self._lru.move_to_end(best)
+                self.hits += 1
+                value = self._values[best]
+                if k is not None and isinstance(value, list):
+                    return value[:k]
+                return value
+            self.misses += 1
+            return None
+    def store(self, query_vec: np.ndarray, results: Any, k: Optional[int] = None, generation: Optional[int] = None) -> None:
+        """
+        Cache ``results`` (computed for ``k``) for ``query_vec``, evicting least recently used entries.
+        Args:
+            generation: ``self.generation`` read before the results were computed;
+                        the store is dropped if the cache was invalidated since
+        """
+        if self.max_size == 0:
+            return
+        q = self._normalize(query_vec)
+        size = _approx_bytes(results)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stale_stores += 1
+                return
+            if self._matrix is None or self._matrix.shape[1] != q.shape[0]:
+                self._matrix = np.zeros((self.max_size, q.shape[0]), dtype=np.float32)
+            while self._lru and (not self._free or (self.max_bytes is not None and self._bytes + size > self.max_bytes)):
+                self._drop(next(iter(self._lru)))
+                self.evictions += 1
+            slot = self._free.pop()
+            self._matrix[slot] = q
+            self._values[slot] = results
+            self._sizes[slot] = size
+            self._ks[slot] = k if k is not None else np.iinfo(np.int64).max
+            self._expires[slot] = time.monotonic() + self.ttl_s if self.ttl_s is not None else np.inf
+            self._valid[slot] = True
+            self._lru[slot] = None
+            self._bytes += size
+            self._high_water = max(self._high_water, slot + 1)
+    def invalidate(self) -> None:
+        """Drop all entries (e.g. after the index they were computed on changed)."""
+        with self._lock:
+            for slot in list(self._lru):
+                self._drop(slot)
+            self._free = list(range(self.max_size - 1, -1, -1))
+            self._high_water = 0
+            self.generation += 1
+    def __len__(self) -> int:
+        return len(self._lru)
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total > 0 else 0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": f"{hit_rate:.1f}%",
+            "cache_size": len(self._lru),
+            "cache_bytes": self._bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale_stores": self.stale_stores,
+            "generation": self.generation,
+        }
+class AnswerCache:
+    """
+    LLM answer cache keyed by (paper_id, normalized question, model, options).
+    Exact keys hit directly. When a question embedding is supplied, a
+    near-duplicate question about the *same* paper with the same model and
+    options also hits; answers never leak across papers.
+    """
+    def __init__(
+        self,
+        max_size: int = 2000,
+        similarity_threshold: float = 0.97,
+        ttl_s: Optional[float] = None
+    ):
+        """
+        Initialize the cache.
+        Args:
+            max_size: Maximum number of cached answers (LRU)
+            similarity_threshold: Minimum question cosine similarity for a near-duplicate hit
+            ttl_s: Answer lifetime in seconds (None = no expiry)
+        """
+        self.max_size = max_size
+        self.similarity_threshold = similarity_threshold
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._answers: "OrderedDict[tuple, Tuple[str, float]]" = OrderedDict()
+        self._groups: Dict[tuple, Dict[tuple, np.ndarray]] = {}
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+    @staticmethod
+    def key(paper_id: str, question: str, model: str, options: Optional[Dict[str, Any]] = None) -> tuple:
+        """Build the exact cache key (also usable as a single-flight key)."""
+        opts = json.dumps(options or {}, sort_keys=True)
+        return (paper_id, model, opts, normalize_text(question))
+    def _forget(self, key: tuple) -> None:
+        self._answers.pop(key, None)
+        group = self._groups.get(key[:3])
+        if group is not None:
+            group.pop(key, None)
+            if not group:
+                del self._groups[key[:3]]
+    def _live(self, key: tuple) -> Optional[str]:
+        entry = self._answers.get(key)
+        if entry is None:
+            return None
+        answer, expires = entry
+        if expires <= time.monotonic():
+            self._forget(key)
+            return None
+        self._answers.move_to_end(key)
+        return answer
+    def lookup(
+        self,
+        paper_id: str,
+        question: str,
+        model: str,
+        options: Optional[Dict[str, Any]] = None,
+        question_vec: Optional[np.ndarray] = None
+    ) -> Optional[str]:
+        """Return a cached answer for this paper/question, or None."""
+        key = self.key(paper_id, question, model, options)
+        with self._lock:
+            answer = self._live(key)
+            if answer is not None:
+                self.hits += 1
+                return answer
+            group = self._groups.get(key[:3])
+            if question_vec is not None and group:
+                keys = list(group)
+                q = np.asarray(question_vec, dtype=np.float32).ravel()
+                q = q / (np.linalg.norm(q) + 1e-10)
+                sims = np.stack([group[k] for k in keys]) @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.similarity_threshold:
+                    answer = self._live(keys[best])
+                    if answer is not None:
+                        self.hits += 1
+                        self.near_hits += 1
+                        return answer
+            self.misses += 1
+            return None
+    def store(
+        self,
+        paper_id: str,
+        question: str,
+        model: str,
+        options: Optional[Dict[str, Any]],
+        answer: str,
+        question_vec: Optional[np.ndarray] = None
+    ) -> None:
+        """Cache ``answer``, evicting the least recently used answers."""
+        key = self.key(paper_id, question, model, options)
+        expires = time.monotonic() + self.ttl_s if self.ttl_s is not None else float("inf")
+        with self._lock:
+            self._answers[key] = (answer, expires)
+            self._answers.move_to_end(key)
+            if question_vec is not None:
+                q = np.asarray(question_vec, dtype=np.float32).ravel()
+                self._groups.setdefault(key[:3], {})[key] = q / (np.linalg.norm(q) + 1e-10)
+            while len(self._answers) > self.max_size:
+                self._forget(next(iter(self._answers)))
+    def invalidate(self, paper_id: Optional[str] = None) -> None:
+        """Drop all answers, or only those about ``paper_id``."""
+        with self._lock:
+            for key in [k for k in self._answers if paper_id is None or k[0] == paper_id]:
+                self._forget(key)
+    def __len__(self) -> int:
+        return len(self._answers)
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_duplicate_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": f"{(self.hits / total * 100) if total else 0:.1f}%",
+            "cache_size": len(self._answers),
+        }
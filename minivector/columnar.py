@@ -0,0 +1,262 @@
+"""
+MiniVector Columnar Metadata - Shareable document store
+=======================================================
+A list of metadata dicts costs hundreds of bytes per document in Python
+objects, and every process that touches them (including forked workers,
+whose reference counting dirties copy-on-write pages) ends up with a
+private copy. ``ColumnarMetadata`` keeps each field in flat files that are
+memory-mapped read-only, so N serving processes share one copy through the
+page cache. Rows are decoded into dicts only when a result is returned.
+Disk layout (directory):
+    - columns.json: row count, column names/kinds, generation and the size
+      and mtime of the metadata.json the store was built from (written
+      last, so its presence marks a complete store)
+    - g<gen>-<i>.bin / g<gen>-<i>.offsets.npy: UTF-8 value blob and int64
+      (N + 1,) byte offsets of the i-th column; 'json' columns hold
+      JSON-encoded values
+    - g<gen>-<i>.valid.npy: bool (N,) whether the row has the field
+    - g<gen>-id_hash.npy / g<gen>-id_rows.npy: sorted 64-bit id hashes and
+      their rows, for O(log N) lookup by document id without a per-process dict
+Every save writes a new generation of files and then swaps columns.json,
+so a reader always opens the files its manifest names, never a mix of two
+builds. The previous generation is kept for readers that are mid-load.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Union
+import numpy as np
+STR = "str"
+JSON = "json"
+def stable_hash(text: str) -> int:
+    """63-bit hash that is identical across processes and runs (unlike ``hash()``)."""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), "little") >> 1
+def atomic_write(path: Path, write: Callable[[BinaryIO], Any]) -> None:
+    """
+    Call ``write(f)`` on a temporary file next to ``path`` and rename it over ``path``.
+    Processes that still map the old file keep reading the old inode instead
+    of a truncated one.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+def source_fingerprint(path: Union[str, Path]) -> Dict[str, int]:
+    """Size and mtime of a source file; changes when the file is rewritten in place."""
+    stat = Path(path).stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+def _read_manifest(directory: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(directory / "columns.json", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+def _prefix(manifest: Dict[str, Any]) -> str:
+    # Stores written before generations were introduced use bare file names
+    return f"g{manifest['generation']}-" if "generation" in manifest else ""
+class _Column:
+    def __init__(self, kind: str, blob: np.ndarray, offsets: np.ndarray, valid: np.ndarray):
+        self.kind = kind
+        self.blob = blob
+        self.offsets = offsets
+        self.valid = valid
+    def value(self, row: int) -> Any:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        text = bytes(self.blob[start:end]).decode('utf-8')
+        return text if self.kind == STR else json.loads(text)
+    @property
+    def nbytes(self) -> int:
+        return int(self.blob.nbytes + self.offsets.nbytes + self.valid.nbytes)
+class ColumnarMetadata:
+    """
+    Read-only, memory-mappable document metadata with dict-like row access.
+    Supports ``len``, ``metadata[row]`` and iteration like the list of dicts
+    it replaces, and ``get(doc_id)`` so it can serve as ``BinaryIndex.id_to_row``.
+    Example:
+        >>> ColumnarMetadata.build(docs).save("data/processed/metadata_columnar")
+        >>> meta = ColumnarMetadata.load("data/processed/metadata_columnar")
+        >>> meta[meta.row_of("2511.16674v1")]["title"]
+    """
+    def __init__(
+        self,
+        num_rows: int,
+        columns: Dict[str, _Column],
+        id_hash: np.ndarray,
+        id_rows: np.ndarray,
+        id_field: str = "id",
+        source: Optional[Dict[str, int]] = None
+    ):
+        """
+        Initialize from decoded column arrays (use ``build`` or ``load``).
+        Args:
+            num_rows: Number of documents
+            columns: Column name -> column arrays, in output field order
+            id_hash: Sorted uint64 hashes of the document ids
+            id_rows: Row of each entry in ``id_hash``
+            id_field: Name of the document id column
+            source: ``source_fingerprint`` of the metadata.json the rows were
+                read from (None if unknown)
+        """
+        self.num_rows = num_rows
+        self.columns = columns
+        self.id_hash = id_hash
+        self.id_rows = id_rows
+        self.id_field = id_field
+        self.source = source
+    @classmethod
+    def build(cls, docs: List[Dict[str, Any]], id_field: str = "id") -> "ColumnarMetadata":
+        """
+        Build an in-memory store from metadata dicts.
+        Columns are ordered by first appearance; a column whose values are all
+        strings is stored raw, anything else is stored JSON-encoded.
+        """
+        names: Dict[str, None] = {}
+        for doc in docs:
+            for name in doc:
+                names.setdefault(name, None)
+        columns = {}
+        for name in names:
+            values = [doc.get(name) for doc in docs]
+            valid = np.array([name in doc for doc in docs], dtype=bool)
+            kind = STR if all(isinstance(v, str) for v, ok in zip(values, valid) if ok) else JSON
+            encoded = [
+                (v if kind == STR else json.dumps(v, ensure_ascii=False)).encode('utf-8') if ok else b""
+                for v, ok in zip(values, valid)
+            ]
+            offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+            np.cumsum([len(e) for e in encoded], out=offsets[1:])
+            columns[name] = _Column(kind, np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets, valid)
+        hashes = np.array([stable_hash(str(doc.get(id_field))) for doc in docs], dtype=np.uint64)
+        order = np.argsort(hashes, kind='stable')
+        return cls(len(docs), columns, hashes[order], order.astype(np.int64), id_field)
+    @classmethod
+    def from_json(cls, path: Union[str, Path], id_field: str = "id") -> "ColumnarMetadata":
+        """Build a store from a metadata.json file, remembering which version of it was read."""
+        source = source_fingerprint(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            store = cls.build(json.load(f), id_field)
+        store.source = source
+        return store
+    def save(self, directory: Union[str, Path], source: Optional[Union[str, Path]] = None) -> None:
+        """
+        Write the store into ``directory`` as a new generation (columns.json last).
+        Args:
+            directory: Store directory
+            source: metadata.json the rows came from, if not read by ``from_json``
+        Files of generations older than the one being replaced are removed;
+        processes still mapping them keep reading the unlinked inodes.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        if source is not None:
+            self.source = source_fingerprint(source)
+        previous = _read_manifest(directory)
+        generation = (previous or {}).get("generation", 0) + 1
+        prefix = f"g{generation}-"
+        for i, column in enumerate(self.columns.values()):
+            atomic_write(directory / f"{prefix}{i}.bin", lambda f, blob=column.blob: f.write(np.asarray(blob, dtype=np.uint8).tobytes()))
+            atomic_write(directory / f"{prefix}{i}.offsets.npy", lambda f, a=column.offsets: np.save(f, a))
+            atomic_write(directory / f"{prefix}{i}.valid.npy", lambda f, a=column.valid: np.save(f, a))
+        atomic_write(directory / f"{prefix}id_hash.npy", lambda f: np.save(f, self.id_hash))
+        atomic_write(directory / f"{prefix}id_rows.npy", lambda f: np.save(f, self.id_rows))
+        manifest = {
+            "num_rows": self.num_rows,
+            "id_field": self.id_field,
+            "generation": generation,
+            "source": self.source,
+            "columns": [{"name": name, "kind": column.kind} for name, column in self.columns.items()],
+        }
+        atomic_write(directory / "columns.json", lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+        keep = {prefix, _prefix(previous) if previous is not None else prefix}
+        for path in directory.iterdir():
+            if path.suffix not in (".bin", ".npy"):
+                continue
+            tag = path.name.split("-", 1)[0] + "-" if path.name.startswith("g") and "-" in path.name else ""
+            if tag not in keep:
+                path.unlink(missing_ok=True)
+    @staticmethod
+    def is_current(directory: Union[str, Path], source: Union[str, Path]) -> bool:
+        """Whether the store in ``directory`` was built from ``source`` as it is now."""
+        manifest = _read_manifest(Path(directory))
+        return manifest is not None and manifest.get("source") is not None and manifest["source"] == source_fingerprint(source)
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap: bool = True) -> "ColumnarMetadata":
+        """Load a store written by ``save``, memory-mapping every array."""
+        directory = Path(directory)
+        for attempt in range(3):
+            with open(directory / "columns.json", 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            try:
+                return cls._load_generation(directory, manifest, mmap)
+            except FileNotFoundError:
+                # Two saves finished between reading the manifest and the files
+                if attempt == 2:
+                    raise
+    @classmethod
+    def _load_generation(cls, directory: Path, manifest: Dict[str, Any], mmap: bool) -> "ColumnarMetadata":
+        mode = 'r' if mmap else None
+        prefix = _prefix(manifest)
+        columns = {}
+        for i, spec in enumerate(manifest["columns"]):
+            blob_path = directory / f"{prefix}{i}.bin"
+            if blob_path.stat().st_size and mmap:
+                blob = np.memmap(blob_path, dtype=np.uint8, mode='r')
+            else:
+                blob = np.fromfile(blob_path, dtype=np.uint8)
+            columns[spec["name"]] = _Column(
+                spec["kind"],
+                blob,
+                np.load(directory / f"{prefix}{i}.offsets.npy", mmap_mode=mode),
+                np.load(directory / f"{prefix}{i}.valid.npy", mmap_mode=mode),
+            )
+        return cls(
+            manifest["num_rows"],
+            columns,
+            np.load(directory / f"{prefix}id_hash.npy", mmap_mode=mode),
+            np.load(directory / f"{prefix}id_rows.npy", mmap_mode=mode),
+            manifest.get("id_field", "id"),
+            manifest.get("source"),
+        )
+    def __len__(self) -> int:
+        return self.num_rows
+    def __getitem__(self, row: int) -> Dict[str, Any]:
+        """Decode row ``row`` into a new dict."""
+        if row < 0:
+            row += self.num_rows
+        if not 0 <= row < self.num_rows:
+            raise IndexError(f"row {row} out of range for {self.num_rows} documents")
+        return {name: column.value(row) for name, column in self.columns.items() if column.valid[row]}
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in range(self.num_rows):
+            yield self[row]
+    def value(self, row: int, name: str) -> Any:
+        """Single field of one row (None if absent)."""
+        column = self.columns.get(name)
+        if column is None or not column.valid[row]:
+            return None
+        return column.value(row)
+    def column(self, name: str) -> List[Any]:
+        """All values of one field (None where absent)."""
+        return [self.value(row, name) for row in range(self.num_rows)]
+    def row_of(self, doc_id: str) -> Optional[int]:
+        """Row of ``doc_id`` or None, via binary search over the id hashes."""
+        h = np.uint64(stable_hash(str(doc_id)))
+        pos = int(np.searchsorted(self.id_hash, h))
+        while pos < len(self.id_hash) and self.id_hash[pos] == h:
+            row = int(self.id_rows[pos])
+            if str(self.value(row, self.id_field)) == str(doc_id):
+                return row
+            pos += 1
+        return None
+    def get(self, doc_id: str, default: Optional[int] = None) -> Optional[int]:
+        """Mapping-style ``row_of`` (the ``id_to_row.get`` interface)."""
+        row = self.row_of(doc_id)
+        return default if row is None else row
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store statistics."""
+        return {
+            "num_rows": self.num_rows,
+            "num_columns": len(self.columns),
+            "bytes": int(sum(c.nbytes for c in self.columns.values()) + self.id_hash.nbytes + self.id_rows.nbytes),
+        }
@@ -1,20 +1,124 @@
 HAS_TRANSFORMERS = False
+import os
 import numpy as np
-from typing import List
+from pathlib import Path
+from typing import Dict, List, Optional
+MODEL_DIR = Path(os.getenv("EMBEDDER_MODEL_DIR", "data/models"))
+class DummyBackend:
+    name = "dummy"
+    def __init__(self, model_name: str, dim: int = 384, **kwargs):
+        print(f"  -> Initializing Dummy Embedder (Random Vectors)")
+        self.dim = dim
+        self.model_id = "dummy"
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return np.random.rand(len(texts), self.dim).astype(np.float32)
+class SentenceTransformerBackend:
+    name = "sentence-transformers"
+    def __init__(self, model_name: str, intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None, **kwargs):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if intra_op_threads:
+            torch.set_num_threads(intra_op_threads)
+        if inter_op_threads:
+            try:
+                torch.set_num_interop_threads(inter_op_threads)
+            except RuntimeError:
+                pass
+        print(f"  -> Initializing Sentence Transformer: {model_name}")
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.model_id = model_name
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        embeddings = self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+        return embeddings.astype(np.float32)
+def export_onnx(model_name: str, out_dir: Path = MODEL_DIR, quantize: bool = True) -> Path:
+    hf_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    target = Path(out_dir) / hf_name.replace("/", "__")
+    fp32_path = target / "model.onnx"
+    int8_path = target / "model.int8.onnx"
+    if not fp32_path.exists():
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        print(f"  -> Exporting {hf_name} to ONNX...")
+        target.mkdir(parents=True, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(hf_name)
+        model = AutoModel.from_pretrained(hf_name).eval()
+        tokenizer.save_pretrained(target)
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+        axes = {n: {0: "batch", 1: "seq"} for n in names}
+        axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+        with torch.no_grad():
+            torch.onnx.export(model, tuple(sample[n] for n in names), str(fp32_path), input_names=names,
+                              output_names=["last_hidden_state"], dynamic_axes=axes, opset_version=14)
+    if not quantize:
+        return fp32_path
+    if not int8_path.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        print(f"  -> Quantizing {fp32_path.name} to int8 (dynamic)...")
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    return int8_path
+class OnnxBackend:
+    name = "onnx"
+    def __init__(self, model_name: str, quantize: bool = True, intra_op_threads: Optional[int] = None,
+                 inter_op_threads: Optional[int] = None, model_dir: Path = MODEL_DIR, max_length: int = 256, **kwargs):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        path = export_onnx(model_name, model_dir, quantize)
+        print(f"  -> Initializing ONNX Runtime Embedder: {path}")
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            opts.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            opts.inter_op_num_threads = inter_op_threads
+            opts.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self.session = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(str(path.parent))
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.max_length = max_length
+        self.dim = self.session.get_outputs()[0].shape[-1]
+        if not isinstance(self.dim, int):
+            self.dim = 384
+        self.model_id = f"{model_name}:onnx-{'int8' if quantize else 'fp32'}"
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        out = []
+        for i in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(texts[i:i + batch_size], padding=True, truncation=True,
+                                    max_length=self.max_length, return_tensors="np")
+            feeds = {k: v.astype(np.int64) for k, v in tokens.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            out.append(pooled / (np.linalg.norm(pooled, axis=1, keepdims=True) + 1e-12))
+        return np.vstack(out).astype(np.float32) if out else np.zeros((0, self.dim), dtype=np.float32)
+BACKENDS: Dict[str, type] = {
+    "dummy": DummyBackend,
+    "sentence-transformers": SentenceTransformerBackend,
+    "onnx": OnnxBackend,
+}
+def register_backend(name: str, backend_cls: type) -> None:
+    BACKENDS[name] = backend_cls
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
 class Embedder:
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
-        self.dim = 384 
-        if HAS_TRANSFORMERS:
-            print(f"  -> Initializing Sentence Transformer: {model_name}")
-            self.model = SentenceTransformer(model_name)
-            self.dim = self.model.get_sentence_embedding_dimension()
-        else:
-            print(f"  -> Initializing Dummy Embedder (Random Vectors)")
-    def embed(self, texts: List[str], **kwargs) -> np.ndarray:
-        if HAS_TRANSFORMERS:
-            embeddings = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
-            return embeddings.astype(np.float32)
-        else:
-            return np.random.rand(len(texts), self.dim).astype(np.float32)
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', backend: Optional[str] = None,
+                 intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None, **backend_kwargs):
+        backend = backend or os.getenv("EMBEDDER_BACKEND") or ("sentence-transformers" if HAS_TRANSFORMERS else "dummy")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedder backend '{backend}'. Available: {sorted(BACKENDS)}")
+        if backend == "onnx" and "quantize" not in backend_kwargs and os.getenv("EMBEDDER_QUANTIZE"):
+            backend_kwargs["quantize"] = os.getenv("EMBEDDER_QUANTIZE") != "0"
+        self.backend = BACKENDS[backend](
+            model_name,
+            intra_op_threads=intra_op_threads or _env_int("EMBEDDER_INTRA_THREADS"),
+            inter_op_threads=inter_op_threads or _env_int("EMBEDDER_INTER_THREADS"),
+            **backend_kwargs
+        )
+        self.dim = self.backend.dim
+        self.model_name = self.backend.model_id
+    def embed(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        return self.backend.encode(list(texts), batch_size=batch_size)
     def embed_query(self, text: str) -> np.ndarray:
         return self.embed([text])[0]
@@ -0,0 +1,205 @@
+"""
+MiniVector Response Encoding - Content negotiation for search payloads
+=====================================================================
+Search responses are plain dicts holding a list of hit dicts. Rendering them
+through FastAPI's default encoder walks every value twice (jsonable_encoder,
+then json.dumps), which shows up in profiles for k=100 responses. This module
+serializes payloads directly into bytes in the format the client asked for:
+    - application/json: orjson when installed, stdlib json otherwise
+    - application/msgpack: compact binary for machine clients; float32
+      vectors travel as raw bytes instead of 384-element lists
+    - application/vnd.apache.arrow.stream: the hit list as one Arrow record
+      batch, with the remaining top-level fields in the schema metadata
+Optional dependencies (orjson, msgpack, pyarrow) are used when installed;
+formats whose library is missing are simply not offered during negotiation.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+try:
+    import msgpack as _msgpack
+except ImportError:
+    _msgpack = None
+try:
+    import pyarrow as _pa
+except ImportError:
+    _pa = None
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+_ALIASES = {
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    "application/vnd.apache.arrow.file": ARROW,
+}
+_ARROW_META_KEY = b"minivector"
+def available_formats() -> List[str]:
+    """Media types that can be produced with the installed libraries."""
+    formats = [JSON]
+    if _msgpack is not None:
+        formats.append(MSGPACK)
+    if _pa is not None:
+        formats.append(ARROW)
+    return formats
+def _media_type(value: Optional[str]) -> str:
+    media = (value or "").split(";", 1)[0].strip().lower()
+    return _ALIASES.get(media, media)
+def negotiate(accept: Optional[str], allow_arrow: bool = True) -> str:
+    """
+    Pick the response media type for an ``Accept`` header.
+    Honours q-values; ties keep the client's order. Unknown or missing
+    headers (and ``*/*``) fall back to JSON.
+    Args:
+        accept: Raw ``Accept`` header value
+        allow_arrow: Whether the endpoint's payload can be rendered as Arrow
+    """
+    if not accept:
+        return JSON
+    offered = available_formats()
+    if not allow_arrow and ARROW in offered:
+        offered.remove(ARROW)
+    best, best_q = JSON, 0.0
+    for part in accept.split(","):
+        fields = part.split(";")
+        media = _media_type(fields[0])
+        q = 1.0
+        for param in fields[1:]:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media in ("*/*", "application/*"):
+            media = JSON
+        if media in offered and q > best_q:
+            best, best_q = media, q
+    return best
+def _default(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray) and obj.dtype == np.float32:
+        return pack_vector(obj)
+    return _default(obj)
+def encode_json(payload: Any) -> bytes:
+    """Serialize to JSON bytes (orjson fast path when available)."""
+    if _orjson is not None:
+        return _orjson.dumps(payload, default=_default, option=_orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+def encode_arrow(payload: Dict[str, Any], table_key: str = "results") -> bytes:
+    """
+    Serialize ``payload[table_key]`` (a list of dicts) as an Arrow IPC stream.
+    Columns are the union of the row keys; missing values are null. The
+    other top-level fields are stored as JSON in the schema metadata.
+    Columns Arrow cannot type (e.g. an int in one row and a str in the next)
+    are stored as JSON text and listed in the metadata, so ``decode``
+    restores the original values.
+    """
+    if _pa is None:
+        raise ImportError("pyarrow is required for Arrow encoding")
+    rows = payload.get(table_key) or []
+    columns: Dict[str, None] = {}
+    for row in rows:
+        for key in row:
+            columns.setdefault(key, None)
+    arrays = {}
+    json_columns = []
+    for key in columns:
+        values = [row.get(key) for row in rows]
+        try:
+            arrays[key] = _pa.array(values)
+        except (_pa.ArrowInvalid, _pa.ArrowTypeError, OverflowError):
+            arrays[key] = _pa.array([None if v is None else encode_json(v).decode("utf-8") for v in values], type=_pa.string())
+            json_columns.append(key)
+    table = _pa.table(arrays)
+    extra = {key: value for key, value in payload.items() if key != table_key}
+    meta = encode_json({"table_key": table_key, "fields": extra, "json_columns": json_columns})
+    table = table.replace_schema_metadata({_ARROW_META_KEY: meta})
+    sink = _pa.BufferOutputStream()
+    with _pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+def encode(payload: Any, media_type: str = JSON, table_key: str = "results") -> bytes:
+    """
+    Serialize ``payload`` in ``media_type``.
+    Args:
+        payload: Response dict (NumPy scalars and arrays are accepted)
+        media_type: One of JSON, MSGPACK, ARROW
+        table_key: Field holding the row list for Arrow encoding
+    """
+    media_type = _media_type(media_type)
+    if media_type == MSGPACK:
+        if _msgpack is None:
+            raise ImportError("msgpack is required for MessagePack encoding")
+        return _msgpack.packb(payload, default=_msgpack_default, use_bin_type=True)
+    if media_type == ARROW:
+        return encode_arrow(payload, table_key)
+    return encode_json(payload)
+def render(
+    payload: Any,
+    accept: Optional[str] = None,
+    table_key: Optional[str] = "results"
+) -> Tuple[bytes, str]:
+    """
+    Negotiate and serialize in one step.
+    Args:
+        payload: Response dict
+        accept: Raw ``Accept`` header value
+        table_key: Row list field for Arrow, or None if the payload has none
+    Returns:
+        Tuple of (body bytes, media type); JSON if Arrow encoding fails
+    """
+    media_type = negotiate(accept, allow_arrow=table_key is not None)
+    if media_type == ARROW:
+        try:
+            return encode_arrow(payload, table_key), media_type
+        except (_pa.ArrowException, TypeError, ValueError):
+            # Rows Arrow cannot represent even as JSON text columns: answer in JSON
+            return encode_json(payload), JSON
+    return encode(payload, media_type, table_key or "results"), media_type
+def decode(body: bytes, media_type: Optional[str] = None) -> Any:
+    """Inverse of ``encode`` (Arrow streams come back as plain dicts)."""
+    media_type = _media_type(media_type) or JSON
+    if media_type == MSGPACK:
+        if _msgpack is None:
+            raise ImportError("msgpack is required for MessagePack decoding")
+        return _msgpack.unpackb(body, raw=False)
+    if media_type == ARROW:
+        if _pa is None:
+            raise ImportError("pyarrow is required for Arrow decoding")
+        table = _pa.ipc.open_stream(body).read_all()
+        meta = json.loads((table.schema.metadata or {}).get(_ARROW_META_KEY, b"{}"))
+        payload = dict(meta.get("fields", {}))
+        rows = table.to_pylist()
+        for key in meta.get("json_columns", []):
+            for row in rows:
+                if row[key] is not None:
+                    row[key] = json.loads(row[key])
+        payload[meta.get("table_key", "results")] = rows
+        return payload
+    if not body:
+        return None
+    if _orjson is not None:
+        return _orjson.loads(body)
+    return json.loads(body)
+def pack_vector(vec: np.ndarray) -> bytes:
+    """Little-endian float32 bytes of a query vector (for binary request bodies)."""
+    return np.ascontiguousarray(vec, dtype="<f4").tobytes()
+def unpack_vector(value: Any) -> np.ndarray:
+    """Query vector from raw float32 bytes or a JSON number list."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype="<f4").astype(np.float32)
+    return np.asarray(value, dtype=np.float32)
+def vector_field(vec: np.ndarray, media_type: str) -> Any:
+    """Representation of ``vec`` inside a request body of ``media_type``."""
+    if _media_type(media_type) == MSGPACK:
+        return pack_vector(vec)
+    return np.asarray(vec, dtype=np.float32).tolist()
@@ -0,0 +1,215 @@
+"""
+MiniVector Compute Executor - CPU-bound work off the event loop
+===============================================================
+Embedding and Hamming search are CPU-bound; running them inline in an
+``async def`` handler stalls every other request on the loop (including
+``/health``). ``ComputeExecutor`` runs them in a dedicated pool with a
+bounded queue and records how long each job waited before it started.
+Pool kinds:
+    - thread (default): the C++ core, the NumPy Hamming kernels and torch
+      all release the GIL, so threads scale without copying any state
+    - process: for GIL-bound kernels. Children are started from a clean
+      forkserver (spawn where unavailable) instead of forking the serving
+      process, so they never inherit its listening socket or its signal
+      handlers and cannot outlive it holding the port. Jobs must be
+      module-level functions; an ``initializer`` rebuilds the state they
+      read (e.g. loads the index) in each child
+"""
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+import numpy as np
+from .metrics import EXECUTOR_QUEUE
+class ExecutorSaturated(RuntimeError):
+    """Raised when the executor queue is full and a job is rejected."""
+def _timed_call(fn: Callable, args: tuple) -> Tuple[float, float, Any]:
+    started = time.time()
+    result = fn(*args)
+    return started, time.time(), result
+def resolve_kind(kind: str = "auto") -> str:
+    """Pool kind for ``kind``; 'auto' is 'thread' (every search kernel releases the GIL)."""
+    if kind not in ("auto", "thread", "process"):
+        raise ValueError(f"Unknown executor kind {kind!r} (expected 'thread', 'process' or 'auto')")
+    return "thread" if kind == "auto" else kind
+def _close_listening_sockets() -> None:
+    # A forkserver/spawn child inherits no sockets by default; this guards against
+    # ones a parent marked inheritable, which would keep its port bound.
+    try:
+        fds = [int(fd) for fd in os.listdir("/proc/self/fd")]
+    except OSError:
+        return
+    for fd in fds:
+        if fd <= 2:
+            continue
+        try:
+            sock = socket.socket(fileno=os.dup(fd))
+        except OSError:
+            continue
+        try:
+            listening = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ACCEPTCONN)
+        except OSError:
+            listening = 0
+        finally:
+            sock.close()
+        if listening:
+            os.close(fd)
+def _exit_with_parent(parent_pid: int, poll_s: float = 1.0) -> None:
+    while True:
+        time.sleep(poll_s)
+        try:
+            os.kill(parent_pid, 0)
+        except ProcessLookupError:
+            os._exit(0)
+        except PermissionError:
+            continue
+def _init_child(parent_pid: int, initializer: Optional[Callable], initargs: tuple) -> None:
+    """Process-pool child setup: default signal handlers, no server sockets, exit with the parent, then the caller's initializer."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    _close_listening_sockets()
+    # A SIGKILLed parent cannot shut the pool down; children must notice on their own
+    threading.Thread(target=_exit_with_parent, args=(parent_pid,), name="minivector-parent-watch", daemon=True).start()
+    if initializer is not None:
+        initializer(*initargs)
+def _process_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+class ComputeExecutor:
+    """
+    Bounded pool for CPU-bound jobs with per-job queue-time accounting.
+    Example:
+        >>> executor = ComputeExecutor("search", max_workers=4, max_queue=64)
+        >>> results, queue_ms = await executor.run_timed(search_job, q_vec, 10)
+    """
+    def __init__(
+        self,
+        name: str,
+        max_workers: Optional[int] = None,
+        max_queue: int = 64,
+        kind: str = "thread",
+        stats_window: int = 1024,
+        initializer: Optional[Callable] = None,
+        initargs: tuple = ()
+    ):
+        """
+        Initialize the executor.
+        Args:
+            name: Label used in stats and thread names
+            max_workers: Pool size (default: CPU count)
+            max_queue: Jobs allowed to wait beyond the running ones before rejecting
+            kind: 'thread', 'process' or 'auto'
+            stats_window: Number of recent samples kept for percentiles
+            initializer: Called as ``initializer(*initargs)`` in each process-pool
+                child before it takes jobs (ignored for thread pools)
+            initargs: Arguments for ``initializer``
+        """
+        self.name = name
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.kind = resolve_kind(kind)
+        self.initializer = initializer
+        self.initargs = tuple(initargs)
+        self._pool = self._make_pool()
+        self._pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.recycles = 0
+        self._queue_times_ms: Deque[float] = deque(maxlen=stats_window)
+        self._run_times_ms: Deque[float] = deque(maxlen=stats_window)
+    def _make_pool(self):
+        if self.kind == "process":
+            pool = ProcessPoolExecutor(self.max_workers, mp_context=_process_context(),
+                                       initializer=_init_child, initargs=(os.getpid(), self.initializer, self.initargs))
+            # Start every child (and run its initializer) now, not on the first
+            # requests, whose budgets a cold start would use up
+            for _ in range(self.max_workers):
+                pool.submit(os.getpid)
+            return pool
+        return ThreadPoolExecutor(self.max_workers, thread_name_prefix=f"minivector-{self.name}")
+    @property
+    def pool(self):
+        """Underlying ``concurrent.futures`` executor (e.g. for ``run_in_executor``)."""
+        return self._pool
+    @property
+    def pending(self) -> int:
+        """Jobs submitted and not yet finished (running + queued)."""
+        return self._pending
+    async def run_timed(self, fn: Callable, *args) -> Tuple[Any, float]:
+        """
+        Run ``fn(*args)`` in the pool.
+        Returns:
+            Tuple of (result, queue time in ms)
+        Raises:
+            ExecutorSaturated: If running + queued jobs already fill the pool and queue
+        """
+        if self._pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise ExecutorSaturated(f"{self.name} executor saturated ({self._pending} pending)")
+        self._pending += 1
+        self.submitted += 1
+        submitted_at = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            started, finished, result = await loop.run_in_executor(self._pool, _timed_call, fn, args)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+        queue_ms = max(0.0, (started - submitted_at) * 1000)
+        self.completed += 1
+        self._queue_times_ms.append(queue_ms)
+        EXECUTOR_QUEUE.observe(queue_ms / 1000, executor=self.name)
+        self._run_times_ms.append((finished - started) * 1000)
+        return result, queue_ms
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run ``fn(*args)`` in the pool and return its result."""
+        result, _ = await self.run_timed(fn, *args)
+        return result
+    def recycle(self, initargs: Optional[tuple] = None) -> None:
+        """
+        Swap in a fresh pool; the old one finishes its queued jobs in the background.
+        Process-pool children hold the state their initializer built, so they
+        must be recycled after the objects their jobs read (e.g. the index) are
+        replaced on disk.
+        Args:
+            initargs: New initializer arguments (default: keep the current ones)
+        """
+        if initargs is not None:
+            self.initargs = tuple(initargs)
+        old = self._pool
+        self._pool = self._make_pool()
+        self.recycles += 1
+        threading.Thread(target=old.shutdown, kwargs={"wait": True}, name=f"minivector-{self.name}-drain", daemon=True).start()
+    def shutdown(self, wait: bool = False) -> None:
+        """Shut the pool down."""
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue and run-time statistics."""
+        queue_times = np.array(self._queue_times_ms) if self._queue_times_ms else np.zeros(1)
+        run_times = np.array(self._run_times_ms) if self._run_times_ms else np.zeros(1)
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "recycles": self.recycles,
+            "queue_time_avg_ms": float(np.mean(queue_times)),
+            "queue_time_p50_ms": float(np.percentile(queue_times, 50)),
+            "queue_time_p99_ms": float(np.percentile(queue_times, 99)),
+            "run_time_avg_ms": float(np.mean(run_times)),
+        }
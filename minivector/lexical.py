@@ -0,0 +1,257 @@
+"""
+MiniVector Lexical Index - BM25 first stage and hybrid fusion
+=============================================================
+Keyword-heavy queries (arXiv ids, author names, acronyms) are poorly served
+by a 1-bit embedding scan: the embedding blurs exact tokens and the scan
+touches every document. ``LexicalIndex`` is a compact BM25 inverted index
+over the id, title, authors and abstract of each document:
+    - lexical: BM25 top-k from postings only (no embedding, no scan)
+    - rerank: BM25 candidates re-scored by Hamming distance to the query
+      embedding (``BinaryIndex.rescore``), touching only candidate rows
+    - rrf: reciprocal-rank fusion of the vector and BM25 result lists
+Disk layout (directory, every array memory-mapped on load):
+    - lexical.json: document count, corpus fingerprint, BM25 parameters (written last)
+    - term_hash.npy: uint64 (T,) sorted term hashes; term id = position
+    - terms.bin / term_offsets.npy: UTF-8 term text for collision checks
+    - offsets.npy: int64 (T + 1,) posting range of each term
+    - doc_ids.npy / tfs.npy: int32 / uint16 (P,) postings, grouped by term
+    - doc_lens.npy: uint32 (N,) weighted token count of each document
+Rows are the same row numbers as the ``BinaryIndex`` built from the same
+metadata, so results share ``format_results``; ``corpus_fingerprint`` of the
+metadata ids tells whether an index on disk still lines up with it.
+"""
+import hashlib
+import json
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from .columnar import atomic_write, stable_hash
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.\-_/][a-z0-9]+)*")
+_PARTS = re.compile(r"[.\-_/]")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was we were which with".split()
+)
+DEFAULT_FIELDS = {"id": 1, "title": 2, "authors": 1, "abstract": 1}
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens without stopwords.
+    Compound tokens such as ``2511.16674v1`` or ``gpt-4`` are kept whole and
+    also split into their parts, so both the exact id and its pieces match.
+    """
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if _PARTS.search(token):
+            tokens.extend(part for part in _PARTS.split(token) if part and part not in STOPWORDS)
+    return tokens
+def _field_text(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value)
+    return "" if value is None else str(value)
+def corpus_fingerprint(ids: Iterable[Any]) -> str:
+    """Digest of the document ids in row order; differs if any row holds another document."""
+    digest = hashlib.blake2b(digest_size=16)
+    for doc_id in ids:
+        digest.update(str(doc_id).encode('utf-8'))
+        digest.update(b"\0")
+    return digest.hexdigest()
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[np.ndarray],
+    k: int = 10,
+    rrf_k: float = 60.0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse several ranked row lists with reciprocal-rank fusion.
+    Each list contributes ``1 / (rrf_k + rank)`` (rank starting at 1) to the
+    rows it contains; rows are returned by descending fused score.
+    Returns:
+        Tuple of (rows int64, fused scores float32), at most ``k`` each
+    """
+    rows = np.concatenate([np.asarray(r, dtype=np.int64) for r in ranked_lists]) if ranked_lists else np.empty(0, np.int64)
+    if rows.size == 0:
+        return rows, np.empty(0, dtype=np.float32)
+    contrib = np.concatenate([1.0 / (rrf_k + np.arange(1, len(r) + 1)) for r in ranked_lists])
+    unique, inverse = np.unique(rows, return_inverse=True)
+    scores = np.bincount(inverse, weights=contrib).astype(np.float32)
+    order = np.lexsort((unique, -scores))[:k]
+    return unique[order], scores[order]
+class LexicalIndex:
+    """
+    Memory-mappable BM25 inverted index.
+    Example:
+        >>> LexicalIndex.build(docs).save("data/processed/lexical")
+        >>> lexical = LexicalIndex.load("data/processed/lexical")
+        >>> rows, scores = lexical.search("binary quantization", k=10)
+    """
+    def __init__(
+        self,
+        term_hash: np.ndarray,
+        terms_blob: np.ndarray,
+        term_offsets: np.ndarray,
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_lens: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+        fingerprint: str = ""
+    ):
+        """
+        Initialize from index arrays (use ``build`` or ``load``).
+        Args:
+            term_hash: Sorted uint64 term hashes (term id = position)
+            terms_blob: UTF-8 bytes of all terms in term id order
+            term_offsets: int64 (T + 1,) byte offsets into ``terms_blob``
+            offsets: int64 (T + 1,) posting offsets per term
+            doc_ids: int32 posting document rows
+            tfs: uint16 posting term frequencies
+            doc_lens: uint32 document lengths
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+            fingerprint: ``corpus_fingerprint`` of the indexed documents
+                ("" for an index written before fingerprints were stored)
+        """
+        self.term_hash = term_hash
+        self.terms_blob = terms_blob
+        self.term_offsets = term_offsets
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+        self.k1 = k1
+        self.b = b
+        self.num_docs = int(doc_lens.shape[0])
+        self.avg_len = float(np.mean(doc_lens)) if self.num_docs else 0.0
+        self.fingerprint = fingerprint
+        # Counted by the caller: searches may run in pool processes whose
+        # copies of this object are never read back
+        self.search_count = 0
+    @property
+    def num_terms(self) -> int:
+        return int(self.term_hash.shape[0])
+    @classmethod
+    def build(
+        cls,
+        docs: List[Dict[str, Any]],
+        fields: Optional[Dict[str, int]] = None,
+        k1: float = 1.2,
+        b: float = 0.75
+    ) -> "LexicalIndex":
+        """
+        Build an index over metadata dicts.
+        Args:
+            docs: Metadata dicts, in the row order of the vector index
+            fields: Field name -> weight (a weight of 2 counts each token twice)
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        fields = fields or DEFAULT_FIELDS
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lens = np.zeros(len(docs), dtype=np.uint32)
+        for row, doc in enumerate(docs):
+            counts: Counter = Counter()
+            for name, weight in fields.items():
+                for token in tokenize(_field_text(doc.get(name))):
+                    counts[token] += weight
+            doc_lens[row] = sum(counts.values())
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((row, min(tf, 65535)))
+        terms = sorted(postings, key=stable_hash)
+        term_hash = np.array([stable_hash(t) for t in terms], dtype=np.uint64)
+        encoded = [t.encode('utf-8') for t in terms]
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=term_offsets[1:])
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(postings[t]) for t in terms], out=offsets[1:])
+        flat = [p for t in terms for p in postings[t]]
+        doc_ids = np.array([row for row, _ in flat], dtype=np.int32)
+        tfs = np.array([tf for _, tf in flat], dtype=np.uint16)
+        return cls(term_hash, np.frombuffer(b"".join(encoded), dtype=np.uint8), term_offsets,
+                   offsets, doc_ids, tfs, doc_lens, k1, b, corpus_fingerprint(doc.get("id") for doc in docs))
+    def save(self, directory: Union[str, Path]) -> None:
+        """Write the index files into ``directory`` (lexical.json last, each file renamed into place)."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in ("term_hash", "term_offsets", "offsets", "doc_ids", "tfs", "doc_lens"):
+            atomic_write(directory / f"{name}.npy", lambda f, a=getattr(self, name): np.save(f, a))
+        atomic_write(directory / "terms.bin", lambda f: f.write(np.asarray(self.terms_blob, dtype=np.uint8).tobytes()))
+        meta = {"num_docs": self.num_docs, "num_terms": self.num_terms, "k1": self.k1, "b": self.b, "fingerprint": self.fingerprint}
+        atomic_write(directory / "lexical.json", lambda f: f.write(json.dumps(meta).encode('utf-8')))
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap: bool = True) -> "LexicalIndex":
+        """Load an index written by ``save``, memory-mapping the arrays."""
+        directory = Path(directory)
+        mode = 'r' if mmap else None
+        with open(directory / "lexical.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        blob_path = directory / "terms.bin"
+        if blob_path.stat().st_size and mmap:
+            terms_blob = np.memmap(blob_path, dtype=np.uint8, mode='r')
+        else:
+            terms_blob = np.fromfile(blob_path, dtype=np.uint8)
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode=mode)
+                  for name in ("term_hash", "term_offsets", "offsets", "doc_ids", "tfs", "doc_lens")}
+        return cls(arrays["term_hash"], terms_blob, arrays["term_offsets"], arrays["offsets"],
+                   arrays["doc_ids"], arrays["tfs"], arrays["doc_lens"], meta["k1"], meta["b"], meta.get("fingerprint", ""))
+    def _term(self, term_id: int) -> str:
+        start, end = int(self.term_offsets[term_id]), int(self.term_offsets[term_id + 1])
+        return bytes(self.terms_blob[start:end]).decode('utf-8')
+    def term_id(self, term: str) -> Optional[int]:
+        """Term id of ``term`` or None if it does not occur in the corpus."""
+        h = np.uint64(stable_hash(term))
+        pos = int(np.searchsorted(self.term_hash, h))
+        while pos < self.num_terms and self.term_hash[pos] == h:
+            if self._term(pos) == term:
+                return pos
+            pos += 1
+        return None
+    def search(self, query: str, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 top-k.
+        Only the postings of the query terms are read; scores are accumulated
+        with one ``bincount`` over the concatenated postings.
+        Args:
+            query: Query text
+            k: Number of results
+        Returns:
+            Tuple of (rows int64, BM25 scores float32) by descending score
+            (empty when no query term occurs in the corpus)
+        """
+        counts = Counter(tokenize(query))
+        rows, contribs = [], []
+        for term, qtf in counts.items():
+            term_id = self.term_id(term)
+            if term_id is None:
+                continue
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            docs = np.asarray(self.doc_ids[start:end], dtype=np.int64)
+            tf = np.asarray(self.tfs[start:end], dtype=np.float32)
+            df = end - start
+            idf = np.log1p((self.num_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * np.asarray(self.doc_lens[docs], dtype=np.float32) / max(self.avg_len, 1e-9))
+            rows.append(docs)
+            contribs.append(qtf * idf * tf * (self.k1 + 1) / (tf + norm))
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        unique, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(contribs)).astype(np.float32)
+        if len(unique) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            unique, scores = unique[top], scores[top]
+        order = np.lexsort((unique, -scores))
+        return unique[order], scores[order]
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index statistics."""
+        return {
+            "num_docs": self.num_docs,
+            "num_terms": self.num_terms,
+            "num_postings": int(self.doc_ids.shape[0]),
+            "avg_doc_len": self.avg_len,
+            "search_count": self.search_count,
+            "bytes": int(self.term_hash.nbytes + self.terms_blob.nbytes + self.term_offsets.nbytes + self.offsets.nbytes
+                         + self.doc_ids.nbytes + self.tfs.nbytes + self.doc_lens.nbytes),
+        }
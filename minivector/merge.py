@@ -0,0 +1,43 @@
+"""
+MiniVector Merge - Global ids and top-k merging of shard results
+================================================================
+In a two-phase distributed search the workers return only row ids and
+Hamming distances; the coordinator merges them and fetches documents for
+the final top-k alone. This module holds the id scheme and the merge:
+    - global id: ``shard_id << 32 | row`` as uint64, so a hit names its
+      owning shard without any lookup table
+    - merge_topk: k-way heap merge of the per-shard lists (each already
+      sorted by distance), reading only the first ``k`` entries overall
+Ties on distance are broken by global id (shard, then row), so the merged
+order is deterministic regardless of which shard answered first.
+"""
+import heapq
+import itertools
+from typing import Sequence, Tuple
+import numpy as np
+ROW_BITS = 32
+ROW_MASK = (1 << ROW_BITS) - 1
+def global_ids(shard_id: int, rows: np.ndarray) -> np.ndarray:
+    """Global uint64 ids for ``rows`` of shard ``shard_id``."""
+    return (np.uint64(shard_id) << np.uint64(ROW_BITS)) | np.asarray(rows, dtype=np.uint64)
+def split_ids(ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Inverse of ``global_ids``: (shard ids, rows) as int64 arrays."""
+    ids = np.asarray(ids, dtype=np.uint64)
+    return (ids >> np.uint64(ROW_BITS)).astype(np.int64), (ids & np.uint64(ROW_MASK)).astype(np.int64)
+def merge_topk(
+    shard_results: Sequence[Tuple[np.ndarray, np.ndarray]],
+    k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merge per-shard (global ids, distances) lists into the global top-k.
+    Args:
+        shard_results: One (ids, distances) pair per shard, each sorted by
+            ascending distance (ties by id)
+        k: Number of hits to keep
+    Returns:
+        Tuple of (global ids uint64, distances uint32) in rank order
+    """
+    streams = [zip(np.asarray(d).tolist(), np.asarray(i).tolist()) for i, d in shard_results]
+    top = list(itertools.islice(heapq.merge(*streams), max(0, k)))
+    return (np.array([gid for _, gid in top], dtype=np.uint64),
+            np.array([dist for dist, _ in top], dtype=np.uint32))
@@ -0,0 +1,305 @@
+"""
+MiniVector Metrics - Prometheus text exposition without dependencies
+====================================================================
+A small, thread-safe metrics registry shared by the API server, the
+coordinator and the shard workers. Each process exposes its registry at
+``/metrics`` in the Prometheus text format (version 0.0.4).
+Instruments:
+    - Counter / Gauge: labelled values, or callbacks read at scrape time
+    - Histogram: cumulative buckets plus _sum and _count, with a ``time()``
+      context manager for stage timings
+    - register_stats(): exports the numeric fields of an existing
+      ``get_stats()`` dict (caches, executors, batcher, index) on every scrape;
+      a provider returns None until its object exists, and one that raises
+      is logged and counted in ``minivector_metrics_collector_errors_total``
+    - MetricsMiddleware: ASGI middleware recording request rate and latency
+      per route template and status code
+"""
+import abc
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_]")
+logger = logging.getLogger(__name__)
+Sample = Tuple[str, Dict[str, str], float]
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    return repr(float(value))
+def metric_name(*parts: str) -> str:
+    """Join parts into a valid metric name."""
+    return _INVALID_NAME_CHARS.sub("_", "_".join(p for p in parts if p))
+class Registry:
+    """
+    Collection of metric families rendered together at scrape time.
+    Example:
+        >>> registry = Registry()
+        >>> requests = Counter("requests_total", "Requests", ["endpoint"], registry=registry)
+        >>> requests.inc(endpoint="/search")
+        >>> body = registry.render()
+    """
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._collectors: List[Tuple[str, Callable[[], List[Tuple[str, str, str, List[Sample]]]]]] = []
+        self._lock = threading.Lock()
+        self._errors: Dict[str, int] = {}
+    def register(self, metric: "_Metric") -> None:
+        with self._lock:
+            self._metrics.append(metric)
+    def add_collector(self, collector: Callable[[], List[Tuple[str, str, str, List[Sample]]]], name: Optional[str] = None) -> None:
+        """
+        Add a callback returning ``(name, type, help, samples)`` families at scrape time.
+        Args:
+            collector: The callback
+            name: Label for error reporting (default: the callback's name)
+        """
+        with self._lock:
+            self._collectors.append((name or getattr(collector, "__name__", "collector"), collector))
+    def record_error(self, source: str, error: BaseException) -> None:
+        """Count a failed collection; logged the first time ``source`` fails."""
+        with self._lock:
+            count = self._errors.get(source, 0)
+            self._errors[source] = count + 1
+        if count == 0:
+            logger.warning("metrics: collecting %s failed: %r (further failures are only counted)", source, error)
+    def register_stats(
+        self,
+        prefix: str,
+        get_stats: Callable[[], Optional[Dict[str, Any]]],
+        counters: Sequence[str] = (),
+        labels: Optional[Dict[str, str]] = None
+    ) -> None:
+        """
+        Export the numeric fields of a ``get_stats()`` dict.
+        Nested dicts are flattened with '_'; percentage strings such as
+        ``"12.5%"`` are exported as ratios.
+        Args:
+            prefix: Metric name prefix, e.g. 'query_cache'
+            get_stats: Zero-arg callable returning the stats dict, or None
+                while the object does not exist yet (the family is omitted).
+                Exceptions are not expected: they are logged and counted
+            counters: Field names that are monotonically increasing
+            labels: Constant labels added to every sample
+        """
+        counter_set = set(counters)
+        const = dict(labels or {})
+        def collect():
+            stats = get_stats()
+            if not stats:
+                return []
+            families = []
+            for key, value in _flatten(stats):
+                if isinstance(value, bool):
+                    value = float(value)
+                elif isinstance(value, str) and value.endswith("%"):
+                    try:
+                        value = float(value[:-1]) / 100
+                    except ValueError:
+                        continue
+                    key = key.replace("_rate", "_ratio")
+                elif not isinstance(value, (int, float)):
+                    continue
+                kind = "counter" if key in counter_set else "gauge"
+                name = metric_name("minivector", prefix, key, "total" if kind == "counter" else "")
+                families.append((name, kind, f"{prefix} {key}", [(name, const, float(value))]))
+            return families
+        self.add_collector(collect, name=f"{prefix}{_format_labels(const)}")
+    def collect(self) -> List[Tuple[str, str, str, List[Sample]]]:
+        """All metric families, merging samples of families with the same name."""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        families: Dict[str, Tuple[str, str, List[Sample]]] = {}
+        def add(name, kind, doc, samples):
+            if name in families:
+                families[name][2].extend(samples)
+            else:
+                families[name] = (kind, doc, list(samples))
+        for metric in metrics:
+            add(metric.name, metric.kind, metric.documentation, metric.samples())
+        for source, collector in collectors:
+            try:
+                families_of = collector()
+            except Exception as e:
+                self.record_error(source, e)
+                continue
+            for family in families_of:
+                add(*family)
+        with self._lock:
+            errors = dict(self._errors)
+        if errors:
+            name = "minivector_metrics_collector_errors_total"
+            add(name, "counter", "Scrapes where a stats provider or callback raised", [(name, {"collector": source}, float(n)) for source, n in errors.items()])
+        return [(name, kind, doc, samples) for name, (kind, doc, samples) in families.items()]
+    def render(self) -> bytes:
+        """Prometheus text exposition of every family."""
+        lines = []
+        for name, kind, doc, samples in self.collect():
+            lines.append(f"# HELP {name} {_escape(doc)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+def _flatten(stats: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, Any]]:
+    for key, value in stats.items():
+        key = f"{prefix}_{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            yield from _flatten(value, key)
+        else:
+            yield key, value
+REGISTRY = Registry()
+class _Metric(abc.ABC):
+    kind = "untyped"
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional[Registry] = REGISTRY):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+        if registry is not None:
+            registry.register(self)
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+    @abc.abstractmethod
+    def samples(self) -> List[Sample]:
+        """Current ``(name, labels, value)`` samples of this metric."""
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+    kind = "counter"
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    def set_function(self, fn: Callable[[], float], **labels) -> None:
+        """Read the value from ``fn()`` at scrape time (e.g. an existing counter attribute)."""
+        self._functions[self._key(labels)] = fn
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            values = dict(self._values)
+        for key, fn in self._functions.items():
+            try:
+                values[key] = float(fn())
+            except Exception as e:
+                if self.registry is not None:
+                    self.registry.record_error(f"{self.name}{_format_labels(self._labels(key))}", e)
+        return [(self.name, self._labels(key), value) for key, value in values.items()]
+class Gauge(Counter):
+    """Value that can go up and down per label set."""
+    kind = "gauge"
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+class Histogram(_Metric):
+    """Cumulative-bucket histogram per label set."""
+    kind = "histogram"
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall-clock duration (seconds) of the block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    def count(self, **labels) -> float:
+        series = self._series.get(self._key(labels))
+        return sum(series[:-1]) if series else 0.0
+    def samples(self) -> List[Sample]:
+        out: List[Sample] = []
+        with self._lock:
+            series_items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in series_items:
+            labels = self._labels(key)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                out.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            cumulative += series[len(self.buckets)]
+            out.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, cumulative))
+            out.append((f"{self.name}_sum", labels, series[-1]))
+            out.append((f"{self.name}_count", labels, cumulative))
+        return out
+HTTP_REQUESTS = Counter("minivector_http_requests_total", "HTTP requests by route template, method and status", ["endpoint", "method", "status"])
+HTTP_LATENCY = Histogram("minivector_http_request_duration_seconds", "HTTP request latency by route template", ["endpoint"])
+STAGE_LATENCY = Histogram("minivector_stage_duration_seconds", "Latency of request stages (embed, cache, search, fanout, merge, ...)", ["stage"])
+EMBED_BATCH_SIZE = Histogram("minivector_embed_batch_size", "Texts per embedding model call", buckets=SIZE_BUCKETS)
+EXECUTOR_QUEUE = Histogram("minivector_executor_queue_seconds", "Time jobs wait for a compute executor slot", ["executor"])
+SHARD_LATENCY = Histogram("minivector_shard_request_duration_seconds", "Coordinator to worker request latency", ["shard", "outcome"])
+SHARD_OVERHEAD = Histogram("minivector_shard_overhead_seconds", "Coordinator to worker round trip minus worker handler time (network, queuing, serialization)", ["shard"])
+SHARD_CONNECTIONS = Counter("minivector_shard_connections_total", "Connections used for worker requests, newly opened or reused from the pool", ["shard", "kind"])
+SHARD_CONNECT_LATENCY = Histogram("minivector_shard_connect_duration_seconds", "Time to open a new connection to a worker", ["shard"])
+SHARD_IN_FLIGHT = Gauge("minivector_shard_in_flight", "Coordinator requests currently outstanding per worker", ["shard"])
+SHARDS_PROBED = Histogram("minivector_shards_probed", "Shards a query was routed to", buckets=SIZE_BUCKETS)
+REPLICA_HEALTHY = Gauge("minivector_replica_healthy", "Whether a shard replica is considered up (1) or down (0)", ["shard", "replica"])
+HEDGED_REQUESTS = Counter("minivector_hedged_requests_total", "Worker requests that were hedged, by which attempt answered first", ["shard", "winner"])
+PARTIAL_RESULTS = Counter("minivector_partial_results_total", "Queries answered without a shard because every replica failed", ["shard"])
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests and timing them per route template.
+    The route template (e.g. ``/graph/{doc_id}``) is read from the scope
+    after routing, so path parameters do not explode label cardinality.
+    """
+    def __init__(self, app, skip: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip = set(skip)
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.skip:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = {"code": 500}
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(endpoint=endpoint, method=scope.get("method", ""), status=str(status["code"]))
+            HTTP_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
@@ -0,0 +1,183 @@
+"""
+MiniVector Passage Index - Query-aware context selection for chat prompts
+========================================================================
+Each paper is split offline into sentence-based passages whose embeddings
+are stored in a compact side index. At chat time the passages most similar
+to the question are packed into a token budget, instead of sending the
+first N characters of the abstract regardless of relevance.
+Disk layout (directory):
+    - doc_offsets.npy: int64 (D + 1,) passage range of each document
+    - vectors.npy: float16 (P, dim) L2-normalized passage embeddings
+    - text.bin / text_offsets.npy: UTF-8 passage text blob and byte offsets
+    - ids.json: document id of each range
+"""
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English)."""
+    return max(1, (len(text) + 3) // 4)
+def split_passages(text: str, max_chars: int = 400) -> List[str]:
+    """
+    Split text into sentence-aligned passages of at most ``max_chars``.
+    Short neighbouring sentences are merged; a single overlong sentence is
+    kept whole so no passage starts mid-sentence.
+    """
+    sentences = [s.strip() for s in _SENTENCE_END.split(" ".join(text.split())) if s.strip()]
+    passages: List[str] = []
+    current = ""
+    for sentence in sentences:
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            passages.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        passages.append(current)
+    return passages
+class PassageIndex:
+    """
+    Per-document passage embeddings with budgeted top-k selection.
+    Example:
+        >>> index = PassageIndex.build(papers, embedder)
+        >>> context = index.select(paper_id, question_vec, token_budget=250)
+    """
+    def __init__(
+        self,
+        ids: List[str],
+        doc_offsets: np.ndarray,
+        vectors: np.ndarray,
+        text_blob: np.ndarray,
+        text_offsets: np.ndarray
+    ):
+        self.ids = ids
+        self.doc_offsets = doc_offsets
+        self.vectors = vectors
+        self.text_blob = text_blob
+        self.text_offsets = text_offsets
+        self.id_to_row: Dict[str, int] = {doc_id: row for row, doc_id in enumerate(ids)}
+    @property
+    def num_passages(self) -> int:
+        return int(self.vectors.shape[0])
+    @classmethod
+    def build(
+        cls,
+        docs: List[Dict[str, Any]],
+        embedder,
+        max_chars: int = 400,
+        batch_size: int = 256
+    ) -> "PassageIndex":
+        """
+        Split and embed the abstract of every document.
+        Args:
+            docs: Metadata dicts with 'id' and 'abstract' (or 'text')
+            embedder: Object exposing ``embed(texts)``
+            max_chars: Maximum passage length in characters
+            batch_size: Passages per ``embed`` call
+        """
+        ids: List[str] = []
+        counts: List[int] = []
+        texts: List[str] = []
+        for doc in docs:
+            passages = split_passages(doc.get('abstract') or doc.get('text') or "", max_chars)
+            ids.append(str(doc['id']))
+            counts.append(len(passages))
+            texts.extend(passages)
+        doc_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=doc_offsets[1:])
+        dim = getattr(embedder, "dim", 384)
+        vectors = np.zeros((len(texts), dim), dtype=np.float16)
+        for start in range(0, len(texts), batch_size):
+            batch = np.asarray(embedder.embed(texts[start:start + batch_size]), dtype=np.float32)
+            batch /= np.linalg.norm(batch, axis=1, keepdims=True) + 1e-12
+            vectors[start:start + len(batch)] = batch
+        encoded = [t.encode('utf-8') for t in texts]
+        text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=text_offsets[1:])
+        text_blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(ids, doc_offsets, vectors, text_blob, text_offsets)
+    def save(self, directory: Union[str, Path]) -> None:
+        """Write the index files into ``directory``."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "doc_offsets.npy", self.doc_offsets)
+        np.save(directory / "vectors.npy", self.vectors)
+        np.save(directory / "text_offsets.npy", self.text_offsets)
+        np.asarray(self.text_blob, dtype=np.uint8).tofile(directory / "text.bin")
+        with open(directory / "ids.json", 'w', encoding='utf-8') as f:
+            json.dump(self.ids, f)
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap: bool = True) -> "PassageIndex":
+        """Load an index written by ``save``, memory-mapping the arrays."""
+        directory = Path(directory)
+        mode = 'r' if mmap else None
+        with open(directory / "ids.json", 'r', encoding='utf-8') as f:
+            ids = json.load(f)
+        blob_path = directory / "text.bin"
+        if blob_path.stat().st_size and mmap:
+            text_blob = np.memmap(blob_path, dtype=np.uint8, mode='r')
+        else:
+            text_blob = np.fromfile(blob_path, dtype=np.uint8)
+        return cls(
+            ids,
+            np.load(directory / "doc_offsets.npy", mmap_mode=mode),
+            np.load(directory / "vectors.npy", mmap_mode=mode),
+            text_blob,
+            np.load(directory / "text_offsets.npy", mmap_mode=mode),
+        )
+    def _text(self, passage: int) -> str:
+        start, end = int(self.text_offsets[passage]), int(self.text_offsets[passage + 1])
+        return bytes(self.text_blob[start:end]).decode('utf-8')
+    def passages(self, doc_id: str) -> List[str]:
+        """All passages of ``doc_id`` in document order."""
+        row = self.id_to_row.get(doc_id)
+        if row is None:
+            return []
+        return [self._text(p) for p in range(int(self.doc_offsets[row]), int(self.doc_offsets[row + 1]))]
+    def select(
+        self,
+        doc_id: str,
+        query_vec: np.ndarray,
+        token_budget: int = 250
+    ) -> Optional[str]:
+        """
+        Pick the passages of ``doc_id`` most similar to the query within a token budget.
+        Selected passages are returned in document order so the context reads naturally.
+        Args:
+            doc_id: Document id
+            query_vec: Question embedding
+            token_budget: Maximum estimated prompt tokens for the context
+        Returns:
+            The context string, or None if the document has no passages
+        """
+        row = self.id_to_row.get(doc_id)
+        if row is None:
+            return None
+        start, end = int(self.doc_offsets[row]), int(self.doc_offsets[row + 1])
+        if start == end:
+            return None
+        q = np.asarray(query_vec, dtype=np.float32).ravel()
+        q = q / (np.linalg.norm(q) + 1e-12)
+        sims = np.asarray(self.vectors[start:end], dtype=np.float32) @ q
+        chosen = []
+        used = 0
+        for local in np.argsort(-sims, kind='stable'):
+            cost = estimate_tokens(self._text(start + int(local)))
+            if used + cost > token_budget:
+                if not chosen:
+                    text = self._text(start + int(local))
+                    return text[:token_budget * 4]
+                continue
+            chosen.append(int(local))
+            used += cost
+        return " ".join(self._text(start + local) for local in sorted(chosen))
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index statistics."""
+        return {
+            "num_docs": len(self.ids),
+            "num_passages": self.num_passages,
+            "bytes": int(self.vectors.nbytes + self.text_blob.nbytes + self.text_offsets.nbytes + self.doc_offsets.nbytes),
+        }
@@ -0,0 +1,222 @@
+"""
+MiniVector Hot Reload - Zero-downtime index swaps
+=================================================
+Rebuilding ``vectors.npy`` / ``metadata.json`` used to require a restart,
+dropping traffic and repeating the cold load. ``IndexReloader`` replaces
+the serving index while requests keep flowing:
+    1. load: the new bundle (index, metadata, dependent structures) is read
+       in a background thread, optionally memory-mapped
+    2. warm: pages are faulted in and a few searches run before it serves
+    3. swap: a single synchronous assignment on the event loop, so every
+       request sees either the old bundle or the new one, never a mix;
+       dependent caches are invalidated in the same step
+    4. release: requests already holding the old bundle finish on it; its
+       memory is returned when the last reference drops (tracked with
+       ``weakref.finalize``)
+A poll-based watcher triggers reloads when the source files change and have
+stayed unchanged for one more poll (so half-written files are not loaded).
+A failed load keeps the serving bundle; the watcher retries only after the
+files change again.
+"""
+import asyncio
+import hashlib
+import os
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+Fingerprint = Tuple[Tuple[str, int, int], ...]
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+def fingerprint(paths: Sequence[Path]) -> Fingerprint:
+    """(path, mtime_ns, size) of each existing path; changes when any file is rewritten."""
+    out = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        out.append((str(path), st.st_mtime_ns, st.st_size))
+    return tuple(out)
+def content_generation(paths: Sequence[Path], chunk_bytes: int = 1 << 20) -> int:
+    """
+    Positive 31-bit generation number hashed from the bytes of ``paths``.
+    Every process and replica that loads the same files gets the same number,
+    unlike a per-process reload counter, and it fits the wire header's uint32.
+    """
+    digest = hashlib.blake2b(digest_size=4)
+    for path in paths:
+        with open(path, "rb") as f:
+            while chunk := f.read(chunk_bytes):
+                digest.update(chunk)
+        digest.update(b"\0")
+    return (int.from_bytes(digest.digest(), "little") & 0x7FFFFFFF) or 1
+class IndexReloader:
+    """
+    Background load, warmup and atomic swap of a serving bundle.
+    Example:
+        >>> reloader = IndexReloader("index", load=load_bundle, swap=swap_bundle,
+        ...                          paths=[vectors_path, metadata_path], warmup=warm_bundle)
+        >>> report = await reloader.reload()
+        >>> reloader.start_watching(poll_s=5.0)
+    """
+    def __init__(
+        self,
+        name: str,
+        load: Callable[[], Any],
+        swap: Callable[[Any], Any],
+        paths: Sequence[Path],
+        warmup: Optional[Callable[[Any], Any]] = None,
+        size_of: Optional[Callable[[Any], int]] = None,
+        handle: Optional[Callable[[Any], Any]] = None
+    ):
+        """
+        Initialize the reloader.
+        Args:
+            name: Label used in stats
+            load: Builds and returns a new bundle (runs in a worker thread)
+            swap: Installs a bundle and returns the previous one (runs on the event loop)
+            paths: Files whose changes trigger a reload when watching
+            warmup: Optional hook run on the new bundle before it is swapped in
+            size_of: Optional bytes-of-bundle function used for the overlap report
+            handle: Picks the object whose release marks the old bundle as released
+                    (default: the bundle itself; must support weak references)
+        """
+        self.name = name
+        self.load = load
+        self.swap = swap
+        self.paths = [Path(p) for p in paths]
+        self.warmup = warmup
+        self.size_of = size_of
+        self.handle = handle or (lambda bundle: bundle)
+        self.generation = 0
+        self.reloads = 0
+        self.failures = 0
+        self.released = 0
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._fingerprint: Optional[Fingerprint] = None
+        self._pending: Optional[Fingerprint] = None
+        self._failed: Optional[Fingerprint] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._watcher: Optional[asyncio.Task] = None
+    @property
+    def in_progress(self) -> bool:
+        return self._lock is not None and self._lock.locked()
+    @property
+    def version(self) -> str:
+        """
+        Short digest of the serving bundle's source files. Unlike
+        ``generation`` it is the same in every process serving those files.
+        """
+        return hashlib.blake2b(repr(self._fingerprint).encode("utf-8"), digest_size=8).hexdigest()
+    def changed(self) -> bool:
+        """Whether the source files differ from those of the serving bundle."""
+        return fingerprint(self.paths) != self._fingerprint
+    def _on_release(self, report: Dict[str, Any], swapped_at: float) -> None:
+        self.released += 1
+        report["old_released_after_ms"] = (time.perf_counter() - swapped_at) * 1000
+        report["rss_after_release"] = rss_bytes()
+    async def reload(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Load, warm and swap in a new bundle. Concurrent calls are serialized.
+        Args:
+            force: Reload even if the source files have not changed
+        Returns:
+            Report with status, generation, load/warmup/swap timings and memory overlap.
+            On failure the serving bundle is kept and status is 'failed'.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            current = fingerprint(self.paths)
+            if not force and current == self._fingerprint:
+                return {"status": "unchanged", "generation": self.generation}
+            report: Dict[str, Any] = {"status": "loading", "generation": self.generation, "rss_before": rss_bytes()}
+            start = time.perf_counter()
+            try:
+                bundle = await asyncio.to_thread(self.load)
+                report["load_ms"] = (time.perf_counter() - start) * 1000
+                if self.warmup is not None:
+                    warm_start = time.perf_counter()
+                    await asyncio.to_thread(self.warmup, bundle)
+                    report["warmup_ms"] = (time.perf_counter() - warm_start) * 1000
+            except Exception as e:
+                self.failures += 1
+                self._failed = current
+                report.update(status="failed", error=f"{type(e).__name__}: {e}")
+                self.last_report = report
+                return report
+            report["rss_loaded"] = rss_bytes()
+            swap_start = time.perf_counter()
+            old = self.swap(bundle)
+            swapped_at = time.perf_counter()
+            self._fingerprint = current
+            self._pending = None
+            self.generation += 1
+            self.reloads += 1
+            report.update(status="swapped", generation=self.generation, swap_ms=(swapped_at - swap_start) * 1000, total_ms=(swapped_at - start) * 1000)
+            if self.size_of is not None:
+                report["new_bytes"] = self.size_of(bundle)
+                report["old_bytes"] = self.size_of(old) if old is not None else 0
+                report["overlap_bytes"] = report["new_bytes"] + report["old_bytes"]
+            if report["rss_before"] is not None and report["rss_loaded"] is not None:
+                report["rss_overlap"] = report["rss_loaded"] - report["rss_before"]
+            if old is not None:
+                try:
+                    weakref.finalize(self.handle(old), self._on_release, report, swapped_at)
+                except TypeError:
+                    pass
+            del old, bundle
+            self.last_report = report
+            return report
+    def adopt(self, bundle: Any) -> Dict[str, Any]:
+        """
+        Install a bundle loaded elsewhere (e.g. by a pre-forking parent process)
+        as the current generation, without loading or warming it again.
+        """
+        self.swap(bundle)
+        self._fingerprint = fingerprint(self.paths)
+        self.generation += 1
+        self.last_report = {"status": "adopted", "generation": self.generation}
+        return self.last_report
+    async def watch(self, poll_s: float) -> None:
+        """Poll the source files and reload once a change has settled for one poll."""
+        while True:
+            await asyncio.sleep(poll_s)
+            current = fingerprint(self.paths)
+            if current == self._fingerprint or current == self._failed or not current:
+                self._pending = None
+            elif current == self._pending:
+                await self.reload()
+            else:
+                self._pending = current
+    def start_watching(self, poll_s: float) -> asyncio.Task:
+        """Run ``watch`` as a background task on the current loop."""
+        self._watcher = asyncio.create_task(self.watch(poll_s))
+        return self._watcher
+    async def stop(self) -> None:
+        """Cancel the watcher task, if any."""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+    def get_stats(self) -> Dict[str, Any]:
+        """Get reload statistics."""
+        return {
+            "name": self.name,
+            "generation": self.generation,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "released": self.released,
+            "in_progress": self.in_progress,
+            "watching": self._watcher is not None,
+            "last": self.last_report,
+        }
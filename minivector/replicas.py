@@ -0,0 +1,304 @@
+"""
+MiniVector Replicas - Replica groups, load balancing and hedged requests
+========================================================================
+With one worker per shard, a slow worker sets the latency of every query
+and a dead one silently drops its slice of the corpus. ``ReplicaSet``
+serves each shard from a group of interchangeable workers:
+    - health: periodic ``/health`` probes mark replicas up or down; a
+      replica that fails ``fail_threshold`` requests in a row is ejected
+      early and comes back on the next successful probe
+    - least outstanding requests: each call goes to the healthy replica
+      with the fewest in-flight requests (ties broken at random)
+    - hedging: if no answer arrives within the recent p95 latency of that
+      shard and operation (a fixed initial delay until enough latencies are
+      known), the same request is sent to a second replica and the first
+      success wins; failed attempts fail over immediately
+    - budget: a call given ``timeout_s`` gives up when it runs out, counting
+      the attempts still in flight as failures
+    - unavailable shards are reported by returning None, so callers can
+      mark their results as partial instead of dropping them silently
+Example:
+    >>> replicas = ReplicaSet(parse_groups("http://a:8001|http://b:8001,http://a:8002"))
+    >>> answer = await replicas.call(0, lambda url: post(url, "/search", body))
+    >>> if answer is not None:
+    ...     url, result = answer
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import numpy as np
+from .metrics import HEDGED_REQUESTS, REPLICA_HEALTHY
+def parse_groups(spec: str) -> List[List[str]]:
+    """
+    Parse a worker list: shards separated by ',', replicas of a shard by '|'.
+    ``"http://a:8001|http://b:8001,http://a:8002"`` is shard 0 on two
+    workers and shard 1 on one.
+    """
+    groups = [[url.strip() for url in shard.split("|") if url.strip()] for shard in spec.split(",")]
+    if not groups or not all(groups):
+        raise ValueError(f"Every shard needs at least one worker URL: {spec!r}")
+    return groups
+class Replica:
+    """One worker serving a shard, with its balancing and health state."""
+    def __init__(self, shard: int, url: str):
+        self.shard = shard
+        self.url = url
+        self.healthy = True
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+class ReplicaSet:
+    """
+    Load-balanced, hedged calls to the replicas of each shard.
+    The set is driven from a single event loop; no locking is needed.
+    """
+    def __init__(
+        self,
+        groups: List[List[str]],
+        hedge: bool = True,
+        hedge_percentile: float = 95.0,
+        hedge_min_s: float = 0.002,
+        hedge_initial_s: Optional[float] = None,
+        min_samples: int = 20,
+        latency_window: int = 256,
+        fail_threshold: int = 3
+    ):
+        """
+        Initialize the replica groups.
+        Args:
+            groups: Worker URLs per shard (index = shard id)
+            hedge: Send a second request when the first one is slow
+            hedge_percentile: Latency percentile after which to hedge
+            hedge_min_s: Lower bound on the hedge delay
+            hedge_initial_s: Hedge delay used until ``min_samples`` latencies
+                are known (None = no hedging until then)
+            min_samples: Latencies needed before the percentile is used
+            latency_window: Recent latencies kept per (shard, operation)
+            fail_threshold: Consecutive failures that mark a replica down
+                (0 = only health probes change replica state)
+        """
+        self.groups = [[Replica(shard, url) for url in urls] for shard, urls in enumerate(groups)]
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_s = hedge_min_s
+        self.hedge_initial_s = hedge_initial_s
+        self.min_samples = min_samples
+        self.latency_window = latency_window
+        self.fail_threshold = fail_threshold
+        self._latencies: Dict[Tuple[int, str], Deque[float]] = {}
+        self._delays: Dict[Tuple[int, str], Tuple[int, Optional[float]]] = {}
+        self._recorded: Dict[Tuple[int, str], int] = {}
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.unavailable = 0
+        self.timeouts = 0
+        self.probes = 0
+        for group in self.groups:
+            for replica in group:
+                REPLICA_HEALTHY.set(1, shard=str(replica.shard), replica=replica.url)
+    @property
+    def num_shards(self) -> int:
+        return len(self.groups)
+    @property
+    def urls(self) -> List[str]:
+        """Every worker URL, for the connection pools."""
+        return list(dict.fromkeys(replica.url for group in self.groups for replica in group))
+    def pick(self, shard: int, exclude: Tuple[str, ...] = (), fallback: bool = False) -> Optional[Replica]:
+        """
+        Healthy replica of ``shard`` with the fewest outstanding requests.
+        Args:
+            shard: Shard id
+            exclude: URLs already tried
+            fallback: When every remaining replica is marked down, return
+                one of them anyway (a stale health mark must not take the
+                shard offline); used for the first attempt of a call only,
+                never to hedge or fail over onto a replica known to be down
+        """
+        candidates = [r for r in self.groups[shard] if r.url not in exclude]
+        pool = [r for r in candidates if r.healthy] or (candidates if fallback else [])
+        if not pool:
+            return None
+        least = min(r.outstanding for r in pool)
+        return random.choice([r for r in pool if r.outstanding == least])
+    def hedge_delay_s(self, shard: int, op: str) -> Optional[float]:
+        """Hedge delay for ``op`` on ``shard`` (``hedge_initial_s`` until enough latencies are known)."""
+        key = (shard, op)
+        window = self._latencies.get(key)
+        if window is None or len(window) < self.min_samples:
+            return self.hedge_initial_s
+        recorded = self._recorded[key]
+        cached = self._delays.get(key)
+        # Recompute the percentile every few samples rather than per call
+        if cached is None or recorded - cached[0] >= 16:
+            delay = max(self.hedge_min_s, float(np.percentile(window, self.hedge_percentile)))
+            cached = (recorded, delay)
+            self._delays[key] = cached
+        return cached[1]
+    def _set_health(self, replica: Replica, healthy: bool) -> None:
+        if replica.healthy != healthy:
+            replica.healthy = healthy
+            REPLICA_HEALTHY.set(1 if healthy else 0, shard=str(replica.shard), replica=replica.url)
+    def _failed(self, replica: Replica) -> None:
+        replica.failures += 1
+        replica.consecutive_failures += 1
+        if self.fail_threshold and replica.consecutive_failures >= self.fail_threshold:
+            self._set_health(replica, False)
+    async def _attempt(self, replica: Replica, op: str, send: Callable[[str], Awaitable[Any]]) -> Any:
+        replica.outstanding += 1
+        replica.requests += 1
+        start = time.perf_counter()
+        try:
+            result = await send(replica.url)
+        finally:
+            replica.outstanding -= 1
+        # Cancelled (lost hedge) and raising attempts are not health signals
+        if result is None:
+            self._failed(replica)
+        else:
+            replica.consecutive_failures = 0
+            key = (replica.shard, op)
+            if key not in self._latencies:
+                self._latencies[key] = deque(maxlen=self.latency_window)
+                self._recorded[key] = 0
+            self._latencies[key].append(time.perf_counter() - start)
+            self._recorded[key] += 1
+        return result
+    async def call(
+        self,
+        shard: int,
+        send: Callable[[str], Awaitable[Any]],
+        op: str = "search",
+        prefer: Optional[str] = None,
+        timeout_s: Optional[float] = None
+    ) -> Optional[Tuple[str, Any]]:
+        """
+        Run ``send(url)`` against the replicas of ``shard`` until one succeeds.
+        Args:
+            shard: Shard id
+            send: Coroutine function taking a worker URL; returns None on failure
+            op: Operation name; hedge delays are tracked per operation
+            prefer: Try this replica first (e.g. the one that served an
+                earlier phase of the same query)
+            timeout_s: Budget for the whole call, hedges and failovers
+                included; attempts still running when it ends are cancelled
+                and count as failures of their replicas
+        Returns:
+            Tuple of (URL of the replica that answered, result), or None if
+            every replica failed or the budget ran out
+        Raises:
+            Exception: Whatever ``send`` raises; other attempts are cancelled
+        """
+        self.calls += 1
+        group = self.groups[shard]
+        first = next((r for r in group if r.url == prefer), None) or self.pick(shard, fallback=True)
+        tried = [first.url]
+        owners = {asyncio.ensure_future(self._attempt(first, op, send)): first}
+        pending = set(owners)
+        delay = self.hedge_delay_s(shard, op) if self.hedge and len(group) > 1 else None
+        loop = asyncio.get_running_loop()
+        give_up = None
+        if timeout_s is not None:
+            give_up = loop.time() + timeout_s
+            # Leave the hedge time to answer within the budget
+            if delay is not None:
+                delay = min(delay, timeout_s / 2)
+        hedge_at = None if delay is None else loop.time() + delay
+        hedged = False
+        try:
+            while pending:
+                wake = min((t for t in (hedge_at, give_up) if t is not None), default=None)
+                done, pending = await asyncio.wait(pending, timeout=None if wake is None else max(0.0, wake - loop.time()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if give_up is not None and loop.time() >= give_up:
+                        self.timeouts += 1
+                        for task in pending:
+                            self._failed(owners[task])
+                        break
+                    hedge_at = None
+                    replica = self.pick(shard, tuple(tried))
+                    if replica is not None:
+                        self.hedges += 1
+                        hedged = True
+                        tried.append(replica.url)
+                        task = asyncio.ensure_future(self._attempt(replica, op, send))
+                        owners[task] = replica
+                        pending.add(task)
+                    continue
+                for task in done:
+                    result = task.result()
+                    if result is not None:
+                        if hedged:
+                            won = owners[task] is not first
+                            self.hedge_wins += won
+                            HEDGED_REQUESTS.inc(shard=str(shard), winner="hedge" if won else "primary")
+                        return owners[task].url, result
+                if not pending:
+                    replica = self.pick(shard, tuple(tried))
+                    if replica is not None:
+                        self.failovers += 1
+                        tried.append(replica.url)
+                        task = asyncio.ensure_future(self._attempt(replica, op, send))
+                        owners[task] = replica
+                        pending.add(task)
+            self.unavailable += 1
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+    async def probe(self, check: Callable[[int, str], Awaitable[bool]]) -> None:
+        """Run ``check(shard, url)`` against every replica and update its health."""
+        replicas = [replica for group in self.groups for replica in group]
+        results = await asyncio.gather(*(check(r.shard, r.url) for r in replicas), return_exceptions=True)
+        self.probes += 1
+        for replica, ok in zip(replicas, results):
+            healthy = ok is True
+            if healthy:
+                replica.consecutive_failures = 0
+            self._set_health(replica, healthy)
+    async def probe_forever(self, check: Callable[[int, str], Awaitable[bool]], interval_s: float) -> None:
+        """Probe every ``interval_s`` seconds until cancelled."""
+        while True:
+            await self.probe(check)
+            await asyncio.sleep(interval_s)
+    def get_stats(self, detail: bool = False) -> Dict[str, Any]:
+        """
+        Get balancing, hedging and health statistics.
+        Args:
+            detail: Include per-shard hedge delays and per-replica state
+        """
+        replicas = [replica for group in self.groups for replica in group]
+        stats = {
+            "shards": self.num_shards,
+            "replicas": len(replicas),
+            "healthy_replicas": sum(r.healthy for r in replicas),
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "unavailable": self.unavailable,
+            "timeouts": self.timeouts,
+            "probes": self.probes,
+        }
+        if detail:
+            stats["groups"] = []
+            for shard, group in enumerate(self.groups):
+                delay = self.hedge_delay_s(shard, "search")
+                stats["groups"].append({
+                    "shard": shard,
+                    "hedge_delay_ms": None if delay is None else round(delay * 1000, 3),
+                    "replicas": {r.url: r.to_dict() for r in group},
+                })
+        return stats
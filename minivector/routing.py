@@ -0,0 +1,139 @@
+"""
+MiniVector Shard Routing - Cluster-aware query routing
+======================================================
+With contiguous row ranges every shard holds a random slice of the corpus,
+so every query must fan out to every shard and adding nodes adds capacity
+but not throughput. Partitioning by k-means cluster instead puts similar
+documents on the same shard; the coordinator can then probe only the
+``nprobe`` shards whose centroids are closest to the query:
+    - kmeans_binary: Lloyd's k-means (k-means++ init) on the unpacked bits
+      of the 1-bit codes, trained on a sample and applied to every row
+    - ShardRouter: ranks shards by squared distance between the query bits
+      and each centroid, and assigns an adaptive per-shard k that decays
+      with rank (the nearest shard gets ``k``, farther ones fewer)
+Centroids are stored in the shard manifest (``manifest.json`` written by
+``scripts/split_data.py --mode kmeans``) as per-bit means in [0, 1].
+"""
+import json
+import math
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+import numpy as np
+def _unpack(codes: np.ndarray, dim: int) -> np.ndarray:
+    return np.unpackbits(np.atleast_2d(codes), axis=1)[:, :dim].astype(np.float32)
+def _distances(bits: np.ndarray, weights: np.ndarray, bias: np.ndarray) -> np.ndarray:
+    # ||x - c||^2 = sum(x) - 2 x.c + ||c||^2; sum(x) is constant per row and dropped
+    return bits @ weights.T + bias
+def kmeans_binary(
+    codes: np.ndarray,
+    num_clusters: int,
+    iters: int = 10,
+    sample: int = 100_000,
+    seed: int = 0,
+    chunk_rows: int = 65536
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cluster packed 1-bit codes.
+    Args:
+        codes: Packed codes of shape (N, bytes_per_vector)
+        num_clusters: Number of clusters (shards)
+        iters: Lloyd iterations on the training sample
+        sample: Rows used for training (all rows if fewer)
+        seed: Random seed
+        chunk_rows: Rows unpacked at a time when assigning the full set
+    Returns:
+        Tuple of (centroids (C, dim) float32 bit means, assignments (N,) int32)
+    """
+    n, dim = codes.shape[0], codes.shape[1] * 8
+    if not 0 < num_clusters <= n:
+        raise ValueError(f"num_clusters must be in [1, {n}], got {num_clusters}")
+    rng = np.random.default_rng(seed)
+    train = _unpack(codes[np.sort(rng.choice(n, sample, replace=False))] if n > sample else codes, dim)
+    centroids = np.empty((num_clusters, dim), dtype=np.float32)
+    centroids[0] = train[rng.integers(len(train))]
+    closest = ((train - centroids[0]) ** 2).sum(axis=1)
+    for c in range(1, num_clusters):
+        probs = closest / closest.sum() if closest.sum() > 0 else None
+        centroids[c] = train[rng.choice(len(train), p=probs)]
+        closest = np.minimum(closest, ((train - centroids[c]) ** 2).sum(axis=1))
+    for _ in range(iters):
+        assign = np.argmin(_distances(train, -2 * centroids, (centroids ** 2).sum(axis=1)), axis=1)
+        counts = np.bincount(assign, minlength=num_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, train)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = train[rng.choice(len(train), int(empty.sum()), replace=False)]
+    weights, bias = -2 * centroids, (centroids ** 2).sum(axis=1)
+    assignments = np.empty(n, dtype=np.int32)
+    for start in range(0, n, chunk_rows):
+        bits = _unpack(codes[start:start + chunk_rows], dim)
+        assignments[start:start + len(bits)] = np.argmin(_distances(bits, weights, bias), axis=1)
+    return centroids, assignments
+class ShardRouter:
+    """
+    Picks the shards to probe for each query from the k-means centroids.
+    Example:
+        >>> router = ShardRouter.load("data/sharded/manifest.json")
+        >>> probes = router.route(codes, nprobe=2, k=10)   # [[(shard, k), ...] per query]
+    """
+    def __init__(self, centroids: np.ndarray, adaptive_k: bool = True, min_k: int = 10):
+        """
+        Initialize from centroids.
+        Args:
+            centroids: (S, dim) per-bit means of each shard's cluster
+            adaptive_k: Decay per-shard k with centroid rank
+            min_k: Smallest per-shard k handed out by the decay
+        """
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.vector_dim = self.centroids.shape[1]
+        self.adaptive_k = adaptive_k
+        self.min_k = min_k
+        self._weights = -2 * self.centroids
+        self._bias = (self.centroids ** 2).sum(axis=1)
+        self.queries = 0
+        self.probes = 0
+    @property
+    def num_shards(self) -> int:
+        return int(self.centroids.shape[0])
+    @classmethod
+    def load(cls, manifest_path: Union[str, Path], **kwargs) -> Optional["ShardRouter"]:
+        """Router for a k-means manifest, or None for manifests without centroids (range sharding)."""
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("mode") != "kmeans":
+            return None
+        return cls(np.array(manifest["centroids"], dtype=np.float32), **kwargs)
+    def rank(self, codes: np.ndarray) -> np.ndarray:
+        """Shard ids of each query ordered by centroid distance, shape (Q, S)."""
+        return np.argsort(_distances(_unpack(codes, self.vector_dim), self._weights, self._bias), axis=1, kind="stable")
+    def shard_k(self, rank: int, k: int) -> int:
+        """Hits requested from the shard at position ``rank`` of a query's probe list."""
+        if not self.adaptive_k or rank == 0:
+            return k
+        return max(min(k, self.min_k), math.ceil(k / (rank + 1)))
+    def route(self, codes: np.ndarray, nprobe: int, k: int) -> List[List[Tuple[int, int]]]:
+        """
+        Shards to probe per query.
+        Args:
+            codes: Packed query codes (Q, bytes) or (bytes,)
+            nprobe: Shards per query (<= 0 or >= S probes all)
+            k: Hits wanted per query
+        Returns:
+            Per query, a list of (shard id, per-shard k) nearest first
+        """
+        nprobe = self.num_shards if nprobe <= 0 else min(nprobe, self.num_shards)
+        order = self.rank(codes)[:, :nprobe]
+        self.queries += order.shape[0]
+        self.probes += order.size
+        return [[(int(shard), self.shard_k(r, k)) for r, shard in enumerate(row)] for row in order]
+    def get_stats(self) -> Dict[str, Any]:
+        """Get routing statistics."""
+        return {
+            "num_shards": self.num_shards,
+            "queries": self.queries,
+            "probes": self.probes,
+            "avg_probes": self.probes / self.queries if self.queries else 0.0,
+            "adaptive_k": self.adaptive_k,
+        }
@@ -0,0 +1,186 @@
+"""
+MiniVector Result Sessions - Cursor pagination without re-searching
+===================================================================
+Paging by re-issuing a search with a larger ``k`` repeats the embedding
+and the full scan for every page. A result session keeps the sorted top-N
+of one search server-side instead:
+    - compact: row ids as int32 and Hamming distances as uint16 (6 bytes per
+      hit, so a 1000-hit session is ~6 KB); documents are looked up only for
+      the page being returned
+    - short-lived: sliding TTL plus LRU eviction bounded by session count
+    - opaque cursors ``<session>.<offset>``; an expired or evicted session
+      raises ``SessionExpired`` and the client re-runs the search
+    - replayable: a session may carry a small replay token (e.g. the packed
+      query and index version) inside its id, so a process that never saw
+      the session - another prefork child, or the same one after eviction -
+      can recompute the identical list and ``restore`` it
+Sessions hold row numbers of the index they were computed on, so they must
+be cleared when the index is swapped.
+"""
+import base64
+import binascii
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+class SessionExpired(KeyError):
+    """Raised for unknown, expired or evicted cursors; maps to HTTP 410."""
+class _Session:
+    __slots__ = ("rows", "distances", "expires")
+    def __init__(self, rows: np.ndarray, distances: np.ndarray, expires: float):
+        self.rows = rows
+        self.distances = distances
+        self.expires = expires
+def make_cursor(session_id: str, offset: int) -> str:
+    return f"{session_id}.{offset}"
+def cursor_replay(cursor: str) -> Optional[bytes]:
+    """
+    Replay token carried by a cursor, or None if its session has none.
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    session_id, _ = parse_cursor(cursor)
+    _, sep, token = session_id.partition("~")
+    if not sep:
+        return None
+    try:
+        return base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (binascii.Error, ValueError):
+        raise ValueError(f"malformed cursor: {cursor!r}")
+def parse_cursor(cursor: str) -> Tuple[str, int]:
+    """
+    Split a cursor into (session id, offset).
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    session_id, _, offset = cursor.rpartition(".")
+    if not session_id or not offset.isdigit():
+        raise ValueError(f"malformed cursor: {cursor!r}")
+    return session_id, int(offset)
+class ResultSessions:
+    """
+    TTL + LRU store of sorted search results addressed by cursor.
+    Example:
+        >>> sessions = ResultSessions(ttl_s=300)
+        >>> cursor = sessions.create(rows, distances, first_page=10)
+        >>> rows, distances, next_cursor, total = sessions.page(cursor, limit=10)
+        >>> # Session gone: recompute from cursor_replay(cursor), then
+        >>> sessions.restore(cursor, rows, distances)
+    """
+    def __init__(self, max_sessions: int = 10000, ttl_s: float = 300.0):
+        """
+        Initialize the store.
+        Args:
+            max_sessions: Sessions kept before the least recently used is evicted
+            ttl_s: Idle lifetime of a session in seconds (refreshed on each page)
+        """
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._bytes = 0
+        self.created = 0
+        self.pages = 0
+        self.expired = 0
+        self.evictions = 0
+        self.restored = 0
+    def _drop(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.rows.nbytes + session.distances.nbytes
+    def _expire(self, now: float) -> None:
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.expires > now:
+                break
+            self._drop(session_id)
+            self.expired += 1
+    def _store(self, session_id: str, rows: np.ndarray, distances: np.ndarray) -> None:
+        session = _Session(
+            np.ascontiguousarray(rows, dtype=np.int32),
+            np.ascontiguousarray(distances, dtype=np.uint16),
+            time.monotonic() + self.ttl_s,
+        )
+        with self._lock:
+            self._expire(time.monotonic())
+            if session_id in self._sessions:
+                self._drop(session_id)
+            while len(self._sessions) >= self.max_sessions:
+                self._drop(next(iter(self._sessions)))
+                self.evictions += 1
+            self._sessions[session_id] = session
+            self._bytes += session.rows.nbytes + session.distances.nbytes
+    def create(self, rows: np.ndarray, distances: np.ndarray, first_page: int, replay: bytes = b"") -> Optional[str]:
+        """
+        Store a sorted result list whose first ``first_page`` hits were already returned.
+        Args:
+            rows: Row ids in rank order
+            distances: Hamming distances in rank order
+            first_page: Number of hits the caller has already served
+            replay: Token embedded in the cursor from which the same list can
+                be recomputed (see ``cursor_replay``); empty = not replayable
+        Returns:
+            Cursor for the next page, or None if nothing is left to page through
+        """
+        if len(rows) <= first_page:
+            return None
+        session_id = secrets.token_urlsafe(12)
+        if replay:
+            session_id += "~" + base64.urlsafe_b64encode(replay).decode("ascii").rstrip("=")
+        self._store(session_id, rows, distances)
+        with self._lock:
+            self.created += 1
+        return make_cursor(session_id, first_page)
+    def page(self, cursor: str, limit: int) -> Tuple[np.ndarray, np.ndarray, Optional[str], int]:
+        """
+        Read the page starting at ``cursor``.
+        Returns:
+            Tuple of (rows, distances, next cursor or None, total hits in the session)
+        Raises:
+            ValueError: If the cursor is malformed
+            SessionExpired: If the session is unknown, expired or evicted
+        """
+        session_id, offset = parse_cursor(cursor)
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise SessionExpired(f"result session {session_id} expired")
+            session.expires = now + self.ttl_s
+            self._sessions.move_to_end(session_id)
+            self.pages += 1
+        total = len(session.rows)
+        end = min(total, offset + max(0, limit))
+        next_cursor = make_cursor(session_id, end) if end < total else None
+        return session.rows[offset:end], session.distances[offset:end], next_cursor, total
+    def restore(self, cursor: str, rows: np.ndarray, distances: np.ndarray) -> None:
+        """
+        Re-create the session behind ``cursor`` from a recomputed result list.
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        session_id, _ = parse_cursor(cursor)
+        self._store(session_id, rows, distances)
+        with self._lock:
+            self.restored += 1
+    def clear(self) -> None:
+        """Drop every session (e.g. after the index they point into was replaced)."""
+        with self._lock:
+            self._sessions.clear()
+            self._bytes = 0
+    def __len__(self) -> int:
+        return len(self._sessions)
+    def get_stats(self) -> Dict[str, Any]:
+        """Get session statistics."""
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self._bytes,
+            "created": self.created,
+            "pages": self.pages,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "restored": self.restored,
+            "ttl_s": self.ttl_s,
+        }
@@ -0,0 +1,186 @@
+"""
+MiniVector Shard Client - Pooled HTTP client for coordinator fan-out
+====================================================================
+Opening an ``aiohttp.ClientSession`` per query pays connection setup to
+every worker on every request. ``ShardClient`` is created once for the
+lifetime of the coordinator and keeps warm connections instead:
+    - keep-alive pools with a global and a per-worker connection limit
+    - connect and socket-read timeouts on top of each request's deadline,
+      so a hung worker cannot hold a request forever
+    - Unix-socket transport for co-located workers (``unix:/path.sock``)
+    - per-shard metrics: new vs reused connections, connect latency and
+      in-flight requests
+Example:
+    >>> client = ShardClient(["http://10.0.0.2:8001", "unix:/tmp/worker_1.sock"])
+    >>> await client.start()
+    >>> status, content_type, body = await client.post(url, "/search", data, headers, timeout_s=0.5)
+    >>> await client.close()
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+import aiohttp
+from .metrics import SHARD_CONNECT_LATENCY, SHARD_CONNECTIONS, SHARD_IN_FLIGHT
+UNIX_PREFIX = "unix:"
+def parse_target(url: str) -> Tuple[str, Optional[str]]:
+    """
+    Split a worker URL into (HTTP base URL, Unix socket path or None).
+    ``unix:/tmp/worker_0.sock`` is served over the socket with a placeholder host.
+    """
+    if url.startswith(UNIX_PREFIX):
+        return "http://localhost", url[len(UNIX_PREFIX):]
+    return url.rstrip("/"), None
+class ShardClient:
+    """
+    Long-lived connection pools to a fixed set of workers.
+    TCP workers share one connector (``limit_per_host`` bounds each worker);
+    each Unix-socket worker gets its own connector of ``limit_per_host``.
+    """
+    def __init__(
+        self,
+        urls: List[str],
+        limit: int = 256,
+        limit_per_host: int = 32,
+        keepalive_s: float = 30.0,
+        connect_timeout_s: Optional[float] = 0.5,
+        read_timeout_s: Optional[float] = 10.0
+    ):
+        """
+        Initialize the client (call ``start`` from the event loop before use).
+        Args:
+            urls: Worker base URLs, ``http://host:port`` or ``unix:/path.sock``
+            limit: Maximum open TCP connections across all workers
+            limit_per_host: Maximum open connections to one worker
+            keepalive_s: Idle time before a pooled connection is closed
+            connect_timeout_s: Timeout for establishing a connection
+            read_timeout_s: Timeout between reads of a response
+        """
+        self.urls = list(urls)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_s = keepalive_s
+        self.connect_timeout_s = connect_timeout_s
+        self.read_timeout_s = read_timeout_s
+        self._targets: Dict[str, Tuple[aiohttp.ClientSession, str]] = {}
+        self._sessions: List[aiohttp.ClientSession] = []
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.in_flight = 0
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+        async def on_create_start(session, ctx, params):
+            ctx.connect_start = time.perf_counter()
+        async def on_create_end(session, ctx, params):
+            shard = ctx.trace_request_ctx.shard
+            self.new_connections += 1
+            SHARD_CONNECTIONS.inc(shard=shard, kind="new")
+            SHARD_CONNECT_LATENCY.observe(time.perf_counter() - ctx.connect_start, shard=shard)
+        async def on_reuse(session, ctx, params):
+            self.reused_connections += 1
+            SHARD_CONNECTIONS.inc(shard=ctx.trace_request_ctx.shard, kind="reused")
+        trace.on_connection_create_start.append(on_create_start)
+        trace.on_connection_create_end.append(on_create_end)
+        trace.on_connection_reuseconn.append(on_reuse)
+        return trace
+    def _session(self, connector: aiohttp.BaseConnector) -> aiohttp.ClientSession:
+        session = aiohttp.ClientSession(connector=connector, trace_configs=[self._trace_config()])
+        self._sessions.append(session)
+        return session
+    async def start(self) -> None:
+        """Create the connection pools (must run inside the event loop)."""
+        if self._sessions:
+            return
+        tcp = None
+        for url in self.urls:
+            base, socket_path = parse_target(url)
+            if socket_path is not None:
+                connector = aiohttp.UnixConnector(path=socket_path, limit=self.limit_per_host, keepalive_timeout=self.keepalive_s)
+                self._targets[url] = (self._session(connector), base)
+            else:
+                if tcp is None:
+                    tcp = self._session(aiohttp.TCPConnector(
+                        limit=self.limit, limit_per_host=self.limit_per_host,
+                        keepalive_timeout=self.keepalive_s, ttl_dns_cache=300))
+                self._targets[url] = (tcp, base)
+    async def close(self) -> None:
+        """Close every pool."""
+        sessions, self._sessions, self._targets = self._sessions, [], {}
+        await asyncio.gather(*(session.close() for session in sessions))
+    def _prepare(self, url: str, timeout_s: Optional[float]) -> Tuple[aiohttp.ClientSession, str, aiohttp.ClientTimeout]:
+        if not self._targets:
+            raise RuntimeError("ShardClient.start() has not been called")
+        if timeout_s is not None and timeout_s <= 0:
+            # aiohttp reads total=0 as "no timeout"
+            self.timeouts += 1
+            raise asyncio.TimeoutError(f"no time left for a request to {url}")
+        session, base = self._targets[url]
+        return session, base, aiohttp.ClientTimeout(total=timeout_s, sock_connect=self.connect_timeout_s, sock_read=self.read_timeout_s)
+    async def post(
+        self,
+        url: str,
+        path: str,
+        data: bytes,
+        headers: Dict[str, str],
+        timeout_s: Optional[float] = None
+    ) -> Tuple[int, Optional[str], bytes]:
+        """
+        POST ``data`` to ``path`` on worker ``url`` over a pooled connection.
+        Args:
+            url: One of the worker URLs given at construction
+            path: Request path, e.g. '/search'
+            data: Encoded request body
+            headers: Request headers
+            timeout_s: Total time budget (the request deadline), or None;
+                an exhausted budget (<= 0) fails without sending
+        Returns:
+            Tuple of (status, content type, body)
+        Raises:
+            asyncio.TimeoutError: If a timeout or the budget expired
+            aiohttp.ClientError: On connection or protocol errors
+        """
+        session, base, timeout = self._prepare(url, timeout_s)
+        self.requests += 1
+        self.in_flight += 1
+        SHARD_IN_FLIGHT.inc(shard=url)
+        try:
+            async with session.post(base + path, data=data, headers=headers, timeout=timeout,
+                                    trace_request_ctx=SimpleNamespace(shard=url)) as resp:
+                return resp.status, resp.headers.get("Content-Type"), await resp.read()
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except aiohttp.ClientError:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            SHARD_IN_FLIGHT.dec(shard=url)
+    async def get(self, url: str, path: str, timeout_s: Optional[float] = None) -> Tuple[int, Optional[str], bytes]:
+        """GET ``path`` on worker ``url`` (health probes); same pools, timeouts and errors as ``post``."""
+        session, base, timeout = self._prepare(url, timeout_s)
+        try:
+            async with session.get(base + path, timeout=timeout, trace_request_ctx=SimpleNamespace(shard=url)) as resp:
+                return resp.status, resp.headers.get("Content-Type"), await resp.read()
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except aiohttp.ClientError:
+            self.errors += 1
+            raise
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool statistics."""
+        total = self.new_connections + self.reused_connections
+        return {
+            "workers": len(self.urls),
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "reuse_rate": f"{self.reused_connections / total * 100:.1f}%" if total else "0.0%",
+        }
@@ -0,0 +1,153 @@
+"""
+MiniVector Single-Flight - Coalescing of identical in-flight work
+=================================================================
+When many callers ask for the same expensive result at the same time, only
+the first one starts the work; the rest attach to it.
+    - SingleFlight: shares the result (or exception) of one coroutine, e.g.
+      an embed + search for a trending query
+    - StreamSingleFlight: shares one async stream (e.g. an LLM generation)
+      with every subscriber, replaying chunks produced before they joined
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+class SingleFlight:
+    """
+    Run at most one ``fn()`` per key at a time and share its outcome.
+    The work runs in its own task, so a caller that disconnects does not
+    cancel it for the callers still waiting on the same key.
+    Example:
+        >>> flights = SingleFlight()
+        >>> results, shared = await flights.do((text, k), lambda: search(text, k))
+    """
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+    def in_flight(self, key: Hashable) -> bool:
+        """Whether work for ``key`` is currently running."""
+        return key in self._flights
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await the shared result for ``key``, starting ``fn()`` if nobody else has.
+        Args:
+            key: Identity of the work being shared
+            fn: Zero-arg callable returning an awaitable
+        Returns:
+            Tuple of (result, whether it was shared with an earlier caller)
+        Raises:
+            Whatever ``fn()`` raised, in every waiting caller
+        """
+        task = self._flights.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.get_running_loop().create_task(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda t, key=key: self._finish(key, t))
+            self.started += 1
+        return await asyncio.shield(task), shared
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()
+    def get_stats(self) -> Dict[str, Any]:
+        """Get single-flight counters."""
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
+class _StreamFlight:
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.cond = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+class StreamSingleFlight:
+    """
+    Run one producer stream per key and fan its chunks out to all subscribers.
+    The producer is cancelled once its last subscriber goes away, so an
+    abandoned generation does not keep running upstream.
+    Example:
+        >>> flights = StreamSingleFlight()
+        >>> async for token in flights.subscribe(key, lambda: generate(prompt)):
+        ...     yield token
+    """
+    def __init__(self):
+        self._flights: Dict[Hashable, _StreamFlight] = {}
+        self.started = 0
+        self.coalesced = 0
+    def in_flight(self, key: Hashable) -> bool:
+        """Whether a producer for ``key`` is currently running."""
+        return key in self._flights
+    async def subscribe(
+        self,
+        key: Hashable,
+        producer: Callable[[], AsyncIterator[Any]]
+    ) -> AsyncIterator[Any]:
+        """
+        Stream the chunks for ``key``, starting ``producer()`` if nobody else has.
+        Args:
+            key: Identity of the work being shared
+            producer: Zero-arg callable returning an async iterator of chunks
+        Yields:
+            Every chunk of the shared stream, from the beginning
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _StreamFlight()
+            self._flights[key] = flight
+            flight.task = asyncio.get_running_loop().create_task(self._pump(key, flight, producer))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        flight.subscribers += 1
+        position = 0
+        try:
+            while True:
+                async with flight.cond:
+                    while position >= len(flight.chunks) and not flight.done:
+                        await flight.cond.wait()
+                    new_chunks = flight.chunks[position:]
+                    finished = flight.done
+                for chunk in new_chunks:
+                    yield chunk
+                position += len(new_chunks)
+                if finished and position >= len(flight.chunks):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done and flight.task is not None:
+                flight.task.cancel()
+                # A request arriving before the cancellation lands starts afresh
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+    async def _pump(self, key: Hashable, flight: _StreamFlight, producer: Callable[[], AsyncIterator[Any]]) -> None:
+        try:
+            async for chunk in producer():
+                async with flight.cond:
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+        except asyncio.CancelledError:
+            flight.error = RuntimeError("stream cancelled")
+        except Exception as e:
+            flight.error = e
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.done = True
+            async with flight.cond:
+                flight.cond.notify_all()
+    def get_stats(self) -> Dict[str, Any]:
+        """Get single-flight counters."""
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
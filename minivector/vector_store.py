@@ -1,8 +1,10 @@
-import faiss
 import numpy as np
 import json
 from pathlib import Path
 from typing import List, Dict, Tuple
+def _faiss():
+    import faiss
+    return faiss
 class VectorStore:   
     def __init__(self, dimension: int = 384):
         self.dimension = dimension
@@ -13,7 +15,7 @@ class VectorStore:
         vectors = np.load(vectors_path).astype('float32')
         with open(metadata_path, 'r', encoding='utf-8') as f:
             self.metadata = json.load(f)
-        self.index = faiss.IndexFlatL2(self.dimension)
+        self.index = _faiss().IndexFlatL2(self.dimension)
         self.index.add(vectors)       
     def search(self, query_vector: np.ndarray, k: int = 10) -> List[Dict]:
         if self.index is None:
@@ -32,10 +34,10 @@ class VectorStore:
         return results
     def save_index(self, index_path: str = "data/indices/faiss.index"):
         Path(index_path).parent.mkdir(parents=True, exist_ok=True)
-        faiss.write_index(self.index, index_path)
+        _faiss().write_index(self.index, index_path)
     def load_index(self, index_path: str = "data/indices/faiss.index",
                    metadata_path: str = "data/processed/metadata.json"):       
-        self.index = faiss.read_index(index_path)        
+        self.index = _faiss().read_index(index_path)        
         with open(metadata_path, 'r', encoding='utf-8') as f:
             self.metadata = json.load(f)
 if __name__ == "__main__":
@@ -0,0 +1,200 @@
+"""
+MiniVector Wire Protocol - Packed binary frames between coordinator and workers
+==============================================================================
+With JSON (or msgpack) bodies the coordinator ships each query as 384 floats
+that every worker parses and binarizes again, and workers answer with one
+dict per hit. The wire protocol sends what the shards actually compute on:
+    - query frame: the packed 1-bit code of each query (48 bytes at 384
+      dims), binarized once by the coordinator; the float32 vectors ride
+      along only when ``FLAG_FLOAT`` is set (asymmetric re-scoring)
+    - result frame: per-query hit counts, then uint32 row ids and uint16
+      Hamming distances as contiguous arrays; document metadata for the hits
+      follows only when the query set ``FLAG_DOCS``; the header carries the
+      index generation so a later document fetch can detect a reload
+Every frame starts with the magic ``MV``, a version byte and a frame kind, so
+either side rejects frames it does not understand with ``WireError``. Values
+that do not fit a header field (``MAX_K`` hits, ``MAX_QUERIES`` queries) are
+rejected with ``WireError`` when encoding instead of being truncated.
+Layout (little-endian):
+    query:  header | codes uint8 (Q, code_bytes) | [floats float32 (Q, dim)]
+    result: header | counts uint32 (Q,) | rows uint32 (H,) | distances uint16 (H,)
+            | [docs length uint32 | docs blob (msgpack or JSON list of lists)]
+"""
+import itertools
+import math
+import struct
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from .encoding import JSON, MSGPACK, available_formats, decode, encode
+MEDIA_TYPE = "application/vnd.minivector.wire"
+MAGIC = b"MV"
+VERSION = 2
+QUERY = 1
+RESULT = 2
+FLAG_FLOAT = 1 << 0
+FLAG_DOCS = 1 << 1
+FLAG_DOCS_MSGPACK = 1 << 2
+# magic, version, kind, flags, num_queries, k, code_bytes, dim, timeout_ms (NaN = none)
+QUERY_HEADER = struct.Struct("<2sBBHHIHHf")
+# magic, version, kind, flags, shard_id, num_queries, vector_dim, generation, took_ms, queue_ms
+RESULT_HEADER = struct.Struct("<2sBBHHIIIff")
+_DOCS_LEN = struct.Struct("<I")
+# Largest k a query frame may ask for (request models validate against it)
+MAX_K = 65535
+MAX_QUERIES = 65535
+class WireError(ValueError):
+    """Malformed frame, unknown frame kind or unsupported protocol version."""
+def is_wire(media_type: Optional[str]) -> bool:
+    """Whether a Content-Type header names the wire protocol."""
+    return (media_type or "").split(";", 1)[0].strip().lower() == MEDIA_TYPE
+def _check_header(magic: bytes, version: int, kind: int, expected: int) -> None:
+    if magic != MAGIC:
+        raise WireError("not a minivector wire frame")
+    if version != VERSION:
+        raise WireError(f"unsupported wire protocol version {version} (this side speaks {VERSION})")
+    if kind != expected:
+        raise WireError(f"expected frame kind {expected}, got {kind}")
+def _array(body: memoryview, offset: int, dtype: str, count: int) -> np.ndarray:
+    size = np.dtype(dtype).itemsize * count
+    if offset + size > len(body):
+        raise WireError("truncated frame")
+    return np.frombuffer(body, dtype=dtype, count=count, offset=offset)
+def encode_query(
+    codes: np.ndarray,
+    k: int,
+    dim: int,
+    timeout_ms: Optional[float] = None,
+    floats: Optional[np.ndarray] = None,
+    with_docs: bool = True
+) -> bytes:
+    """
+    Build a query frame.
+    Args:
+        codes: Packed query codes of shape (Q, code_bytes) or (code_bytes,)
+        k: Hits requested per query
+        dim: Embedding dimension the codes were packed from
+        timeout_ms: Remaining request budget, or None
+        floats: Optional float32 query vectors (Q, dim) for asymmetric scoring
+        with_docs: Ask the worker to return document metadata for the hits
+    Raises:
+        WireError: If ``k`` or the number of queries does not fit the frame
+    """
+    codes = np.ascontiguousarray(np.atleast_2d(codes), dtype=np.uint8)
+    if not 0 <= k <= MAX_K:
+        raise WireError(f"k={k} is outside the wire protocol's range 0..{MAX_K}")
+    if codes.shape[0] > MAX_QUERIES:
+        raise WireError(f"{codes.shape[0]} queries in one frame; the wire protocol allows {MAX_QUERIES}")
+    flags = FLAG_DOCS if with_docs else 0
+    parts = [b"", codes.tobytes()]
+    if floats is not None:
+        flags |= FLAG_FLOAT
+        parts.append(np.ascontiguousarray(np.atleast_2d(floats), dtype="<f4").tobytes())
+    parts[0] = QUERY_HEADER.pack(MAGIC, VERSION, QUERY, flags, codes.shape[0], k, codes.shape[1], dim,
+                                 math.nan if timeout_ms is None else timeout_ms)
+    return b"".join(parts)
+def decode_query(body: bytes) -> Dict[str, Any]:
+    """
+    Parse a query frame.
+    Returns:
+        Dict with codes (Q, code_bytes) uint8, k, dim, timeout_ms (or None),
+        floats (Q, dim) float32 or None, and with_docs
+    Raises:
+        WireError: If the frame is malformed or of another version
+    """
+    body = memoryview(body)
+    if len(body) < QUERY_HEADER.size:
+        raise WireError("truncated frame")
+    magic, version, kind, flags, nq, k, code_bytes, dim, timeout_ms = QUERY_HEADER.unpack_from(body)
+    _check_header(magic, version, kind, QUERY)
+    if k > MAX_K:
+        raise WireError(f"k={k} is outside the wire protocol's range 0..{MAX_K}")
+    offset = QUERY_HEADER.size
+    codes = _array(body, offset, "u1", nq * code_bytes).reshape(nq, code_bytes)
+    offset += codes.nbytes
+    floats = None
+    if flags & FLAG_FLOAT:
+        floats = _array(body, offset, "<f4", nq * dim).reshape(nq, dim)
+    return {
+        "codes": codes,
+        "k": k,
+        "dim": dim,
+        "timeout_ms": None if math.isnan(timeout_ms) else timeout_ms,
+        "floats": floats,
+        "with_docs": bool(flags & FLAG_DOCS),
+    }
+def encode_results(
+    rows: Sequence[np.ndarray],
+    distances: Sequence[np.ndarray],
+    shard_id: int,
+    vector_dim: int,
+    took_ms: float = 0.0,
+    queue_ms: float = 0.0,
+    docs: Optional[List[List[Dict[str, Any]]]] = None,
+    generation: int = 0
+) -> bytes:
+    """
+    Build a result frame.
+    Args:
+        rows: Per-query row ids in rank order (a (Q, k) array works too)
+        distances: Per-query Hamming distances, aligned with ``rows``
+        shard_id: Shard that produced the hits
+        vector_dim: Bits per code (distances are out of this many)
+        took_ms: Worker handler time
+        queue_ms: Time the search waited for an executor slot
+        docs: Optional per-query metadata dicts aligned with ``rows``
+        generation: Index generation the row ids refer to
+    """
+    counts = np.array([len(r) for r in rows], dtype="<u4")
+    flat_rows = np.concatenate([np.asarray(r) for r in rows]) if len(rows) else np.empty(0)
+    flat_dists = np.concatenate([np.asarray(d) for d in distances]) if len(distances) else np.empty(0)
+    flags = 0
+    parts = [b"", counts.tobytes(), flat_rows.astype("<u4").tobytes(), flat_dists.astype("<u2").tobytes()]
+    if docs is not None:
+        media = MSGPACK if MSGPACK in available_formats() else JSON
+        flags |= FLAG_DOCS | (FLAG_DOCS_MSGPACK if media == MSGPACK else 0)
+        blob = encode(docs, media)
+        parts += [_DOCS_LEN.pack(len(blob)), blob]
+    parts[0] = RESULT_HEADER.pack(MAGIC, VERSION, RESULT, flags, shard_id, len(counts), vector_dim, generation, took_ms, queue_ms)
+    return b"".join(parts)
+def decode_results(body: bytes) -> Dict[str, Any]:
+    """
+    Parse a result frame.
+    Returns:
+        Dict with shard_id, vector_dim, generation, took_ms, queue_ms, rows and distances
+        (lists of per-query arrays) and docs (per-query lists, or None)
+    Raises:
+        WireError: If the frame is malformed or of another version
+    """
+    body = memoryview(body)
+    if len(body) < RESULT_HEADER.size:
+        raise WireError("truncated frame")
+    magic, version, kind, flags, shard_id, nq, vector_dim, generation, took_ms, queue_ms = RESULT_HEADER.unpack_from(body)
+    _check_header(magic, version, kind, RESULT)
+    offset = RESULT_HEADER.size
+    counts = _array(body, offset, "<u4", nq).tolist()
+    offset += 4 * nq
+    total = sum(counts)
+    flat_rows = _array(body, offset, "<u4", total)
+    offset += flat_rows.nbytes
+    flat_dists = _array(body, offset, "<u2", total)
+    offset += flat_dists.nbytes
+    bounds = [0, *itertools.accumulate(counts)]
+    docs = None
+    if flags & FLAG_DOCS:
+        if offset + _DOCS_LEN.size > len(body):
+            raise WireError("truncated frame")
+        (size,) = _DOCS_LEN.unpack_from(body, offset)
+        offset += _DOCS_LEN.size
+        if offset + size > len(body):
+            raise WireError("truncated frame")
+        docs = decode(bytes(body[offset:offset + size]), MSGPACK if flags & FLAG_DOCS_MSGPACK else JSON)
+    return {
+        "shard_id": shard_id,
+        "vector_dim": vector_dim,
+        "generation": generation,
+        "took_ms": took_ms,
+        "queue_ms": queue_ms,
+        "rows": [flat_rows[bounds[i]:bounds[i + 1]] for i in range(nq)],
+        "distances": [flat_dists[bounds[i]:bounds[i + 1]] for i in range(nq)],
+        "docs": docs,
+    }
@@ -23,13 +23,17 @@ PYBIND11_MODULE(minivector_core, m) {
         size_t num_vectors = db_buf.shape[0];
         if (db_buf.shape[1] != (ssize_t)vector_bytes) 
             throw std::runtime_error("Dimension mismatch");
-        auto result = batch_search(
-            static_cast<const uint8_t*>(query_buf.ptr),
-            static_cast<const uint8_t*>(db_buf.ptr),
-            num_vectors,
-            vector_bytes,
-            k
-        );
+        SearchResult result;
+        {
+            py::gil_scoped_release release;
+            result = batch_search(
+                static_cast<const uint8_t*>(query_buf.ptr),
+                static_cast<const uint8_t*>(db_buf.ptr),
+                num_vectors,
+                vector_bytes,
+                k
+            );
+        }
         py::array_t<int64_t> indices(result.indices.size());
         auto idx_ptr = static_cast<int64_t*>(indices.request().ptr);
         for (size_t i = 0; i < result.indices.size(); ++i) {
@@ -40,4 +44,43 @@ PYBIND11_MODULE(minivector_core, m) {
         std::memcpy(dist_ptr, result.distances.data(), result.distances.size() * sizeof(uint32_t));
         return py::make_tuple(indices, distances);
     }, "Perform batch search for a single query");
+    m.def("multi_search", [](
+        py::array_t<uint8_t, py::array::c_style | py::array::forcecast> query_vectors,
+        py::array_t<uint8_t, py::array::c_style | py::array::forcecast> database_vectors,
+        size_t k
+    ) {
+        auto query_buf = query_vectors.request();
+        auto db_buf = database_vectors.request();
+        if (query_buf.ndim != 2) throw std::runtime_error("Queries must be 2D");
+        if (db_buf.ndim != 2) throw std::runtime_error("Database must be 2D");
+        size_t num_queries = query_buf.shape[0];
+        size_t vector_bytes = query_buf.shape[1];
+        size_t num_vectors = db_buf.shape[0];
+        if (db_buf.shape[1] != (ssize_t)vector_bytes)
+            throw std::runtime_error("Dimension mismatch");
+        std::vector<SearchResult> results;
+        {
+            py::gil_scoped_release release;
+            results = multi_query_search(
+                static_cast<const uint8_t*>(query_buf.ptr),
+                static_cast<const uint8_t*>(db_buf.ptr),
+                num_queries,
+                num_vectors,
+                vector_bytes,
+                k
+            );
+        }
+        size_t kk = std::min(k, num_vectors);
+        py::array_t<int64_t> indices({num_queries, kk});
+        py::array_t<uint32_t> distances({num_queries, kk});
+        auto idx = indices.mutable_unchecked<2>();
+        auto dist = distances.mutable_unchecked<2>();
+        for (size_t q = 0; q < num_queries; ++q) {
+            for (size_t i = 0; i < kk; ++i) {
+                idx(q, i) = static_cast<int64_t>(results[q].indices[i]);
+                dist(q, i) = results[q].distances[i];
+            }
+        }
+        return py::make_tuple(indices, distances);
+    }, "Search many queries in one pass over the database");
 }
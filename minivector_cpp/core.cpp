@@ -3,6 +3,7 @@
 #include <numeric>
 #include <cstring>
 #include <sstream>
+#include <queue>
 #ifdef _MSC_VER
     #include <intrin.h>
     #define POPCOUNT64(x) __popcnt64(x)
@@ -95,4 +96,37 @@ SearchResult batch_search(const uint8_t* q, const uint8_t* db, size_t n, size_t
     for (size_t i = 0; i < k; ++i) res.distances[i] = dists[idxs[i]];
     return res;
 }
+std::vector<SearchResult> multi_query_search(const uint8_t* qs, const uint8_t* db, size_t nq, size_t n, size_t bytes, size_t k) {
+    k = std::min(k, n);
+    using Entry = std::pair<uint32_t, size_t>;
+    std::vector<std::priority_queue<Entry>> heaps(nq);
+    const size_t BLOCK = 1024;
+    for (size_t start = 0; start < n; start += BLOCK) {
+        size_t end = std::min(start + BLOCK, n);
+        for (size_t q = 0; q < nq; ++q) {
+            const uint8_t* qv = qs + q * bytes;
+            auto& heap = heaps[q];
+            for (size_t i = start; i < end; ++i) {
+                uint32_t d = hamming_distance_single(qv, db + i * bytes, bytes);
+                if (heap.size() < k) heap.emplace(d, i);
+                else if (k > 0 && d < heap.top().first) { heap.pop(); heap.emplace(d, i); }
+            }
+        }
+    }
+    std::vector<SearchResult> results(nq);
+    for (size_t q = 0; q < nq; ++q) {
+        auto& heap = heaps[q];
+        std::vector<Entry> entries;
+        entries.reserve(heap.size());
+        while (!heap.empty()) { entries.push_back(heap.top()); heap.pop(); }
+        std::sort(entries.begin(), entries.end());
+        results[q].indices.reserve(entries.size());
+        results[q].distances.reserve(entries.size());
+        for (const auto& e : entries) {
+            results[q].indices.push_back(e.second);
+            results[q].distances.push_back(e.first);
+        }
+    }
+    return results;
+}
 }  
@@ -5,9 +5,15 @@ import sys
 import random
 sys.path.append(str(Path(__file__).parent))
 from minivector.embedder import Embedder
+from minivector.cache import CachedEmbedder, EmbeddingCache
 from minivector.binary_engine import BinaryIndex
+from minivector.graph import CitationGraph
+from minivector.passages import PassageIndex
+from minivector.columnar import ColumnarMetadata
+from minivector.lexical import LexicalIndex
 RAW_PATH = Path("data/raw/texts.json")
 OUT_DIR = Path("data/processed")
+CACHE_DIR = Path("data/cache/embeddings")
 def run():
     print("STARTING INGESTION PIPELINE...")
     if not RAW_PATH.exists():
@@ -30,7 +36,8 @@ def run():
         with open(RAW_PATH, 'r', encoding='utf-8') as f: data = json.load(f)
     print(f"Loaded {len(data)} documents.")
     print("Generating embeddings (Float32)...")
-    embedder = Embedder()
+    base = Embedder()
+    embedder = CachedEmbedder(base, EmbeddingCache(dim=base.dim, model_name=base.model_name, path=CACHE_DIR, lowercase=False))
     texts = []
     for d in data:
         title = d.get('title', '')
@@ -38,10 +45,16 @@ def run():
         texts.append(f"{title} {abstract}")
         d['abstract'] = abstract 
     vectors = embedder.embed(texts)
+    print(f"Embedding cache: {embedder.cache.get_stats()}")
     print("Quantizing to Binary (1-bit) and saving...")
     OUT_DIR.mkdir(parents=True, exist_ok=True)
     engine = BinaryIndex()
     engine.build_and_save(vectors, data, OUT_DIR / "vectors.npy", OUT_DIR / "metadata.json")
+    ColumnarMetadata.build(data).save(OUT_DIR / "metadata_columnar", source=OUT_DIR / "metadata.json")
+    print("Building lexical index...")
+    LexicalIndex.build(data).save(OUT_DIR / "lexical")
+    print("Building passage index...")
+    PassageIndex.build(data, embedder).save(OUT_DIR / "passages")
     print("Building connectivity graph...")
     graph = {}
     for i, doc in enumerate(data):
@@ -56,6 +69,7 @@ def run():
         graph[doc['id']] = neighbors
     with open(OUT_DIR / "citation_graph.json", 'w', encoding='utf-8') as f: 
         json.dump(graph, f)
+    CitationGraph.from_adjacency(graph, ids=[d['id'] for d in data]).save(OUT_DIR / "citation_graph")
     print("✅ INGESTION COMPLETE.")
 if __name__ == "__main__":
     run()
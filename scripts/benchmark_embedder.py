@@ -0,0 +1,79 @@
+import argparse
+import time
+import numpy as np
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.embedder import Embedder
+QUERIES = [
+    "attention mechanisms in transformers",
+    "convolutional neural networks for image classification",
+    "reinforcement learning algorithms",
+    "binary quantization for approximate nearest neighbor search",
+    "graph neural networks for molecule property prediction",
+    "diffusion models for image synthesis",
+    "quantum error correction with surface codes",
+    "federated learning under differential privacy",
+]
+def measure(embedder, texts, repeats, batch_size):
+    for q in texts[:4]:
+        embedder.embed_query(q)
+    single = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        embedder.embed_query(texts[i % len(texts)])
+        single.append((time.perf_counter() - start) * 1000)
+    corpus = [texts[i % len(texts)] + f" #{i}" for i in range(batch_size * 8)]
+    start = time.perf_counter()
+    embedder.embed(corpus, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    single = np.array(single)
+    return {
+        "p50_ms": float(np.percentile(single, 50)),
+        "p99_ms": float(np.percentile(single, 99)),
+        "throughput": len(corpus) / elapsed,
+    }
+def fidelity(reference, candidate, texts):
+    a = reference.embed(texts)
+    b = candidate.embed(texts)
+    a = a / (np.linalg.norm(a, axis=1, keepdims=True) + 1e-12)
+    b = b / (np.linalg.norm(b, axis=1, keepdims=True) + 1e-12)
+    cos = (a * b).sum(axis=1)
+    return float(cos.mean()), float(cos.min())
+def main():
+    parser = argparse.ArgumentParser(description="Compare Embedder inference backends")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--repeats", type=int, default=200, help="Single-query latency samples")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--intra-threads", type=int, default=None)
+    parser.add_argument("--inter-threads", type=int, default=None)
+    args = parser.parse_args()
+    threads = {"intra_op_threads": args.intra_threads, "inter_op_threads": args.inter_threads}
+    configs = [
+        ("sentence-transformers (fp32)", dict(backend="sentence-transformers")),
+        ("onnx (fp32)", dict(backend="onnx", quantize=False)),
+        ("onnx (int8 dynamic)", dict(backend="onnx", quantize=True)),
+    ]
+    print("\n" + "=" * 72)
+    print("EMBEDDER BACKEND BENCHMARK")
+    print("=" * 72)
+    reference = None
+    rows = []
+    for label, kwargs in configs:
+        try:
+            embedder = Embedder(args.model, **threads, **kwargs)
+        except ImportError as e:
+            print(f"Skipping {label}: {e}")
+            continue
+        if reference is None:
+            reference = embedder
+        stats = measure(embedder, QUERIES, args.repeats, args.batch_size)
+        stats["cos_mean"], stats["cos_min"] = fidelity(reference, embedder, QUERIES)
+        rows.append((label, stats))
+    print(f"\n{'Backend':<30}{'p50 ms':>9}{'p99 ms':>9}{'texts/s':>10}{'cos avg':>9}{'cos min':>9}")
+    print("-" * 76)
+    for label, s in rows:
+        print(f"{label:<30}{s['p50_ms']:>9.2f}{s['p99_ms']:>9.2f}{s['throughput']:>10.1f}{s['cos_mean']:>9.4f}{s['cos_min']:>9.4f}")
+    print("=" * 72 + "\n")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import json
+import time
+import numpy as np
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector import encoding
+from minivector.encoding import ARROW, JSON, MSGPACK, available_formats, encode, vector_field
+def make_payload(k, dim=384):
+    rng = np.random.default_rng(0)
+    hits = []
+    for i in range(k):
+        abstract = " ".join(f"token{j}" for j in rng.integers(0, 5000, 150))
+        hits.append({
+            "id": f"2511.{i:05d}v1",
+            "title": f"A study of topic {i} in approximate nearest neighbour search",
+            "abstract": abstract,
+            "authors": ["A. Author", "B. Author"],
+            "score": 1.0 - i / (k * 2),
+            "text_preview": abstract[:200] + "...",
+        })
+    return {"results": hits, "took_ms": 3.2, "queue_ms": 0.1, "method": "Binary Quantization", "cache_hit": False}
+def fastapi_default(payload):
+    from fastapi.encoders import jsonable_encoder
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+def stdlib_json(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+def timed(fn, payload, repeats):
+    fn(payload)
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        body = fn(payload)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return float(np.median(samples)), len(body)
+def main():
+    parser = argparse.ArgumentParser(description="Serialization cost of search responses per format")
+    parser.add_argument("--ks", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+    encoders = [("fastapi default", fastapi_default), ("json (stdlib)", stdlib_json)]
+    if encoding._orjson is not None:
+        encoders.append(("orjson", lambda p: encode(p, JSON)))
+    if MSGPACK in available_formats():
+        encoders.append(("msgpack", lambda p: encode(p, MSGPACK)))
+    if ARROW in available_formats():
+        encoders.append(("arrow ipc", lambda p: encode(p, ARROW)))
+    print("\n" + "=" * 64)
+    print("RESPONSE ENCODING BENCHMARK")
+    print("=" * 64)
+    print(f"Formats available: {', '.join(available_formats())}")
+    for k in args.ks:
+        payload = make_payload(k)
+        print(f"\nk={k}")
+        print(f"{'Encoder':<20}{'median us':>12}{'bytes':>12}{'MB/s':>10}")
+        print("-" * 54)
+        for label, fn in encoders:
+            try:
+                us, size = timed(fn, payload, args.repeats)
+            except Exception as e:
+                print(f"{label:<20}  failed: {e}")
+                continue
+            print(f"{label:<20}{us:>12.1f}{size:>12,}{size / us:>10.1f}")
+    vec = np.random.rand(384).astype(np.float32)
+    print("\nWorker request body (384-dim query vector)")
+    print(f"{'Encoding':<20}{'median us':>12}{'bytes':>12}")
+    print("-" * 44)
+    request_encoders = [("json list", lambda v: stdlib_json({"query_vector": v.tolist(), "k": 10}))]
+    if MSGPACK in available_formats():
+        request_encoders.append(("msgpack float32", lambda v: encode({"query_vector": vector_field(v, MSGPACK), "k": 10}, MSGPACK)))
+    for label, fn in request_encoders:
+        us, size = timed(fn, vec, args.repeats)
+        print(f"{label:<20}{us:>12.1f}{size:>12,}")
+    print("=" * 64 + "\n")
+if __name__ == "__main__":
+    main()
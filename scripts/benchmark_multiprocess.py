@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import time
+import numpy as np
+import sys
+from pathlib import Path
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+def process_tree(pid):
+    pids = [pid]
+    for child in Path(f"/proc/{pid}/task").glob("*/children"):
+        for c in child.read_text().split():
+            pids.extend(process_tree(int(c)))
+    return pids
+def memory_kb(pid):
+    rss = pss = 0
+    try:
+        for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+            if line.startswith("Rss:"):
+                rss = int(line.split()[1])
+            elif line.startswith("Pss:"):
+                pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, pss
+def tree_memory_mb(pid):
+    """Summed RSS (counts shared pages once per process) and PSS (shared pages split between sharers)."""
+    totals = np.array([memory_kb(p) for p in process_tree(pid)]).sum(axis=0)
+    return totals[0] / 1024, totals[1] / 1024
+def launch(mode, workers, port):
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])), "INDEX_MMAP": "1"}
+    if mode == "prefork":
+        cmd = [sys.executable, "-m", "api.prefork", "--workers", str(workers), "--port", str(port), "--host", "127.0.0.1"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "api.server:app", "--workers", str(workers), "--port", str(port), "--host", "127.0.0.1", "--log-level", "warning"]
+    return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+async def wait_ready(url, timeout_s):
+    import aiohttp
+    deadline = time.time() + timeout_s
+    async with aiohttp.ClientSession() as session:
+        while time.time() < deadline:
+            try:
+                async with session.get(f"{url}/health", timeout=aiohttp.ClientTimeout(total=1)) as resp:
+                    if resp.status == 200 and (await resp.json())["status"] == "ready":
+                        return True
+            except Exception:
+                pass
+            await asyncio.sleep(0.2)
+    return False
+async def load(url, duration_s, concurrency, k, seed=0):
+    import aiohttp
+    latencies = []
+    errors = 0
+    stop_at = time.perf_counter() + duration_s
+    counter = iter(range(seed * 10 ** 9, (seed + 1) * 10 ** 9))
+    async def client(session):
+        nonlocal errors
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                async with session.post(f"{url}/search", json={"query": f"benchmark query {next(counter)}", "k": k}) as resp:
+                    await resp.read()
+                    if resp.status != 200:
+                        errors += 1
+                        continue
+            except Exception:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+    return latencies, errors
+def load_process(url, duration_s, concurrency, k, seed):
+    return asyncio.run(load(url, duration_s, concurrency, k, seed))
+def drive(url, duration_s, concurrency, k, client_procs):
+    """Run the load from several client processes so the client is not the bottleneck."""
+    from concurrent.futures import ProcessPoolExecutor
+    per_proc = max(1, concurrency // client_procs)
+    with ProcessPoolExecutor(client_procs) as pool:
+        start = time.perf_counter()
+        parts = list(pool.map(load_process, *zip(*[(url, duration_s, per_proc, k, i) for i in range(client_procs)])))
+        elapsed = time.perf_counter() - start
+    latencies = [ms for part, _ in parts for ms in part]
+    errors = sum(e for _, e in parts)
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    return len(latencies) / elapsed, float(np.percentile(lat, 50)), float(np.percentile(lat, 99)), errors
+def run(mode, workers, args):
+    url = f"http://127.0.0.1:{args.port}"
+    proc = launch(mode, workers, args.port)
+    try:
+        if not asyncio.run(wait_ready(url, args.startup_timeout)):
+            return None
+        asyncio.run(load(url, 1.0, args.concurrency, args.k))
+        qps, p50, p99, errors = drive(url, args.duration, args.concurrency, args.k, args.client_procs)
+        rss, pss = tree_memory_mb(proc.pid)
+        return {"qps": qps, "p50": p50, "p99": p99, "errors": errors, "rss": rss, "pss": pss}
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+def main():
+    parser = argparse.ArgumentParser(description="QPS and memory scaling of the search server against process count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", default=["prefork", "uvicorn"], choices=["prefork", "uvicorn"])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--client-procs", type=int, default=max(1, (os.cpu_count() or 1) // 4), help="Load generator processes")
+    parser.add_argument("--port", type=int, default=8810)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    print("\n" + "=" * 78)
+    print("MULTI-PROCESS SERVING BENCHMARK")
+    print("=" * 78)
+    print("prefork: index/metadata/embedder loaded once, workers forked (api.prefork)")
+    print("uvicorn: `uvicorn --workers N`, every worker loads its own copy")
+    print("RSS sums each process's resident pages (shared pages counted per process);")
+    print("PSS splits shared pages between the processes mapping them (actual total).")
+    print(f"Load: {args.concurrency} concurrent clients from {args.client_procs} processes, {args.duration:.0f}s per run")
+    print(f"\n{'Mode':<10}{'Workers':>8}{'QPS':>10}{'p50 ms':>9}{'p99 ms':>9}{'Errors':>8}{'RSS MB':>10}{'PSS MB':>10}")
+    print("-" * 74)
+    for mode in args.modes:
+        base = None
+        for workers in args.workers:
+            r = run(mode, workers, args)
+            if r is None:
+                print(f"{mode:<10}{workers:>8}  server did not become ready")
+                continue
+            base = base or r["qps"]
+            print(f"{mode:<10}{workers:>8}{r['qps']:>10.0f}{r['p50']:>9.1f}{r['p99']:>9.1f}{r['errors']:>8}{r['rss']:>10.0f}{r['pss']:>10.0f}"
+                  f"   ({r['qps'] / base:.2f}x)")
+if __name__ == "__main__":
+    main()
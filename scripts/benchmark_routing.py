@@ -0,0 +1,91 @@
+import argparse
+import time
+import numpy as np
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.binary_engine import BinaryIndex, pack_codes
+from minivector.merge import global_ids, merge_topk
+from minivector.routing import ShardRouter, kmeans_binary
+def synthetic(num_docs, num_queries, dim, topics, noise, seed=0):
+    """Topic mixture: documents and queries are noisy copies of topic centres."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((topics, dim))
+    def draw(n):
+        return centres[rng.integers(0, topics, n)] + noise * rng.standard_normal((n, dim))
+    return pack_codes(draw(num_docs)), pack_codes(draw(num_queries))
+def from_index(path, num_queries, flip, seed=0):
+    """Real codes; queries are stored rows with a fraction of bits flipped."""
+    codes = np.load(path)
+    rng = np.random.default_rng(seed)
+    bits = np.unpackbits(codes[rng.choice(len(codes), num_queries, replace=False)], axis=1)
+    bits ^= (rng.random(bits.shape) < flip).astype(np.uint8)
+    return codes, np.packbits(bits, axis=1)
+def make_index(codes):
+    index = BinaryIndex(vector_dim=codes.shape[1] * 8)
+    index.vectors = np.ascontiguousarray(codes)
+    return index
+def run(shards, queries, k, probes):
+    """Search the probed shards (batched per shard) and merge; returns (per-query ids, dists, search seconds)."""
+    plan = {}
+    for q, probe in enumerate(probes):
+        for shard, shard_k in probe:
+            plan.setdefault(shard, []).append((q, shard_k))
+    per_query = [[] for _ in range(len(queries))]
+    start = time.perf_counter()
+    for shard, entries in plan.items():
+        rows, dists = shards[shard].search_packed(queries[[q for q, _ in entries]], max(sk for _, sk in entries))
+        for i, (q, shard_k) in enumerate(entries):
+            per_query[q].append((global_ids(shard, rows[i][:shard_k]), dists[i][:shard_k]))
+    elapsed = time.perf_counter() - start
+    return [merge_topk(lists, k) for lists in per_query], elapsed
+def recall(results, exact, k):
+    """Tie-aware recall@k: hits at or within the exact k-th distance, capped at k."""
+    hits = [min(k, int((dists <= exact_dists[-1]).sum())) / k for (_, dists), (_, exact_dists) in zip(results, exact)]
+    return float(np.mean(hits))
+def main():
+    parser = argparse.ArgumentParser(description="Recall and throughput of k-means shard routing against full fan-out")
+    parser.add_argument("--vectors", default=None, help="Packed vectors.npy to shard (default: synthetic topic mixture)")
+    parser.add_argument("--docs", type=int, default=100_000, help="Synthetic documents")
+    parser.add_argument("--topics", type=int, default=64, help="Synthetic topics")
+    parser.add_argument("--noise", type=float, default=2.0, help="Synthetic within-topic spread (relative to topic centres)")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--flip", type=float, default=0.1, help="Bit flip rate for queries drawn from --vectors")
+    parser.add_argument("--shards", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-k", type=int, default=5, help="Smallest per-shard k for the adaptive rows")
+    args = parser.parse_args()
+    if args.vectors:
+        codes, queries = from_index(args.vectors, args.queries, args.flip)
+    else:
+        codes, queries = synthetic(args.docs, args.queries, args.dim, args.topics, args.noise)
+    k = args.k
+    print("\n" + "=" * 86)
+    print("SHARD ROUTING BENCHMARK")
+    print("=" * 86)
+    print(f"{len(codes):,} docs, {len(queries)} queries, k={k}. Recall is against exact top-k over all shards.")
+    print("Capacity = shard requests per query with full fan-out / with routing (QPS gain at fixed per-node load).")
+    for num_shards in args.shards:
+        centroids, assignments = kmeans_binary(codes, num_shards)
+        shards = [make_index(codes[assignments == s]) for s in range(num_shards)]
+        sizes = np.bincount(assignments, minlength=num_shards)
+        full = [[(s, k) for s in range(num_shards)] for _ in range(len(queries))]
+        exact, full_s = run(shards, queries, k, full)
+        print(f"\n{num_shards} shards (sizes {sizes.min():,}-{sizes.max():,})")
+        print(f"{'Routing':<22}{'recall@k':>10}{'shards/q':>10}{'rows/q':>12}{'QPS (1 node)':>14}{'capacity':>10}")
+        print("-" * 78)
+        print(f"{'full fan-out':<22}{1.0:>10.3f}{num_shards:>10.1f}{len(codes):>12,}{len(queries) / full_s:>14,.0f}{1.0:>9.1f}x")
+        for adaptive in (False, True):
+            router = ShardRouter(centroids, adaptive_k=adaptive, min_k=args.min_k)
+            for nprobe in sorted({1, 2, 4, max(1, num_shards // 2)} - {num_shards}):
+                if nprobe > num_shards:
+                    continue
+                probes = router.route(queries, nprobe, k)
+                results, elapsed = run(shards, queries, k, probes)
+                rows = np.mean([sum(sizes[s] for s, _ in p) for p in probes])
+                label = f"nprobe={nprobe}" + (" adaptive k" if adaptive else "")
+                print(f"{label:<22}{recall(results, exact, k):>10.3f}{nprobe:>10.1f}{rows:>12,.0f}{len(queries) / elapsed:>14,.0f}{num_shards / nprobe:>9.1f}x")
+    print("=" * 86 + "\n")
+if __name__ == "__main__":
+    main()
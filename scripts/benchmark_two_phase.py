@@ -0,0 +1,91 @@
+import argparse
+import time
+import numpy as np
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.binary_engine import BinaryIndex, make_hit, pack_codes
+from minivector.encoding import JSON, MSGPACK, available_formats, decode, encode
+from minivector.merge import global_ids, merge_topk, split_ids
+from minivector.wire import decode_results, encode_results
+DOCS_ENCODING = MSGPACK if MSGPACK in available_formats() else JSON
+def make_shards(num_shards, docs_per_shard, dim):
+    rng = np.random.default_rng(0)
+    shards = []
+    for s in range(num_shards):
+        index = BinaryIndex(vector_dim=dim)
+        index.vectors = np.packbits(rng.standard_normal((docs_per_shard, dim)) > 0, axis=1)
+        index.metadata = [{"id": f"{s}.{i}", "title": f"A study of topic {i}", "authors": ["A. Author", "B. Author"],
+                           "abstract": " ".join(f"token{j}" for j in rng.integers(0, 5000, 150))} for i in range(docs_per_shard)]
+        shards.append(index)
+    return shards
+def one_phase(shards, codes, k):
+    """Every shard returns k full documents; the coordinator sorts S x k hits."""
+    bodies = []
+    for s, index in enumerate(shards):
+        rows, dists = index.search_packed(codes, k)
+        bodies.append(encode_results(rows, dists, s, index.vector_dim, docs=[[index.metadata[int(r)] for r in rows[0]]]))
+    start = time.perf_counter()
+    hits = []
+    for body in bodies:
+        frame = decode_results(body)
+        for doc, d in zip(frame["docs"][0], frame["distances"][0]):
+            hit = make_hit(doc, 1.0 - float(d) / frame["vector_dim"])
+            hit["_shard"] = frame["shard_id"]
+            hits.append(hit)
+    hits.sort(key=lambda x: x["score"], reverse=True)
+    top = hits[:k]
+    return (time.perf_counter() - start) * 1e6, sum(len(b) for b in bodies), [h["id"] for h in top]
+def two_phase(shards, codes, k):
+    """Shards return (row, distance) only; documents are fetched for the global top-k."""
+    bodies = []
+    for s, index in enumerate(shards):
+        rows, dists = index.search_packed(codes, k)
+        bodies.append(encode_results(rows, dists, s, index.vector_dim))
+    start = time.perf_counter()
+    frames = [decode_results(body) for body in bodies]
+    ids, dists = merge_topk([(global_ids(f["shard_id"], f["rows"][0]), f["distances"][0]) for f in frames], k)
+    shard_of, row_of = split_ids(ids)
+    wanted = {}
+    for shard, row in zip(shard_of.tolist(), row_of.tolist()):
+        wanted.setdefault(shard, []).append(row)
+    coordinator_us = (time.perf_counter() - start) * 1e6
+    fetch_bytes = 0
+    docs = {}
+    for shard, rows in wanted.items():
+        request = encode({"rows": rows, "generation": 1}, DOCS_ENCODING)
+        response = encode({"shard_id": shard, "generation": 1, "docs": [shards[shard].metadata[r] for r in decode(request, DOCS_ENCODING)["rows"]]}, DOCS_ENCODING)
+        fetch_bytes += len(request) + len(response)
+        start = time.perf_counter()
+        docs.update(((shard, r), d) for r, d in zip(rows, decode(response, DOCS_ENCODING)["docs"]))
+        coordinator_us += (time.perf_counter() - start) * 1e6
+    start = time.perf_counter()
+    top = [make_hit(docs[(s, r)], 1.0 - d / shards[s].vector_dim) for s, r, d in zip(shard_of.tolist(), row_of.tolist(), dists.tolist())]
+    coordinator_us += (time.perf_counter() - start) * 1e6
+    return coordinator_us, sum(len(b) for b in bodies) + fetch_bytes, [h["id"] for h in top]
+def main():
+    parser = argparse.ArgumentParser(description="Coordinator merge cost and network bytes: one-phase vs two-phase search")
+    parser.add_argument("--shards", type=int, nargs="+", default=[2, 4, 8, 16])
+    parser.add_argument("--ks", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--docs-per-shard", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+    all_shards = make_shards(max(args.shards), args.docs_per_shard, args.dim)
+    codes = pack_codes(np.random.default_rng(1).standard_normal((1, args.dim)))
+    print("\n" + "=" * 84)
+    print("TWO-PHASE DISTRIBUTED SEARCH BENCHMARK (coordinator side, search kernels excluded)")
+    print("=" * 84)
+    print(f"{'Shards':>6}{'k':>6}{'1-phase us':>12}{'2-phase us':>12}{'CPU':>7}{'1-phase B':>12}{'2-phase B':>12}{'bytes':>8}  same top-k")
+    print("-" * 84)
+    for num_shards in args.shards:
+        shards = all_shards[:num_shards]
+        for k in args.ks:
+            one = [one_phase(shards, codes, k) for _ in range(args.repeats)]
+            two = [two_phase(shards, codes, k) for _ in range(args.repeats)]
+            one_us, two_us = np.median([r[0] for r in one]), np.median([r[0] for r in two])
+            one_b, two_b = one[0][1], two[0][1]
+            print(f"{num_shards:>6}{k:>6}{one_us:>12.0f}{two_us:>12.0f}{one_us / two_us:>6.1f}x{one_b:>12,}{two_b:>12,}{one_b / two_b:>7.1f}x  {one[0][2] == two[0][2]}")
+    print("=" * 84 + "\n")
+if __name__ == "__main__":
+    main()
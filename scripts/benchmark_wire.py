@@ -0,0 +1,91 @@
+import argparse
+import time
+import numpy as np
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.binary_engine import BinaryIndex, make_hit, pack_codes
+from minivector.encoding import JSON, MSGPACK, available_formats, decode, encode, unpack_vector, vector_field
+from minivector.wire import decode_query, decode_results, encode_query, encode_results
+def make_index(n, dim):
+    rng = np.random.default_rng(0)
+    index = BinaryIndex(vector_dim=dim)
+    index.vectors = np.packbits(rng.standard_normal((n, dim)) > 0, axis=1)
+    index.metadata = []
+    for i in range(n):
+        abstract = " ".join(f"token{j}" for j in rng.integers(0, 5000, 150))
+        index.metadata.append({"id": f"2511.{i:05d}v1", "title": f"A study of topic {i}", "authors": ["A. Author", "B. Author"], "abstract": abstract})
+    index.build_id_index()
+    return index
+def encoded_path(media_type):
+    """Today's path: float list (or float32 bytes) in, hit dicts out."""
+    def coordinator_encode(vec, k):
+        return encode({"query_vector": vector_field(vec, media_type), "k": k, "timeout_ms": 100.0}, media_type)
+    def worker_decode(body):
+        req = decode(body, media_type)
+        return pack_codes(unpack_vector(req["query_vector"])), req["k"]
+    def worker_encode(index, rows, distances):
+        return encode({"shard_id": 0, "results": index.format_results(rows[0], distances[0]), "queue_ms": 0.1, "took_ms": 1.0}, media_type)
+    def coordinator_decode(body):
+        return decode(body, media_type)["results"]
+    return coordinator_encode, worker_decode, worker_encode, coordinator_decode
+def wire_path(with_docs):
+    def coordinator_encode(vec, k):
+        return encode_query(pack_codes(vec), k, len(vec), 100.0, with_docs=with_docs)
+    def worker_decode(body):
+        query = decode_query(body)
+        return query["codes"], query["k"]
+    def worker_encode(index, rows, distances):
+        docs = [[index.metadata[int(r)] for r in rows[0]]] if with_docs else None
+        return encode_results(rows, distances, 0, index.vector_dim, 1.0, 0.1, docs)
+    def coordinator_decode(body):
+        frame = decode_results(body)
+        if frame["docs"] is None:
+            return frame["rows"][0], frame["distances"][0]
+        return [make_hit(doc, 1.0 - float(d) / frame["vector_dim"]) for doc, d in zip(frame["docs"][0], frame["distances"][0])]
+    return coordinator_encode, worker_decode, worker_encode, coordinator_decode
+def median_us(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return float(np.median(samples)), out
+def run(path, index, vec, k, repeats):
+    coordinator_encode, worker_decode, worker_encode, coordinator_decode = path
+    enc_us, request = median_us(lambda: coordinator_encode(vec, k), repeats)
+    dec_us, (codes, k) = median_us(lambda: worker_decode(request), repeats)
+    rows, distances = index.search_packed(codes, k)
+    wenc_us, response = median_us(lambda: worker_encode(index, rows, distances), repeats)
+    cdec_us, _ = median_us(lambda: coordinator_decode(response), repeats)
+    return enc_us, dec_us, wenc_us, cdec_us, len(request), len(response)
+def main():
+    parser = argparse.ArgumentParser(description="Coordinator <-> worker protocol cost: JSON / msgpack vs the packed wire format")
+    parser.add_argument("--docs", type=int, default=20000, help="Vectors in the simulated shard")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--ks", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+    index = make_index(args.docs, args.dim)
+    vec = np.random.default_rng(1).standard_normal(args.dim).astype(np.float32)
+    paths = [("json", encoded_path(JSON))]
+    if MSGPACK in available_formats():
+        paths.append(("msgpack", encoded_path(MSGPACK)))
+    paths += [("wire + docs", wire_path(True)), ("wire ids only", wire_path(False))]
+    print("\n" + "=" * 92)
+    print("WORKER PROTOCOL BENCHMARK (per shard request, search kernel excluded)")
+    print("=" * 92)
+    print(f"Shard: {args.docs:,} x {args.dim}-bit codes. 'wire ids only' is what a two-phase fetch would send.")
+    for k in args.ks:
+        print(f"\nk={k}")
+        print(f"{'Protocol':<16}{'coord enc':>11}{'worker dec':>12}{'worker enc':>12}{'coord dec':>11}{'total us':>10}{'req B':>9}{'resp B':>10}")
+        print("-" * 91)
+        base = None
+        for label, path in paths:
+            enc_us, dec_us, wenc_us, cdec_us, req_b, resp_b = run(path, index, vec, k, args.repeats)
+            total = enc_us + dec_us + wenc_us + cdec_us
+            base = base or total
+            print(f"{label:<16}{enc_us:>11.1f}{dec_us:>12.1f}{wenc_us:>12.1f}{cdec_us:>11.1f}{total:>10.1f}{req_b:>9,}{resp_b:>10,}   ({base / total:.1f}x)")
+    print("=" * 92 + "\n")
+if __name__ == "__main__":
+    main()
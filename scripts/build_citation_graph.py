@@ -1,6 +1,9 @@
 import json
+import sys
 from collections import defaultdict
 from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.graph import CitationGraph
 def build_graph():
     """
     Build citation/similarity graph
@@ -42,6 +45,8 @@ def build_graph():
     output_path.parent.mkdir(parents=True, exist_ok=True)
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(graph, f, indent=2)
+    csr_path = output_path.with_suffix("")
+    CitationGraph.from_adjacency(graph, ids=[p['id'] for p in papers]).save(csr_path)
     total_edges = sum(len(neighbors) for neighbors in graph.values())
     avg_degree = total_edges / len(graph) if graph else 0
     print(f"\n✓ Graph built successfully")
@@ -49,6 +54,7 @@ def build_graph():
     print(f"  Edges: {total_edges}")
     print(f"  Avg degree: {avg_degree:.1f}")
     print(f"  Saved to: {output_path}")
+    print(f"  CSR adjacency: {csr_path}")
     print("="*60 + "\n")
 if __name__ == "__main__":
     build_graph()
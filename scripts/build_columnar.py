@@ -0,0 +1,19 @@
+import argparse
+import time
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.columnar import ColumnarMetadata
+def build_columnar(metadata_path="data/processed/metadata.json", output_dir="data/processed/metadata_columnar"):
+    start = time.time()
+    store = ColumnarMetadata.from_json(metadata_path)
+    store.save(output_dir)
+    stats = store.get_stats()
+    print(f"✓ {stats['num_rows']} docs, {stats['num_columns']} columns "
+          f"({stats['bytes'] / 1024 / 1024:.1f} MB) in {time.time() - start:.1f}s -> {output_dir}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert metadata.json into the memory-mapped columnar store shared by server processes.")
+    parser.add_argument("--metadata", default="data/processed/metadata.json")
+    parser.add_argument("--output", default="data/processed/metadata_columnar")
+    args = parser.parse_args()
+    build_columnar(args.metadata, args.output)
@@ -0,0 +1,23 @@
+import argparse
+import json
+import time
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.lexical import LexicalIndex
+def build_lexical(metadata_path="data/processed/metadata.json", output_dir="data/processed/lexical"):
+    print("Loading metadata...")
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        docs = json.load(f)
+    start = time.time()
+    index = LexicalIndex.build(docs)
+    index.save(output_dir)
+    stats = index.get_stats()
+    print(f"✓ {stats['num_terms']} terms, {stats['num_postings']} postings for {stats['num_docs']} docs "
+          f"({stats['bytes'] / 1024 / 1024:.1f} MB) in {time.time() - start:.1f}s -> {output_dir}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the BM25 inverted index used for lexical and hybrid search.")
+    parser.add_argument("--metadata", default="data/processed/metadata.json")
+    parser.add_argument("--output", default="data/processed/lexical")
+    args = parser.parse_args()
+    build_lexical(args.metadata, args.output)
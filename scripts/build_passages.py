@@ -0,0 +1,29 @@
+import argparse
+import json
+import time
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.embedder import Embedder
+from minivector.cache import CachedEmbedder, EmbeddingCache
+from minivector.passages import PassageIndex
+def build_passages(metadata_path="data/processed/metadata.json", output_dir="data/processed/passages",
+                   max_chars=400, cache_dir="data/cache/embeddings"):
+    print("Loading metadata...")
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        docs = json.load(f)
+    base = Embedder()
+    embedder = CachedEmbedder(base, EmbeddingCache(dim=base.dim, model_name=base.model_name, path=cache_dir, lowercase=False))
+    start = time.time()
+    index = PassageIndex.build(docs, embedder, max_chars=max_chars)
+    index.save(output_dir)
+    stats = index.get_stats()
+    print(f"✓ {stats['num_passages']} passages for {stats['num_docs']} docs "
+          f"({stats['bytes'] / 1024 / 1024:.1f} MB) in {time.time() - start:.1f}s -> {output_dir}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the passage side index used for chat context selection.")
+    parser.add_argument("--metadata", default="data/processed/metadata.json")
+    parser.add_argument("--output", default="data/processed/passages")
+    parser.add_argument("--max-chars", type=int, default=400, help="Maximum passage length")
+    args = parser.parse_args()
+    build_passages(args.metadata, args.output, args.max_chars)
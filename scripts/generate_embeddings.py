@@ -4,15 +4,18 @@ from pathlib import Path
 import sys
 sys.path.append(str(Path(__file__).parent.parent))
 from minivector.embedder import Embedder
+from minivector.cache import CachedEmbedder, EmbeddingCache
 from tqdm import tqdm
 def generate_embeddings(
     input_path="data/raw/texts.json",
     output_vectors="data/processed/vectors.npy",
-    output_metadata="data/processed/metadata.json"):    
+    output_metadata="data/processed/metadata.json",
+    cache_dir="data/cache/embeddings"):    
     Path(output_vectors).parent.mkdir(parents=True, exist_ok=True)
     with open(input_path, 'r', encoding='utf-8') as f:
         documents = json.load(f)
-    embedder = Embedder()
+    base = Embedder()
+    embedder = CachedEmbedder(base, EmbeddingCache(dim=base.dim, model_name=base.model_name, path=cache_dir, lowercase=False))
     texts = [doc['text'] for doc in documents]
     doc_ids = [doc['id'] for doc in documents]
     embeddings = embedder.embed(texts, batch_size=256)
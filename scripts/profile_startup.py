@@ -0,0 +1,57 @@
+import argparse
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+BASE_DIR = Path(__file__).parent.parent.absolute()
+TARGETS = ["distributed.worker", "distributed.coordinator", "api.server"]
+def profile_import(module):
+    cmd = [sys.executable, "-X", "importtime", "-c", f"import {module}"]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=str(BASE_DIR), capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    self_by_root = defaultdict(float)
+    direct = []
+    total_ms = 0.0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        self_by_root[name.split(".")[0]] += int(self_us) / 1000
+        if name == module:
+            total_ms = int(cum_us) / 1000
+        elif depth == 1:
+            direct.append((int(cum_us) / 1000, name))
+    return {"wall_ms": wall_ms, "import_ms": total_ms, "by_package": self_by_root, "direct": direct}
+def main():
+    parser = argparse.ArgumentParser(description="Break down import time of the serving entrypoints")
+    parser.add_argument("targets", nargs="*", default=TARGETS, help="Modules to profile")
+    parser.add_argument("--top", type=int, default=10, help="Rows per breakdown")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if any import exceeds this")
+    args = parser.parse_args()
+    over_budget = []
+    for module in args.targets:
+        report = profile_import(module)
+        print("\n" + "=" * 60)
+        print(f"STARTUP PROFILE: {module}")
+        print("=" * 60)
+        print(f"Import time:        {report['import_ms']:.1f} ms")
+        print(f"Interpreter + import: {report['wall_ms']:.1f} ms")
+        print("\nBy top-level package (self time):")
+        for pkg, ms in sorted(report["by_package"].items(), key=lambda x: -x[1])[:args.top]:
+            print(f"  {pkg:<32}{ms:>9.1f} ms")
+        print(f"\nDirect imports of {module} (cumulative):")
+        for ms, name in sorted(report["direct"], reverse=True)[:args.top]:
+            print(f"  {name:<32}{ms:>9.1f} ms")
+        if args.budget_ms is not None and report["import_ms"] > args.budget_ms:
+            over_budget.append(module)
+    if over_budget:
+        print(f"\n❌ Over {args.budget_ms:.0f} ms budget: {', '.join(over_budget)}")
+        sys.exit(1)
+if __name__ == "__main__":
+    main()
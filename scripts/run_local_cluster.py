@@ -1,3 +1,4 @@
+import argparse
 import subprocess
 import sys
 import time
@@ -37,23 +38,40 @@ def cleanup(signum, frame):
 signal.signal(signal.SIGINT, cleanup)
 signal.signal(signal.SIGTERM, cleanup)
 def main():
-    print(f"Launching Local Cluster (Coordinator + 3 Workers)")
+    parser = argparse.ArgumentParser(description="Run a coordinator and 3 shard workers locally")
+    parser.add_argument("--uds", action="store_true", help="Connect coordinator and workers over Unix sockets instead of TCP")
+    parser.add_argument("--replicas", type=int, default=1, help="Workers serving each shard")
+    args = parser.parse_args()
+    print(f"Launching Local Cluster (Coordinator + 3 Shards x {args.replicas} Workers{', Unix sockets' if args.uds else ''})")
     print(f"Base Dir: {BASE_DIR}")
     print("---------------------------------------------------")
     workers = []
+    shard_urls = []
     for i in range(3):
-        port = 8001 + i
-        env = {
-            "SHARD_ID": str(i),
-            "DATA_DIR": str(DATA_DIR),
-            "PORT": str(port)
-        }
-        cmd = [PYTHON_EXE, "-m", "uvicorn", "distributed.worker:app", "--host", "127.0.0.1", "--port", str(port)]
-        workers.append(start_process(cmd, env, f"Worker {i} (Port {port})"))
+        replica_urls = []
+        for r in range(args.replicas):
+            port = 8001 + r * 3 + i
+            env = {
+                "SHARD_ID": str(i),
+                "DATA_DIR": str(DATA_DIR),
+                "PORT": str(port)
+            }
+            if args.uds:
+                sock = f"/tmp/minivector_worker_{i}.sock" if r == 0 else f"/tmp/minivector_worker_{i}_{r}.sock"
+                cmd = [PYTHON_EXE, "-m", "uvicorn", "distributed.worker:app", "--uds", sock]
+                replica_urls.append(f"unix:{sock}")
+                workers.append(start_process(cmd, env, f"Worker {i}.{r} (Socket {sock})"))
+            else:
+                cmd = [PYTHON_EXE, "-m", "uvicorn", "distributed.worker:app", "--host", "127.0.0.1", "--port", str(port)]
+                replica_urls.append(f"http://127.0.0.1:{port}")
+                workers.append(start_process(cmd, env, f"Worker {i}.{r} (Port {port})"))
+        shard_urls.append("|".join(replica_urls))
     time.sleep(2)
     coord_env = {
-        "WORKER_URLS": "http://127.0.0.1:8001,http://127.0.0.1:8002,http://127.0.0.1:8003"
+        "WORKER_URLS": ",".join(shard_urls)
     }
+    if (DATA_DIR / "manifest.json").exists():
+        coord_env["SHARD_MANIFEST"] = str(DATA_DIR / "manifest.json")
     cmd = [PYTHON_EXE, "-m", "uvicorn", "distributed.coordinator:app", "--host", "127.0.0.1", "--port", "8000"]
     start_process(cmd, coord_env, "Coordinator (Port 8000)")
     print("\nCluster is RUNNING!")
@@ -4,7 +4,11 @@ import argparse
 from pathlib import Path
 import sys
 sys.path.append(str(Path(__file__).parent.parent))
-def split_data(num_shards: int, input_dir: str, output_dir: str):
+from minivector.columnar import atomic_write
+from minivector.routing import kmeans_binary
+def write_manifest(output_path, manifest):
+    atomic_write(output_path / "manifest.json", lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+def split_data(num_shards: int, input_dir: str, output_dir: str, mode: str = "range", iters: int = 10, sample: int = 100_000):
     input_path = Path(input_dir)
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
@@ -14,7 +18,22 @@ def split_data(num_shards: int, input_dir: str, output_dir: str):
         metadata = json.load(f)
     total_items = len(vectors)
     print(f"Total items: {total_items}")
+    if mode == "kmeans":
+        print(f"Clustering into {num_shards} shards (k-means, {iters} iterations)...")
+        centroids, assignments = kmeans_binary(vectors, num_shards, iters=iters, sample=sample)
+        counts = []
+        for i in range(num_shards):
+            rows = np.flatnonzero(assignments == i)
+            np.save(output_path / f"shard_{i}.npy", vectors[rows])
+            with open(output_path / f"shard_{i}_meta.json", 'w', encoding='utf-8') as f:
+                json.dump([metadata[r] for r in rows], f)
+            counts.append(len(rows))
+            print(f"Created Shard {i}: {len(rows)} items (cluster {i})")
+        write_manifest(output_path, {"mode": "kmeans", "num_shards": num_shards, "vector_dim": int(vectors.shape[1] * 8),
+                                     "counts": counts, "centroids": np.round(centroids, 4).tolist()})
+        return
     shard_size = (total_items + num_shards - 1) // num_shards
+    counts = []
     for i in range(num_shards):
         start_idx = i * shard_size
         end_idx = min((i + 1) * shard_size, total_items)
@@ -25,11 +44,17 @@ def split_data(num_shards: int, input_dir: str, output_dir: str):
         np.save(output_path / f"shard_{i}.npy", shard_vectors)
         with open(output_path / f"shard_{i}_meta.json", 'w', encoding='utf-8') as f:
             json.dump(shard_metadata, f)
+        counts.append(len(shard_vectors))
         print(f"Created Shard {i}: {len(shard_vectors)} items ({start_idx} to {end_idx})")
+    write_manifest(output_path, {"mode": "range", "num_shards": len(counts), "vector_dim": int(vectors.shape[1] * 8), "counts": counts})
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Split VectorBase data into shards.")
     parser.add_argument("--shards", type=int, default=3, help="Number of shards to create")
     parser.add_argument("--input", type=str, default="data/processed", help="Input directory")
     parser.add_argument("--output", type=str, default="data/sharded", help="Output directory")
+    parser.add_argument("--mode", choices=["range", "kmeans"], default="range",
+                        help="range: contiguous row ranges; kmeans: one cluster per shard, centroids in manifest.json for routing")
+    parser.add_argument("--iters", type=int, default=10, help="k-means iterations")
+    parser.add_argument("--sample", type=int, default=100_000, help="Rows used to train k-means")
     args = parser.parse_args()
-    split_data(args.shards, args.input, args.output)
+    split_data(args.shards, args.input, args.output, args.mode, args.iters, args.sample)
@@ -0,0 +1,58 @@
+import asyncio
+import time
+import pytest
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.admission import CACHE_ONLY, NORMAL, REDUCED, AdmissionController, Deadline, DeadlineExceeded, Overloaded
+def test_deadline_checks():
+    assert Deadline(None).remaining_s() is None
+    Deadline(0).check("anything")
+    deadline = Deadline(1)
+    time.sleep(0.005)
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceeded, match="before search"):
+        deadline.check("search")
+def test_full_queue_is_rejected_immediately():
+    async def main():
+        admission = AdmissionController("t", max_concurrency=1, max_queue=1)
+        release = asyncio.Event()
+        async def hold():
+            async with admission.admit():
+                await release.wait()
+        holder = asyncio.ensure_future(hold())
+        queued = asyncio.ensure_future(hold())
+        await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        with pytest.raises(Overloaded):
+            async with admission.admit():
+                pass
+        assert time.perf_counter() - start < 0.01
+        release.set()
+        await asyncio.gather(holder, queued)
+        stats = admission.get_stats()
+        assert stats["admitted"] == 2 and stats["rejected"] == 1 and stats["active"] == 0
+    asyncio.run(main())
+def test_queued_request_is_shed_at_deadline():
+    async def main():
+        admission = AdmissionController("t", max_concurrency=1, max_queue=4)
+        release = asyncio.Event()
+        async def hold():
+            async with admission.admit():
+                await release.wait()
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(DeadlineExceeded):
+            async with admission.admit(Deadline(20)):
+                pass
+        assert admission.shed == 1 and admission.waiting == 0
+        release.set()
+        await holder
+    asyncio.run(main())
+def test_mode_degrades_with_load():
+    admission = AdmissionController("t", max_concurrency=2, max_queue=8, reduce_at=0.5, cache_only_at=0.9)
+    assert admission.mode() == NORMAL
+    admission.active, admission.waiting = 2, 3
+    assert admission.mode() == REDUCED
+    admission.waiting = 7
+    assert admission.mode() == CACHE_ONLY
@@ -0,0 +1,36 @@
+import asyncio
+import numpy as np
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.batching import EmbeddingBatcher
+class CountingEmbedder:
+    dim = 4
+    def __init__(self):
+        self.calls = []
+    def embed(self, texts, **kwargs):
+        self.calls.append(list(texts))
+        return np.array([[len(t), 0, 0, i] for i, t in enumerate(texts)], dtype=np.float32)
+def test_concurrent_queries_share_one_batch():
+    embedder = CountingEmbedder()
+    async def run():
+        batcher = EmbeddingBatcher(embedder, max_batch_size=8, max_wait_ms=20)
+        vecs = await asyncio.gather(*(batcher.embed_query("q" * n) for n in range(1, 6)))
+        await batcher.close()
+        return vecs
+    vecs = asyncio.run(run())
+    assert len(embedder.calls) == 1
+    assert [v[0] for v in vecs] == [1, 2, 3, 4, 5]
+def test_batch_size_limit():
+    embedder = CountingEmbedder()
+    async def run():
+        batcher = EmbeddingBatcher(embedder, max_batch_size=2, max_wait_ms=20)
+        out = await batcher.embed(["a", "bb", "ccc"])
+        stats = batcher.get_stats()
+        await batcher.close()
+        return out, stats
+    out, stats = asyncio.run(run())
+    assert out.shape == (3, 4)
+    assert max(len(c) for c in embedder.calls) <= 2
+    assert stats["items"] == 3
+    assert stats["batches"] == len(embedder.calls)
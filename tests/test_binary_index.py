@@ -0,0 +1,48 @@
+import numpy as np
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.binary_engine import BinaryIndex
+def build_index(tmp_path, n=50, dim=64, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    metadata = [{"id": f"doc{i}", "title": f"Title {i}", "abstract": f"Abstract {i}"} for i in range(n)]
+    index = BinaryIndex(vector_dim=dim, use_cpp=False)
+    index.build_and_save(vectors, metadata, tmp_path / "vectors.npy", tmp_path / "metadata.json")
+    index.load(str(tmp_path / "vectors.npy"), str(tmp_path / "metadata.json"))
+    return index, vectors
+def test_id_index_lookup(tmp_path):
+    index, _ = build_index(tmp_path)
+    assert index.get_document("doc7")["title"] == "Title 7"
+    assert index.get_document("missing") is None
+    docs = index.get_documents(["doc3", "missing", "doc0"])
+    assert [d and d["id"] for d in docs] == ["doc3", None, "doc0"]
+def test_id_index_rebuilt_on_reload(tmp_path):
+    index, _ = build_index(tmp_path, n=10)
+    (tmp_path / "v2").mkdir()
+    other, _ = build_index(tmp_path / "v2", n=5, seed=1)
+    index.load(str(tmp_path / "v2" / "vectors.npy"), str(tmp_path / "v2" / "metadata.json"))
+    assert index.get_document("doc9") is None
+    assert index.get_document("doc4")["id"] == "doc4"
+def test_batch_search_matches_single(tmp_path):
+    index, vectors = build_index(tmp_path, n=200)
+    queries = vectors[:7] + 0.01
+    batch = index.search_batch(queries, k=5)
+    assert len(batch) == 7
+    for q, results in zip(queries, batch):
+        single = index.search(q, k=5)
+        assert [r["score"] for r in results] == [r["score"] for r in single]
+    assert batch[0][0]["id"] == "doc0"
+def test_search_raw_shapes_and_order(tmp_path):
+    index, vectors = build_index(tmp_path, n=30)
+    indices, distances = index.search_raw(vectors[:3], k=4)
+    assert indices.shape == distances.shape == (3, 4)
+    assert list(indices[:, 0]) == [0, 1, 2]
+    assert (np.diff(distances.astype(np.int64), axis=1) >= 0).all()
+    indices, _ = index.search_raw(vectors[:1], k=100)
+    assert indices.shape == (1, 30)
+def test_non_positive_k_returns_nothing(tmp_path):
+    index, vectors = build_index(tmp_path, n=10)
+    assert index.search(vectors[0], k=-1) == []
+    assert index.search_batch(vectors[:2], k=0) == [[], []]
+    assert index.search_raw(vectors[:2], k=-3)[0].shape == (2, 0)
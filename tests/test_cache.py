@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+import sys
+import threading
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.cache import AnswerCache, CachedEmbedder, EmbeddingCache, QueryCache
+class CountingEmbedder:
+    dim = 8
+    def __init__(self):
+        self.seen = []
+    def embed(self, texts, **kwargs):
+        self.seen.extend(texts)
+        return np.random.rand(len(texts), self.dim).astype(np.float32)
+def test_normalized_text_hits():
+    cache = EmbeddingCache(dim=8, max_entries=2)
+    vec = np.arange(8, dtype=np.float32)
+    cache.put("Quantum  Computing", vec)
+    assert np.array_equal(cache.get(" quantum computing "), vec)
+    assert cache.get("quantum") is None
+def test_lru_eviction():
+    cache = EmbeddingCache(dim=8, max_entries=2)
+    for t in ["a", "b"]:
+        cache.put(t, np.zeros(8, dtype=np.float32))
+    cache.get("a")
+    cache.put("c", np.zeros(8, dtype=np.float32))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+def test_disk_tier_survives_restart(tmp_path):
+    embedder = CountingEmbedder()
+    first = CachedEmbedder(embedder, EmbeddingCache(dim=8, path=tmp_path, model_name="m"))
+    vecs = first.embed(["doc one", "doc two", "doc one"])
+    assert embedder.seen == ["doc one", "doc two"]
+    assert np.array_equal(vecs[0], vecs[2])
+    second = CachedEmbedder(embedder, EmbeddingCache(dim=8, path=tmp_path, model_name="m"))
+    again = second.embed(["doc two", "doc one", "doc three"])
+    assert embedder.seen == ["doc one", "doc two", "doc three"]
+    assert np.allclose(again[0], vecs[1])
+    assert second.cache.disk_hits == 2
+def test_processes_can_share_disk_tier(tmp_path):
+    # Two caches on one directory stand in for two forked server processes
+    first = EmbeddingCache(dim=4, path=tmp_path, refresh_interval_s=0)
+    second = EmbeddingCache(dim=4, path=tmp_path)
+    first.put("alpha", np.ones(4, dtype=np.float32))
+    second.put("beta", np.full(4, 2.0, dtype=np.float32))
+    second.put("alpha", np.ones(4, dtype=np.float32))
+    third = EmbeddingCache(dim=4, path=tmp_path, max_entries=0)
+    assert np.array_equal(third.get("beta"), np.full(4, 2.0))
+    assert np.array_equal(third.get("alpha"), np.ones(4))
+    # Lookups never read the files; another process's rows arrive with refresh()
+    assert first.get("beta") is None
+    first.refresh()
+    assert np.array_equal(first.get("beta"), np.full(4, 2.0))
+    assert len(third) == 2
+def test_lookups_do_not_wait_for_a_disk_append(tmp_path):
+    fcntl = pytest.importorskip("fcntl")
+    cache = EmbeddingCache(dim=4, path=tmp_path)
+    with open(tmp_path / "lock", "a+b") as other_process:
+        fcntl.flock(other_process, fcntl.LOCK_EX)
+        writer = threading.Thread(target=cache.put, args=("alpha", np.ones(4, dtype=np.float32)))
+        writer.start()
+        time.sleep(0.05)
+        assert writer.is_alive()
+        found = []
+        reader = threading.Thread(target=lambda: found.append(cache.get("alpha")))
+        reader.start()
+        reader.join(1.0)
+        fcntl.flock(other_process, fcntl.LOCK_UN)
+    assert len(found) == 1 and np.array_equal(found[0], np.ones(4))
+    writer.join()
+    assert cache.get_stats()["disk_entries"] == 1
+def test_query_cache_vectorized_hit_and_lru():
+    cache = QueryCache(max_size=2, similarity_threshold=0.99)
+    a, b, c = np.eye(3, dtype=np.float32)
+    cache.store(a, "A")
+    cache.store(b, "B")
+    assert cache.lookup(a * 5) == "A"
+    cache.store(c, "C")
+    assert cache.lookup(b) is None
+    assert cache.lookup(a) == "A"
+    assert cache.lookup(c) == "C"
+    assert cache.get_stats()["evictions"] == 1
+def test_query_cache_byte_limit_and_invalidate():
+    cache = QueryCache(max_size=10, max_bytes=200)
+    cache.store(np.ones(4), "x" * 150)
+    cache.store(-np.ones(4), "y" * 150)
+    assert len(cache) == 1
+    assert cache.lookup(-np.ones(4)) == "y" * 150
+    cache.invalidate()
+    assert cache.lookup(-np.ones(4)) is None
+    assert cache.get_stats()["generation"] == 1
+def test_query_cache_ttl():
+    cache = QueryCache(ttl_s=0.0)
+    cache.store(np.ones(4), "stale")
+    assert cache.lookup(np.ones(4)) is None
+    assert cache.get_stats()["expirations"] == 1
+def test_query_cache_respects_k():
+    cache = QueryCache()
+    cache.store(np.ones(4), list(range(10)), k=10)
+    assert cache.lookup(np.ones(4), k=3) == [0, 1, 2]
+    assert cache.lookup(np.ones(4), k=20) is None
+    assert cache.lookup(np.ones(4)) == list(range(10))
+def test_query_cache_size_zero_disables_it():
+    cache = QueryCache(max_size=0)
+    cache.store(np.ones(4), ["hit"])
+    assert cache.lookup(np.ones(4)) is None and len(cache) == 0
+    cache.invalidate()
+def test_answer_cache_is_paper_scoped():
+    cache = AnswerCache(similarity_threshold=0.9)
+    q = np.ones(4, dtype=np.float32)
+    cache.store("p1", "What is the main idea?", "llama", {"t": 0.7}, "answer one", question_vec=q)
+    assert cache.lookup("p1", "what is the  main idea?", "llama", {"t": 0.7}) == "answer one"
+    assert cache.lookup("p1", "Main idea please", "llama", {"t": 0.7}, question_vec=q * 2) == "answer one"
+    assert cache.lookup("p2", "What is the main idea?", "llama", {"t": 0.7}, question_vec=q) is None
+    assert cache.lookup("p1", "What is the main idea?", "llama", {"t": 0.1}) is None
@@ -0,0 +1,74 @@
+import json
+import numpy as np
+import pytest
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.binary_engine import BinaryIndex
+from minivector.columnar import ColumnarMetadata
+DOCS = [
+    {"id": "a", "title": "Alpha", "authors": ["X", "Y"], "year": 2024},
+    {"id": "b", "title": "Bêta ünïcode", "abstract": "Some text."},
+    {"id": "c", "title": "", "authors": []},
+]
+def test_round_trip_through_disk(tmp_path):
+    ColumnarMetadata.build(DOCS).save(tmp_path / "meta")
+    meta = ColumnarMetadata.load(tmp_path / "meta")
+    assert len(meta) == 3
+    assert list(meta) == DOCS
+    assert meta[-1] == DOCS[2]
+    assert meta.value(1, "year") is None and meta.value(0, "year") == 2024
+    assert meta.column("title") == ["Alpha", "Bêta ünïcode", ""]
+    assert isinstance(meta.columns["title"].blob, np.memmap)
+    with pytest.raises(IndexError):
+        meta[3]
+def test_row_lookup_by_id():
+    docs = [{"id": str(i), "title": f"t{i}"} for i in range(1000)]
+    meta = ColumnarMetadata.build(docs)
+    assert all(meta.row_of(str(i)) == i for i in range(0, 1000, 37))
+    assert meta.row_of("missing") is None
+    assert meta.get("missing", -1) == -1
+def test_rows_are_fresh_dicts():
+    meta = ColumnarMetadata.build(DOCS)
+    row = meta[0]
+    row["score"] = 1.0
+    assert "score" not in meta[0]
+def test_binary_index_loads_columnar_metadata(tmp_path):
+    vecs = np.random.default_rng(0).standard_normal((3, 64)).astype(np.float32)
+    BinaryIndex(vector_dim=64).build_and_save(vecs, DOCS, tmp_path / "vectors.npy", tmp_path / "metadata.json")
+    ColumnarMetadata.from_json(tmp_path / "metadata.json").save(tmp_path / "meta")
+    index = BinaryIndex(vector_dim=64)
+    index.load(str(tmp_path / "vectors.npy"), str(tmp_path / "meta"), mmap=True)
+    assert index.num_vectors == 3
+    assert index.get_document("b")["title"] == "Bêta ünïcode"
+    assert index.get_documents(["c", "zzz"]) == [DOCS[2], None]
+    results = index.search(vecs[0], k=3)
+    assert results[0]["id"] == "a" and results[0]["authors"] == ["X", "Y"]
+    assert index.get_stats()["metadata_bytes"] > 0
+def test_save_replaces_files_under_live_mapping(tmp_path):
+    ColumnarMetadata.build(DOCS).save(tmp_path / "meta")
+    old = ColumnarMetadata.load(tmp_path / "meta")
+    ColumnarMetadata.build([{"id": "z", "title": "Zed"}]).save(tmp_path / "meta")
+    assert old[1]["title"] == "Bêta ünïcode"
+    new = ColumnarMetadata.load(tmp_path / "meta")
+    assert list(new) == [{"id": "z", "title": "Zed"}]
+    assert json.loads((tmp_path / "meta" / "columns.json").read_text())["num_rows"] == 1
+def test_each_save_is_a_new_generation(tmp_path):
+    for n in range(1, 4):
+        ColumnarMetadata.build([{"id": str(i), "title": f"v{n}"} for i in range(n)]).save(tmp_path / "meta")
+    names = sorted(p.name for p in (tmp_path / "meta").iterdir())
+    # The replaced generation stays for readers that read its manifest; older ones go
+    assert not any(name.startswith("g1-") for name in names)
+    assert "g2-0.bin" in names and "g3-0.bin" in names
+    meta = ColumnarMetadata.load(tmp_path / "meta")
+    assert meta.column("title") == ["v3"] * 3
+def test_store_remembers_its_source(tmp_path):
+    source = tmp_path / "metadata.json"
+    source.write_text(json.dumps(DOCS))
+    ColumnarMetadata.from_json(source).save(tmp_path / "meta")
+    assert ColumnarMetadata.is_current(tmp_path / "meta", source)
+    # Rewritten in place with the same number of rows, as scripts/fix_metadata.py does
+    source.write_text(json.dumps([{**doc, "title": "fixed"} for doc in DOCS]))
+    assert not ColumnarMetadata.is_current(tmp_path / "meta", source)
+    ColumnarMetadata.build(DOCS).save(tmp_path / "other")
+    assert not ColumnarMetadata.is_current(tmp_path / "other", source)
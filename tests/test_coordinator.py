@@ -0,0 +1,203 @@
+import asyncio
+import httpx
+import json
+import numpy as np
+import pytest
+import socket
+import sys
+import time
+from aiohttp import web
+from contextlib import asynccontextmanager
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from distributed import coordinator
+from minivector import replicas
+from minivector.encoding import decode, encode
+from minivector.replicas import ReplicaSet
+from minivector.wire import MEDIA_TYPE as WIRE, decode_query, encode_results
+def fake_cluster(monkeypatch, docs):
+    """Two single-replica shards "a" and "b"; ``docs(url, attempt)`` answers /docs."""
+    monkeypatch.setitem(coordinator.state, "replicas", ReplicaSet([["a"], ["b"]]))
+    monkeypatch.setitem(coordinator.state, "router", None)
+    monkeypatch.setattr(coordinator, "WORKER_GROUPS", [["a"], ["b"]])
+    calls = {"a": 0, "b": 0}
+    async def post_worker(url, path, make_body, deadline, encoding=None):
+        if path == "/search/batch":
+            return {"shard_id": "ab".index(url), "rows": [np.array([0, 1])], "distances": [np.array([1, 2])], "generation": 1, "vector_dim": 8}
+        calls[url] += 1
+        return await docs(url, calls[url])
+    monkeypatch.setattr(coordinator, "post_worker", post_worker)
+def search(k=4):
+    return asyncio.run(coordinator.two_phase_search(np.ones((1, 8), np.float32), np.ones((1, 1), np.uint8), k, coordinator.request_deadline(5000)))
+def test_health_reports_failed_embedder():
+    async def main():
+        async def load():
+            raise RuntimeError("model files missing")
+        task = asyncio.ensure_future(load())
+        await asyncio.gather(task, return_exceptions=True)
+        saved = coordinator.state["embedder_task"]
+        coordinator.state["embedder_task"] = task
+        try:
+            return await coordinator.health()
+        finally:
+            coordinator.state["embedder_task"] = saved
+    response = asyncio.run(main())
+    body = json.loads(response.body)
+    assert response.status_code == 503
+    assert body["status"] == "embedder_failed" and "model files missing" in body["error"]
+def test_short_fetch_is_reported_as_partial(monkeypatch):
+    async def docs(url, attempt):
+        # Shard b answers for only one of the two rows it was asked for
+        return {"docs": [{"id": f"{url}0"}, {"id": f"{url}1"}] if url == "a" else [{"id": "b0"}]}
+    fake_cluster(monkeypatch, docs)
+    [(hits, total, failed)] = search()
+    assert [hit["id"] for hit in hits] == ["a0", "b0", "a1"]
+    assert total == 4 and failed == [1]
+def test_stale_shard_cancels_other_fetches(monkeypatch):
+    events = []
+    async def docs(url, attempt):
+        events.append(f"{url}{attempt}")
+        if attempt == 1:
+            if url == "a":
+                await asyncio.sleep(0.01)
+                raise coordinator.StaleShard(url)
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                events.append("cancelled b")
+                raise
+        return {"docs": [{"id": f"{url}0"}, {"id": f"{url}1"}]}
+    fake_cluster(monkeypatch, docs)
+    [(hits, _, failed)] = search()
+    # The slow fetch is cancelled before the retry, not left running until shutdown
+    assert events.index("cancelled b") < events.index("a2")
+    assert len(hits) == 4 and failed == []
+def test_worker_serving_another_shard_is_rejected(monkeypatch):
+    class Client:
+        async def get(self, url, path, timeout_s):
+            return 200, "application/json", json.dumps({"shard_id": {"a": 1, "b": 0}[url], "vectors": 10}).encode()
+    monkeypatch.setitem(coordinator.state, "client", Client())
+    monkeypatch.setattr(coordinator, "WORKER_GROUPS", [["a"], ["b"]])
+    with pytest.raises(RuntimeError, match="a serves shard 1 but is listed as shard 0"):
+        asyncio.run(coordinator.check_shard_map())
+    async def docs(url, attempt):
+        return {"docs": [{"id": f"{url}0"}, {"id": f"{url}1"}]}
+    fake_cluster(monkeypatch, docs)
+    search_frame = coordinator.post_worker
+    async def post_worker(url, path, make_body, deadline, encoding=None):
+        frame = await search_frame(url, path, make_body, deadline, encoding)
+        return {**frame, "shard_id": 0} if path == "/search/batch" else frame
+    monkeypatch.setattr(coordinator, "post_worker", post_worker)
+    [(hits, _, failed)] = search()
+    assert [hit["id"] for hit in hits] == ["a0", "a1"] and failed == [1]
+class FakeWorker:
+    """HTTP stand-in for distributed/worker.py serving ``shard``."""
+    def __init__(self, shard, hang=False, reloads=0):
+        self.shard = shard
+        self.hang = hang
+        self.reloads = reloads
+        self.generation = 1
+        self.searches = 0
+        self.release = asyncio.Event()
+    async def health(self, request):
+        return web.json_response({"status": "ok", "shard_id": self.shard, "vectors": 100})
+    async def search(self, request):
+        query = decode_query(await request.read())
+        self.searches += 1
+        if self.hang:
+            await self.release.wait()
+        n, k = len(query["codes"]), query["k"]
+        body = encode_results([np.arange(k)] * n, [np.arange(k) + self.shard] * n, self.shard, query["dim"], generation=self.generation)
+        # A reload between the search and the document fetch
+        if self.reloads:
+            self.reloads -= 1
+            self.generation += 1
+        return web.Response(body=body, content_type=WIRE)
+    async def docs(self, request):
+        req = decode(await request.read(), request.content_type)
+        if req["generation"] != self.generation:
+            return web.Response(status=409)
+        docs = [{"id": f"{self.shard}-{row}-g{self.generation}"} for row in req["rows"]]
+        body = encode({"shard_id": self.shard, "generation": self.generation, "docs": docs}, request.content_type)
+        return web.Response(body=body, content_type=request.content_type)
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/health", self.health)
+        app.router.add_post("/search/batch", self.search)
+        app.router.add_post("/docs", self.docs)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{self.runner.addresses[0][1]}"
+    async def stop(self):
+        self.release.set()
+        await self.runner.cleanup()
+def dead_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+class FakeEmbedder:
+    def embed(self, texts):
+        return np.ones((len(texts), 384), np.float32)
+@asynccontextmanager
+async def http_cluster(monkeypatch, groups):
+    """The coordinator app, lifespan included, over ``groups`` of FakeWorkers (None is a dead replica)."""
+    workers = [worker for group in groups for worker in group if worker is not None]
+    for worker in workers:
+        await worker.start()
+    urls = [[dead_url() if worker is None else worker.url for worker in group] for group in groups]
+    monkeypatch.setattr(coordinator, "WORKER_GROUPS", urls)
+    monkeypatch.setattr(coordinator, "SHARD_MANIFEST", None)
+    monkeypatch.setattr(coordinator, "HEALTH_INTERVAL_S", 0)
+    monkeypatch.setattr(coordinator, "Embedder", FakeEmbedder)
+    # First attempts go to replicas in listed order
+    monkeypatch.setattr(replicas.random, "choice", lambda pool: pool[0])
+    for key in ("embedder", "embedder_task", "client", "router", "health_task"):
+        monkeypatch.setitem(coordinator.state, key, None)
+    monkeypatch.setitem(coordinator.state, "replicas", ReplicaSet(urls, hedge_initial_s=0.05))
+    try:
+        async with coordinator.lifespan(coordinator.app):
+            transport = httpx.ASGITransport(app=coordinator.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://coordinator") as client:
+                yield client
+    finally:
+        for worker in workers:
+            await worker.stop()
+def http_search(monkeypatch, groups, timeout_ms=2000):
+    async def main():
+        async with http_cluster(monkeypatch, groups) as client:
+            start = time.perf_counter()
+            response = await client.post("/search", json={"text": "query", "k": 4, "timeout_ms": timeout_ms})
+            return response, time.perf_counter() - start, coordinator.state["replicas"].get_stats()
+    return asyncio.run(main())
+def test_dead_replica_fails_over_over_http(monkeypatch):
+    response, _, stats = http_search(monkeypatch, [[None, FakeWorker(0)], [FakeWorker(1)]])
+    assert response.status_code == 200
+    body = response.json()
+    assert not body["partial"] and body["failed_shards"] == []
+    assert [hit["id"] for hit in body["top_k"]][:3] == ["0-0-g1", "0-1-g1", "1-0-g1"]
+    assert stats["failovers"] == 1
+def test_hung_shard_is_partial_within_the_budget(monkeypatch):
+    response, elapsed, stats = http_search(monkeypatch, [[FakeWorker(0)], [FakeWorker(1, hang=True)]], timeout_ms=1000)
+    assert response.status_code == 200 and elapsed < 1.0
+    body = response.json()
+    assert body["partial"] and body["failed_shards"] == [1]
+    assert [hit["id"] for hit in body["top_k"]] == ["0-0-g1", "0-1-g1", "0-2-g1", "0-3-g1"]
+    assert stats["timeouts"] == 1
+def test_hung_replica_is_hedged(monkeypatch):
+    hung = FakeWorker(0, hang=True)
+    response, elapsed, stats = http_search(monkeypatch, [[hung, FakeWorker(0)], [FakeWorker(1)]])
+    assert response.status_code == 200 and elapsed < 0.5
+    assert not response.json()["partial"]
+    assert hung.searches == 1 and stats["hedges"] == 1 and stats["hedge_wins"] == 1
+def test_stale_generation_is_searched_again(monkeypatch):
+    reloaded = FakeWorker(1, reloads=1)
+    response, _, _ = http_search(monkeypatch, [[FakeWorker(0)], [reloaded]])
+    assert response.status_code == 200
+    body = response.json()
+    assert not body["partial"] and reloaded.searches == 2
+    assert "1-0-g2" in [hit["id"] for hit in body["top_k"]]
+    # Reloaded again before every fetch: give up rather than loop
+    response, _, _ = http_search(monkeypatch, [[FakeWorker(0)], [FakeWorker(1, reloads=5)]])
+    assert response.status_code == 503
@@ -0,0 +1,57 @@
+import json
+import numpy as np
+import pytest
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector import encoding
+from minivector.encoding import ARROW, JSON, MSGPACK, decode, encode, negotiate, render, unpack_vector, vector_field
+def make_payload(k=5):
+    hits = [{"id": f"p{i}", "title": f"Paper {i}", "score": np.float32(1.0 - i / 100), "text_preview": "x" * 50} for i in range(k)]
+    hits[0]["authors"] = ["a", "b"]
+    return {"results": hits, "took_ms": 1.5, "cache_hit": False}
+def test_negotiate_defaults_to_json():
+    assert negotiate(None) == JSON
+    assert negotiate("*/*") == JSON
+    assert negotiate("text/html") == JSON
+@pytest.mark.skipif(MSGPACK not in encoding.available_formats(), reason="msgpack not installed")
+def test_negotiate_respects_q_values():
+    assert negotiate("application/json;q=0.5, application/x-msgpack") == MSGPACK
+    assert negotiate("application/msgpack;q=0.2, application/json") == JSON
+def test_json_matches_stdlib():
+    payload = make_payload()
+    decoded = json.loads(encode(payload, JSON))
+    assert [h["id"] for h in decoded["results"]] == [f"p{i}" for i in range(5)]
+    assert decoded["results"][1]["score"] == pytest.approx(0.99, rel=1e-6)
+    assert decode(encode(payload, JSON), "application/json; charset=utf-8")["took_ms"] == 1.5
+@pytest.mark.skipif(MSGPACK not in encoding.available_formats(), reason="msgpack not installed")
+def test_msgpack_roundtrip_with_binary_vector():
+    vec = np.random.rand(384).astype(np.float32)
+    body = encode({"query_vector": vector_field(vec, MSGPACK), "k": 10}, MSGPACK)
+    assert len(body) < 384 * 4 + 32
+    decoded = decode(body, MSGPACK)
+    assert np.array_equal(unpack_vector(decoded["query_vector"]), vec)
+    assert decode(encode(make_payload(), MSGPACK), MSGPACK)["results"][0]["authors"] == ["a", "b"]
+@pytest.mark.skipif(ARROW not in encoding.available_formats(), reason="pyarrow not installed")
+def test_arrow_roundtrip_keeps_fields_and_missing_columns():
+    body, media_type = render(make_payload(), "application/vnd.apache.arrow.stream")
+    assert media_type == ARROW
+    decoded = decode(body, ARROW)
+    assert decoded["took_ms"] == 1.5 and decoded["cache_hit"] is False
+    assert [h["id"] for h in decoded["results"]] == [f"p{i}" for i in range(5)]
+    assert decoded["results"][1]["authors"] is None
+@pytest.mark.skipif(ARROW not in encoding.available_formats(), reason="pyarrow not installed")
+def test_arrow_keeps_mixed_type_columns():
+    payload = make_payload(3)
+    payload["results"][0]["year"] = 2021
+    payload["results"][1]["year"] = "2021a"
+    payload["results"][2]["authors"] = "c"
+    decoded = decode(encode(payload, ARROW), ARROW)
+    assert [h.get("year") for h in decoded["results"]] == [2021, "2021a", None]
+    assert [h["authors"] for h in decoded["results"]] == [["a", "b"], None, "c"]
+    assert decoded["results"][0]["score"] == pytest.approx(1.0)
+def test_render_without_table_never_picks_arrow():
+    _, media_type = render({"status": "ok"}, "application/vnd.apache.arrow.stream", table_key=None)
+    assert media_type == JSON
+def test_unpack_vector_accepts_lists():
+    assert unpack_vector([1, 2, 3]).dtype == np.float32
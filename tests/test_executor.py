@@ -0,0 +1,84 @@
+import asyncio
+import os
+import signal
+import socket
+import time
+import sys
+from pathlib import Path
+import pytest
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.executor import ComputeExecutor, ExecutorSaturated, resolve_kind
+def test_run_returns_result_and_queue_time():
+    executor = ComputeExecutor("test", max_workers=1, max_queue=4)
+    async def run():
+        return await asyncio.gather(*(executor.run_timed(pow, 2, n) for n in range(3)))
+    results = asyncio.run(run())
+    executor.shutdown()
+    assert [r for r, _ in results] == [1, 2, 4]
+    assert all(q >= 0 for _, q in results)
+    assert executor.get_stats()["completed"] == 3
+def test_bounded_queue_rejects():
+    executor = ComputeExecutor("test", max_workers=1, max_queue=1)
+    async def run():
+        jobs = [asyncio.ensure_future(executor.run(time.sleep, 0.05)) for _ in range(3)]
+        return await asyncio.gather(*jobs, return_exceptions=True)
+    outcomes = asyncio.run(run())
+    executor.shutdown()
+    assert sum(isinstance(o, ExecutorSaturated) for o in outcomes) == 1
+    assert executor.get_stats()["rejected"] == 1
+def test_event_loop_stays_responsive():
+    executor = ComputeExecutor("test", max_workers=1)
+    async def run():
+        job = asyncio.ensure_future(executor.run(time.sleep, 0.2))
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        ticked = time.perf_counter() - start
+        await job
+        return ticked
+    assert asyncio.run(run()) < 0.1
+    executor.shutdown()
+_CHILD = {}
+def _init_child_state(value):
+    _CHILD["value"] = value
+def _listening_sockets():
+    count = 0
+    for fd in map(int, os.listdir("/proc/self/fd")):
+        try:
+            with socket.socket(fileno=os.dup(fd)) as sock:
+                count += bool(sock.getsockopt(socket.SOL_SOCKET, socket.SO_ACCEPTCONN))
+        except OSError:
+            continue
+    return count
+def _child_view():
+    return _CHILD.get("value"), signal.getsignal(signal.SIGTERM) == signal.SIG_DFL, _listening_sockets()
+def test_auto_is_thread_pool():
+    assert resolve_kind("auto") == "thread"
+    with pytest.raises(ValueError):
+        resolve_kind("fork")
+def test_process_pool_children_start_clean():
+    # The serving process has a listening socket and its own SIGTERM handler;
+    # pool children must inherit neither and get their state from the initializer.
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    server.set_inheritable(True)
+    assert _listening_sockets() >= 1
+    previous = signal.signal(signal.SIGTERM, lambda *args: None)
+    executor = ComputeExecutor("test", max_workers=1, kind="process", initializer=_init_child_state, initargs=(1,))
+    try:
+        assert asyncio.run(executor.run(_child_view)) == (1, True, 0)
+        executor.recycle(initargs=(2,))
+        assert asyncio.run(executor.run(_child_view)) == (2, True, 0)
+    finally:
+        executor.shutdown(wait=True)
+        signal.signal(signal.SIGTERM, previous)
+        server.close()
+def test_process_pool_starts_children_up_front():
+    executor = ComputeExecutor("test", max_workers=2, kind="process")
+    try:
+        deadline = time.time() + 30
+        while len(executor.pool._processes) < 2 and time.time() < deadline:
+            time.sleep(0.05)
+        assert len(executor.pool._processes) == 2 and executor.submitted == 0
+    finally:
+        executor.shutdown(wait=True)
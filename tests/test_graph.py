@@ -0,0 +1,28 @@
+import numpy as np
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.graph import CitationGraph
+ADJ = {"a": ["b", "c"], "b": ["d"], "c": ["a"], "d": ["e"], "e": []}
+def ids_of(graph, rows):
+    return [graph.ids[r] for r in rows.tolist()]
+def test_csr_roundtrip(tmp_path):
+    graph = CitationGraph.from_adjacency(ADJ)
+    graph.save(tmp_path / "g")
+    loaded = CitationGraph.load(tmp_path / "g")
+    assert loaded.num_nodes == 5 and loaded.num_edges == 5
+    assert ids_of(loaded, loaded.neighbors_of(loaded.row_of("a"))) == ["b", "c"]
+    assert isinstance(loaded.neighbors, np.memmap)
+def test_neighborhood_depth_matches_legacy_bfs():
+    graph = CitationGraph.from_adjacency(ADJ)
+    nodes, src, dst = graph.neighborhood(graph.row_of("a"), depth=1)
+    assert ids_of(graph, nodes) == ["a", "b", "c", "d"]
+    edges = set(zip(ids_of(graph, src), ids_of(graph, dst)))
+    assert edges == {("a", "b"), ("a", "c"), ("b", "d"), ("c", "a")}
+    nodes, _, _ = graph.neighborhood(graph.row_of("a"), depth=2)
+    assert ids_of(graph, nodes) == ["a", "b", "c", "d", "e"]
+def test_neighborhood_node_budget():
+    graph = CitationGraph.from_adjacency(ADJ)
+    nodes, src, dst = graph.neighborhood(graph.row_of("a"), depth=3, max_nodes=2)
+    assert ids_of(graph, nodes) == ["a", "b"]
+    assert set(zip(ids_of(graph, src), ids_of(graph, dst))) == {("a", "b")}
@@ -0,0 +1,58 @@
+import numpy as np
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.binary_engine import BinaryIndex
+from minivector.lexical import LexicalIndex, corpus_fingerprint, reciprocal_rank_fusion, tokenize
+DOCS = [
+    {"id": "2511.16674v1", "title": "Binary quantization for vector search", "authors": ["Ada Lovelace"], "abstract": "Hamming distance scans."},
+    {"id": "2401.00001v2", "title": "Graph neural networks", "authors": ["Alan Turing"], "abstract": "Message passing on graphs."},
+    {"id": "2402.00002v1", "title": "Quantization of language models", "authors": ["Grace Hopper"], "abstract": "Low-bit weights for GPT-4."},
+    {"id": "2403.00003v1", "title": "Vector databases", "authors": ["Ada Lovelace"], "abstract": "Search over dense vectors with quantization and graphs."},
+]
+def test_tokenize_keeps_compounds_and_parts():
+    tokens = tokenize("The GPT-4 model and arXiv 2511.16674v1")
+    assert "the" not in tokens and "and" not in tokens
+    assert {"gpt-4", "gpt", "4", "2511.16674v1", "2511", "16674v1"} <= set(tokens)
+def test_bm25_ranks_title_matches_first():
+    index = LexicalIndex.build(DOCS)
+    rows, scores = index.search("binary quantization", k=3)
+    assert rows[0] == 0
+    assert set(rows.tolist()) == {0, 2, 3}
+    assert np.all(np.diff(scores) <= 0)
+    assert index.search("nonexistent term", k=5)[0].size == 0
+def test_exact_id_match():
+    rows, _ = LexicalIndex.build(DOCS).search("2402.00002v1", k=1)
+    assert rows.tolist() == [2]
+def test_round_trip_memory_mapped(tmp_path):
+    built = LexicalIndex.build(DOCS)
+    built.save(tmp_path / "lexical")
+    loaded = LexicalIndex.load(tmp_path / "lexical")
+    assert isinstance(loaded.doc_ids, np.memmap)
+    assert loaded.num_docs == 4 and loaded.num_terms == built.num_terms
+    for query in ("ada lovelace", "quantization graphs", "gpt-4"):
+        a, b = built.search(query, k=4), loaded.search(query, k=4)
+        assert a[0].tolist() == b[0].tolist()
+        assert np.allclose(a[1], b[1])
+def test_fingerprint_tracks_corpus_not_just_size(tmp_path):
+    LexicalIndex.build(DOCS).save(tmp_path / "lexical")
+    loaded = LexicalIndex.load(tmp_path / "lexical")
+    assert loaded.fingerprint == corpus_fingerprint(doc["id"] for doc in DOCS)
+    swapped = [DOCS[1], DOCS[0]] + DOCS[2:]
+    assert loaded.fingerprint != corpus_fingerprint(doc["id"] for doc in swapped)
+def test_reciprocal_rank_fusion():
+    rows, scores = reciprocal_rank_fusion([np.array([1, 2, 3]), np.array([3, 4])], k=3, rrf_k=60)
+    assert rows.tolist() == [3, 1, 2]
+    assert np.isclose(scores[0], 1 / 63 + 1 / 61)
+    assert reciprocal_rank_fusion([np.array([], dtype=np.int64)], k=3)[0].size == 0
+def test_rescore_matches_full_scan():
+    vecs = np.random.default_rng(0).standard_normal((200, 64)).astype(np.float32)
+    index = BinaryIndex(vector_dim=64)
+    index.vectors = np.packbits(vecs > 0, axis=1)
+    index.metadata = [{"id": str(i)} for i in range(200)]
+    index.build_id_index()
+    rows, distances = index.search_raw(vecs[3], 200)
+    candidates = rows[0][::7]
+    assert index.rescore(vecs[3], candidates).tolist() == distances[0][::7].tolist()
+    results = index.format_results(np.array([5]), None, np.array([1.5], dtype=np.float32))
+    assert results[0]["id"] == "5" and results[0]["score"] == 1.5
@@ -0,0 +1,69 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+sys.path.append(str(Path(__file__).parent.parent))
+from api.llm import LLMError, OllamaClient
+def make_app(sent, tokens=20, delay=0.01):
+    async def generate(request):
+        body = await request.json()
+        resp = web.StreamResponse()
+        await resp.prepare(request)
+        try:
+            for i in range(tokens):
+                await asyncio.sleep(delay)
+                await resp.write((json.dumps({"response": f"t{i} ", "done": False}) + "\n").encode())
+                sent.append(i)
+            await resp.write((json.dumps({"response": "", "done": True, "model": body["model"]}) + "\n").encode())
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        return resp
+    app = web.Application()
+    app.router.add_post("/api/generate", generate)
+    return app
+def test_streams_tokens_and_records_ttft():
+    sent = []
+    async def run():
+        server = TestServer(make_app(sent, tokens=5))
+        await server.start_server()
+        client = await OllamaClient(str(server.make_url("")), model="stub").start()
+        tokens = [t async for t in client.generate_stream("hi", {"num_predict": 5})]
+        stats = client.get_stats()
+        await client.close()
+        await server.close()
+        return tokens, stats
+    tokens, stats = asyncio.run(run())
+    assert "".join(tokens) == "t0 t1 t2 t3 t4 "
+    assert stats["completed"] == 1 and stats["active"] == 0
+    assert stats["ttft_p50_ms"] > 0
+def test_cancellation_stops_upstream_generation():
+    sent = []
+    async def run():
+        server = TestServer(make_app(sent, tokens=100, delay=0.01))
+        await server.start_server()
+        client = await OllamaClient(str(server.make_url("")), model="stub").start()
+        stream = client.generate_stream("hi")
+        assert (await stream.__anext__()) == "t0 "
+        await stream.aclose()
+        await asyncio.sleep(0.2)
+        stats = client.get_stats()
+        await client.close()
+        await server.close()
+        return stats
+    stats = asyncio.run(run())
+    assert stats["cancelled"] == 1
+    assert len(sent) < 50
+def test_unreachable_server_raises():
+    async def run():
+        client = await OllamaClient("http://127.0.0.1:9", connect_timeout=1).start()
+        try:
+            with pytest.raises(LLMError):
+                async for _ in client.generate_stream("hi"):
+                    pass
+        finally:
+            await client.close()
+        return client.get_stats()
+    assert asyncio.run(run())["errors"] == 1
@@ -0,0 +1,27 @@
+import numpy as np
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.merge import global_ids, merge_topk, split_ids
+def test_global_id_round_trip():
+    ids = global_ids(7, np.array([0, 5, 2**32 - 1]))
+    assert ids.dtype == np.uint64
+    shards, rows = split_ids(ids)
+    assert shards.tolist() == [7, 7, 7] and rows.tolist() == [0, 5, 2**32 - 1]
+def test_merge_matches_global_sort():
+    rng = np.random.default_rng(0)
+    shard_results, everything = [], []
+    for shard in range(5):
+        dists = rng.integers(0, 40, 200)
+        rows = np.arange(200)
+        order = np.lexsort((rows, dists))[:20]
+        shard_results.append((global_ids(shard, rows[order]), dists[order]))
+        everything += [(int(d), shard, int(r)) for d, r in zip(dists, rows)]
+    ids, dists = merge_topk(shard_results, 20)
+    expected = sorted(everything)[:20]
+    shards, rows = split_ids(ids)
+    assert list(zip(dists.tolist(), shards.tolist(), rows.tolist())) == expected
+def test_merge_short_and_empty_lists():
+    ids, dists = merge_topk([(global_ids(1, [3]), np.array([9])), (global_ids(0, []), np.array([], dtype=np.uint32))], 10)
+    assert split_ids(ids)[1].tolist() == [3] and dists.tolist() == [9]
+    assert merge_topk([], 10)[0].size == 0
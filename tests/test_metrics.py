@@ -0,0 +1,63 @@
+import pytest
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.metrics import Counter, Gauge, Histogram, Registry
+def parse(body):
+    samples = {}
+    for line in body.decode().splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+def test_counter_gauge_and_callbacks():
+    registry = Registry()
+    requests = Counter("requests_total", "Requests", ["endpoint"], registry=registry)
+    requests.inc(endpoint="/search")
+    requests.inc(2, endpoint="/search")
+    size = Gauge("index_vectors", "Vectors", registry=registry)
+    size.set_function(lambda: 42)
+    samples = parse(registry.render())
+    assert samples['requests_total{endpoint="/search"}'] == 3
+    assert samples["index_vectors"] == 42
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = Histogram("latency_seconds", "Latency", ["stage"], buckets=(0.01, 0.1), registry=registry)
+    for value in (0.005, 0.05, 0.5):
+        latency.observe(value, stage="search")
+    samples = parse(registry.render())
+    assert samples['latency_seconds_bucket{stage="search",le="0.01"}'] == 1
+    assert samples['latency_seconds_bucket{stage="search",le="0.1"}'] == 2
+    assert samples['latency_seconds_bucket{stage="search",le="+Inf"}'] == 3
+    assert samples['latency_seconds_count{stage="search"}'] == 3
+    assert abs(samples['latency_seconds_sum{stage="search"}'] - 0.555) < 1e-9
+def test_register_stats_exports_numeric_fields_and_merges_families():
+    registry = Registry()
+    registry.register_stats("executor", lambda: {"name": "embed", "completed": 3, "pending": 1}, counters=["completed"], labels={"executor": "embed"})
+    registry.register_stats("executor", lambda: {"name": "search", "completed": 5, "pending": 0}, counters=["completed"], labels={"executor": "search"})
+    registry.register_stats("cache", lambda: {"hits": 1, "hit_rate": "25.0%", "answers": {"hits": 2}})
+    registry.register_stats("missing", lambda: None.get_stats())
+    body = registry.render().decode()
+    assert body.count("# TYPE minivector_executor_completed_total counter") == 1
+    samples = parse(registry.render())
+    assert samples['minivector_executor_completed_total{executor="search"}'] == 5
+    assert samples["minivector_cache_hit_ratio"] == 0.25
+    assert samples["minivector_cache_answers_hits"] == 2
+    assert "minivector_executor_name" not in body
+def test_failing_providers_are_logged_and_counted(caplog):
+    registry = Registry()
+    registry.register_stats("not_started", lambda: None)
+    registry.register_stats("broken", lambda: {}["missing"], labels={"shard": "0"})
+    gauge = Gauge("queue_depth", "Depth", registry=registry)
+    gauge.set_function(lambda: 1 / 0)
+    with caplog.at_level("WARNING", logger="minivector.metrics"):
+        registry.render()
+        samples = parse(registry.render())
+    assert samples['minivector_metrics_collector_errors_total{collector="broken{shard=\\"0\\"}"}'] == 2
+    assert samples['minivector_metrics_collector_errors_total{collector="queue_depth"}'] == 2
+    assert not any("not_started" in key for key in samples)
+    assert len(caplog.records) == 2
+def test_metric_base_is_abstract():
+    from minivector.metrics import _Metric
+    with pytest.raises(TypeError):
+        _Metric("m", "doc", registry=None)
@@ -0,0 +1,29 @@
+import numpy as np
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.passages import PassageIndex, split_passages
+class KeywordEmbedder:
+    dim = 3
+    def embed(self, texts, **kwargs):
+        keys = ["quantum", "graph", "binary"]
+        return np.array([[t.lower().count(k) + 0.01 for k in keys] for t in texts], dtype=np.float32)
+DOCS = [
+    {"id": "p1", "abstract": "We study quantum circuits. Graph methods are used for routing. Binary codes compress states."},
+    {"id": "p2", "abstract": ""},
+]
+def test_split_passages_respects_sentences():
+    passages = split_passages("One. Two two. Three three three.", max_chars=10)
+    assert passages == ["One.", "Two two.", "Three three three."]
+    assert split_passages("A. B.", max_chars=100) == ["A. B."]
+def test_select_picks_relevant_passage_within_budget(tmp_path):
+    index = PassageIndex.build(DOCS, KeywordEmbedder(), max_chars=40)
+    index.save(tmp_path / "passages")
+    loaded = PassageIndex.load(tmp_path / "passages")
+    assert loaded.passages("p1")[0] == "We study quantum circuits."
+    context = loaded.select("p1", np.array([0, 1, 0], dtype=np.float32), token_budget=10)
+    assert context == "Graph methods are used for routing."
+    both = loaded.select("p1", np.array([1, 0, 1], dtype=np.float32), token_budget=20)
+    assert both == "We study quantum circuits. Binary codes compress states."
+    assert loaded.select("p2", np.ones(3)) is None
+    assert loaded.select("missing", np.ones(3)) is None
@@ -0,0 +1,136 @@
+import asyncio
+import gc
+import json
+import os
+import time
+import numpy as np
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.binary_engine import BinaryIndex
+from minivector.cache import QueryCache
+from minivector.executor import ComputeExecutor
+from minivector.reload import IndexReloader, content_generation, fingerprint
+def write_index(directory, n, seed, dim=64):
+    vecs = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    meta = [{"id": f"{seed}-{i}", "title": f"doc {i}"} for i in range(n)]
+    BinaryIndex(vector_dim=dim).build_and_save(vecs, meta, directory / "vectors.npy", directory / "metadata.json")
+    return vecs
+def make_reloader(directory, holder):
+    def load():
+        index = BinaryIndex(vector_dim=64)
+        index.load(str(directory / "vectors.npy"), str(directory / "metadata.json"), mmap=True)
+        if index.vectors.shape[0] != len(index.metadata):
+            raise ValueError("row count mismatch")
+        return index
+    def swap(index):
+        old, holder["index"] = holder["index"], index
+        return old
+    return IndexReloader("t", load=load, swap=swap, paths=[directory / "vectors.npy", directory / "metadata.json"],
+                         warmup=lambda i: i.warmup(), size_of=lambda i: i.get_stats()["bytes"])
+def test_reload_swaps_and_reports(tmp_path):
+    write_index(tmp_path, 50, seed=1)
+    holder = {"index": None}
+    reloader = make_reloader(tmp_path, holder)
+    async def main():
+        first = await reloader.reload()
+        assert first["status"] == "swapped" and first["generation"] == 1
+        assert holder["index"].num_vectors == 50
+        assert (await reloader.reload())["status"] == "unchanged"
+        time.sleep(0.01)
+        write_index(tmp_path, 80, seed=2)
+        second = await reloader.reload()
+        assert second["status"] == "swapped" and second["generation"] == 2
+        assert holder["index"].num_vectors == 80 and holder["index"].metadata[0]["id"] == "2-0"
+        assert second["old_bytes"] == 50 * 8 and second["new_bytes"] == 80 * 8
+        assert second["overlap_bytes"] == 130 * 8
+        assert second["swap_ms"] < second["total_ms"]
+        return second
+    report = asyncio.run(main())
+    gc.collect()
+    assert reloader.released == 1 and "old_released_after_ms" in report
+def test_in_flight_reference_keeps_old_index_alive(tmp_path):
+    write_index(tmp_path, 20, seed=1)
+    holder = {"index": None}
+    reloader = make_reloader(tmp_path, holder)
+    async def main():
+        await reloader.reload()
+        in_flight = holder["index"]
+        write_index(tmp_path, 30, seed=2)
+        await reloader.reload(force=True)
+        gc.collect()
+        assert reloader.released == 0
+        assert len(in_flight.search(np.ones(64, dtype=np.float32), k=5)) == 5
+        del in_flight
+        gc.collect()
+        assert reloader.released == 1
+    asyncio.run(main())
+def test_failed_load_keeps_serving_index(tmp_path):
+    write_index(tmp_path, 20, seed=1)
+    holder = {"index": None}
+    reloader = make_reloader(tmp_path, holder)
+    async def main():
+        await reloader.reload()
+        serving = holder["index"]
+        with open(tmp_path / "metadata.json", "w") as f:
+            json.dump([{"id": "only-one"}], f)
+        report = await reloader.reload()
+        assert report["status"] == "failed" and "mismatch" in report["error"]
+        assert holder["index"] is serving and reloader.generation == 1
+        assert reloader.get_stats()["failures"] == 1
+    asyncio.run(main())
+def test_watcher_waits_for_files_to_settle(tmp_path):
+    write_index(tmp_path, 20, seed=1)
+    holder = {"index": None}
+    reloader = make_reloader(tmp_path, holder)
+    async def main():
+        await reloader.reload()
+        reloader.start_watching(0.02)
+        write_index(tmp_path, 40, seed=2)
+        os.utime(tmp_path / "vectors.npy", ns=(time.time_ns(), time.time_ns() + 1))
+        for _ in range(100):
+            if reloader.generation == 2:
+                break
+            await asyncio.sleep(0.01)
+        await reloader.stop()
+        assert reloader.generation == 2 and holder["index"].num_vectors == 40
+        assert not reloader.changed()
+    asyncio.run(main())
+def test_fingerprint_skips_missing_files(tmp_path):
+    (tmp_path / "a").write_bytes(b"x")
+    fp = fingerprint([tmp_path / "a", tmp_path / "missing"])
+    assert len(fp) == 1 and fp[0][2] == 1
+def test_content_generation_follows_bytes_not_files(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    for copy in ("a", "b"):
+        (tmp_path / copy / "vectors").write_bytes(b"\x01" * 4096)
+        (tmp_path / copy / "meta").write_text("[]")
+    paths = lambda copy: [tmp_path / copy / "vectors", tmp_path / copy / "meta"]
+    generation = content_generation(paths("a"))
+    # A replica's copy of the same shard agrees, whatever its paths and mtimes
+    assert 0 < generation < 2 ** 31 and content_generation(paths("b")) == generation
+    (tmp_path / "b" / "meta").write_text("[{}]")
+    assert content_generation(paths("b")) != generation
+def test_query_cache_drops_stale_store():
+    cache = QueryCache(max_size=4)
+    q = np.ones(8, dtype=np.float32)
+    generation = cache.generation
+    cache.invalidate()
+    cache.store(q, ["old"], generation=generation)
+    assert cache.lookup(q) is None and cache.get_stats()["stale_stores"] == 1
+    cache.store(q, ["new"], generation=cache.generation)
+    assert cache.lookup(q) == ["new"]
+def test_executor_recycle_drains_old_pool():
+    async def main():
+        executor = ComputeExecutor("t", max_workers=1, kind="thread")
+        old_pool = executor.pool
+        slow = asyncio.ensure_future(executor.run(time.sleep, 0.05))
+        await asyncio.sleep(0.01)
+        executor.recycle()
+        assert executor.pool is not old_pool
+        assert await executor.run(sum, [1, 2]) == 3
+        await slow
+        assert executor.get_stats()["recycles"] == 1
+        executor.shutdown()
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.replicas import ReplicaSet, parse_groups
+def test_parse_groups():
+    assert parse_groups("http://a:1|http://b:1, http://a:2") == [["http://a:1", "http://b:1"], ["http://a:2"]]
+    with pytest.raises(ValueError):
+        parse_groups("http://a:1,,http://a:3")
+def test_least_outstanding_and_health():
+    replicas = ReplicaSet([["a", "b", "c"]])
+    replicas.groups[0][0].outstanding = 2
+    replicas.groups[0][1].outstanding = 1
+    replicas.groups[0][2].outstanding = 1
+    replicas.groups[0][2].healthy = False
+    assert replicas.pick(0).url == "b"
+    assert replicas.pick(0, exclude=("b",)).url == "a"
+    # Hedges and failovers never go to a replica known to be down; a first
+    # attempt still does rather than drop the shard on a stale health mark
+    assert replicas.pick(0, exclude=("a", "b")) is None
+    assert replicas.pick(0, exclude=("a", "b"), fallback=True).url == "c"
+    assert replicas.pick(0, exclude=("a", "b", "c"), fallback=True) is None
+def test_failover_and_ejection():
+    replicas = ReplicaSet([["dead", "live"]], fail_threshold=2)
+    async def send(url):
+        await asyncio.sleep(0)
+        return None if url == "dead" else {"from": url}
+    async def main():
+        return [await replicas.call(0, send, prefer="dead") for _ in range(3)]
+    answers = asyncio.run(main())
+    assert answers == [("live", {"from": "live"})] * 3
+    dead = replicas.groups[0][0]
+    assert dead.failures == 3 and not dead.healthy
+    assert replicas.get_stats()["failovers"] == 3
+    async def probe(shard, url):
+        return True
+    asyncio.run(replicas.probe(probe))
+    assert dead.healthy and dead.consecutive_failures == 0
+def test_unavailable_shard_returns_none():
+    replicas = ReplicaSet([["a", "b"]])
+    async def send(url):
+        return None
+    assert asyncio.run(replicas.call(0, send)) is None
+    assert replicas.get_stats()["unavailable"] == 1
+def test_slow_replica_is_hedged():
+    replicas = ReplicaSet([["slow", "fast"]], min_samples=5, hedge_min_s=0.01)
+    cancelled = []
+    async def send(url):
+        try:
+            await asyncio.sleep(1.0 if url == "slow" else 0.001)
+        except asyncio.CancelledError:
+            cancelled.append(url)
+            raise
+        return url
+    async def main():
+        for _ in range(5):
+            await replicas.call(0, send, prefer="fast")
+        assert replicas.hedge_delay_s(0, "search") == pytest.approx(0.01, abs=0.01)
+        start = asyncio.get_running_loop().time()
+        answer = await replicas.call(0, send, prefer="slow")
+        return answer, asyncio.get_running_loop().time() - start
+    (url, _), elapsed = asyncio.run(main())
+    assert url == "fast" and elapsed < 0.5
+    assert cancelled == ["slow"] and replicas.groups[0][0].outstanding == 0
+    stats = replicas.get_stats(detail=True)
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    assert stats["groups"][0]["replicas"]["slow"]["outstanding"] == 0
+def test_budget_turns_a_hung_replica_into_a_failure():
+    replicas = ReplicaSet([["hung"]], hedge_initial_s=0.01)
+    async def send(url):
+        await asyncio.sleep(10)
+    async def main():
+        start = asyncio.get_running_loop().time()
+        answer = await replicas.call(0, send, timeout_s=0.05)
+        return answer, asyncio.get_running_loop().time() - start
+    answer, elapsed = asyncio.run(main())
+    assert answer is None and elapsed < 1.0
+    hung = replicas.groups[0][0]
+    assert hung.failures == 1 and hung.outstanding == 0
+    assert replicas.get_stats()["timeouts"] == 1
+def test_initial_hedge_delay_before_samples():
+    replicas = ReplicaSet([["slow", "fast"]], hedge_initial_s=0.02)
+    assert replicas.hedge_delay_s(0, "search") == 0.02
+    async def send(url):
+        await asyncio.sleep(10 if url == "slow" else 0)
+        return url
+    async def main():
+        # The budget caps the hedge delay at half of it
+        return await replicas.call(0, send, prefer="slow", timeout_s=0.02)
+    assert asyncio.run(main()) == ("fast", "fast")
+    assert replicas.get_stats()["hedge_wins"] == 1
@@ -0,0 +1,44 @@
+import json
+import numpy as np
+import pytest
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.binary_engine import pack_codes
+from minivector.routing import ShardRouter, kmeans_binary
+def clustered(n_per, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((3, 128)) * 3
+    vecs = np.concatenate([c + rng.standard_normal((n_per, 128)) for c in centres])
+    return pack_codes(vecs), np.repeat(np.arange(3), n_per), centres
+def test_kmeans_recovers_clusters():
+    codes, labels, _ = clustered(100)
+    centroids, assignments = kmeans_binary(codes, 3, sample=150)
+    assert centroids.shape == (3, 128) and assignments.shape == (300,)
+    assert ((centroids >= 0) & (centroids <= 1)).all()
+    for label in range(3):
+        assert len(set(assignments[labels == label].tolist())) == 1
+    assert len(set(assignments.tolist())) == 3
+    with pytest.raises(ValueError):
+        kmeans_binary(codes, 0)
+def test_router_probes_the_query_cluster_first():
+    codes, labels, centres = clustered(100)
+    centroids, assignments = kmeans_binary(codes, 3)
+    router = ShardRouter(centroids, adaptive_k=False)
+    probes = router.route(pack_codes(centres), nprobe=1, k=10)
+    assert [p[0][0] for p in probes] == [assignments[labels == i][0] for i in range(3)]
+    assert all(p == [(p[0][0], 10)] for p in probes)
+    assert len(router.route(codes[:2], nprobe=0, k=10)[0]) == 3
+    assert router.get_stats()["probes"] == 3 + 6
+def test_adaptive_k_decays_with_rank():
+    router = ShardRouter(np.zeros((8, 16)), min_k=10)
+    assert [router.shard_k(r, 100) for r in range(4)] == [100, 50, 34, 25]
+    assert router.shard_k(7, 100) == 13 and router.shard_k(7, 5) == 5
+    assert ShardRouter(np.zeros((8, 16)), adaptive_k=False).shard_k(7, 100) == 100
+def test_load_from_manifest(tmp_path):
+    (tmp_path / "range.json").write_text(json.dumps({"mode": "range", "num_shards": 2, "counts": [1, 1]}))
+    assert ShardRouter.load(tmp_path / "range.json") is None
+    (tmp_path / "kmeans.json").write_text(json.dumps({"mode": "kmeans", "num_shards": 2, "centroids": [[0.0] * 16, [1.0] * 16]}))
+    router = ShardRouter.load(tmp_path / "kmeans.json", min_k=3)
+    assert router.num_shards == 2 and router.min_k == 3
+    assert router.route(np.full((1, 2), 255, dtype=np.uint8), nprobe=1, k=5) == [[(1, 5)]]
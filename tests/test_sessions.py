@@ -0,0 +1,71 @@
+import time
+import numpy as np
+import pytest
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.binary_engine import BinaryIndex
+from minivector.sessions import ResultSessions, SessionExpired, cursor_replay, parse_cursor
+def test_pages_walk_the_result_list():
+    sessions = ResultSessions()
+    rows = np.arange(25)[::-1]
+    distances = np.arange(25)
+    cursor = sessions.create(rows, distances, first_page=10)
+    seen = list(rows[:10])
+    while cursor is not None:
+        page_rows, page_dists, cursor, total = sessions.page(cursor, limit=10)
+        assert total == 25
+        seen.extend(page_rows.tolist())
+    assert seen == rows.tolist()
+    assert sessions.get_stats()["pages"] == 2
+    assert sessions.get_stats()["bytes"] == 25 * 6
+def test_no_session_when_everything_fits_first_page():
+    sessions = ResultSessions()
+    assert sessions.create(np.arange(5), np.arange(5), first_page=10) is None
+    assert len(sessions) == 0
+def test_ttl_and_eviction():
+    sessions = ResultSessions(max_sessions=2, ttl_s=0.05)
+    first = sessions.create(np.arange(20), np.arange(20), first_page=1)
+    second = sessions.create(np.arange(20), np.arange(20), first_page=1)
+    sessions.page(first, 1)
+    third = sessions.create(np.arange(20), np.arange(20), first_page=1)
+    with pytest.raises(SessionExpired):
+        sessions.page(second, 1)
+    sessions.page(first, 1)
+    time.sleep(0.06)
+    with pytest.raises(SessionExpired):
+        sessions.page(third, 1)
+    stats = sessions.get_stats()
+    assert stats["evictions"] == 1 and stats["expired"] == 2 and stats["bytes"] == 0
+def test_malformed_cursor():
+    with pytest.raises(ValueError):
+        parse_cursor("no-offset")
+    with pytest.raises(ValueError):
+        ResultSessions().page("abc.-1", 10)
+def test_replayable_cursor_restores_in_another_store():
+    owner, other = ResultSessions(), ResultSessions()
+    rows, distances = np.arange(30)[::-1], np.arange(30)
+    cursor = owner.create(rows, distances, first_page=10, replay=b"\x00query.code~")
+    assert cursor_replay(cursor) == b"\x00query.code~"
+    assert cursor_replay(ResultSessions().create(rows, distances, first_page=10)) is None
+    with pytest.raises(SessionExpired):
+        other.page(cursor, 10)
+    other.restore(cursor, rows, distances)
+    page_rows, _, next_cursor, total = other.page(cursor, 10)
+    assert page_rows.tolist() == rows[10:20].tolist() and total == 30
+    assert other.page(next_cursor, 10)[0].tolist() == rows[20:].tolist()
+    assert other.get_stats()["restored"] == 1 and other.get_stats()["created"] == 0
+def test_session_pages_match_a_deep_search():
+    vecs = np.random.default_rng(0).standard_normal((300, 64)).astype(np.float32)
+    index = BinaryIndex(vector_dim=64)
+    index.vectors = np.packbits(vecs > 0, axis=1)
+    index.metadata = [{"id": str(i)} for i in range(300)]
+    index.build_id_index()
+    query = vecs[7]
+    rows, distances = index.search_raw(query, 50)
+    sessions = ResultSessions()
+    cursor = sessions.create(rows[0], distances[0], first_page=10)
+    page_rows, page_dists, _, _ = sessions.page(cursor, 10)
+    paged = index.format_results(page_rows, page_dists)
+    deep = index.search(query, k=20)[10:]
+    assert [r["score"] for r in paged] == [r["score"] for r in deep]
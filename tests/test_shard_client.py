@@ -0,0 +1,81 @@
+import asyncio
+import aiohttp
+import pytest
+import sys
+from aiohttp import web
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.shard_client import ShardClient, parse_target
+async def echo(request):
+    return web.Response(body=await request.read(), content_type="application/octet-stream")
+async def hang(request):
+    await asyncio.sleep(1)
+    return web.Response()
+async def serve(site_factory):
+    app = web.Application()
+    app.router.add_post("/search", echo)
+    app.router.add_post("/hang", hang)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = site_factory(runner)
+    await site.start()
+    return runner
+def test_parse_target():
+    assert parse_target("http://10.0.0.2:8001/") == ("http://10.0.0.2:8001", None)
+    assert parse_target("unix:/tmp/w.sock") == ("http://localhost", "/tmp/w.sock")
+def test_connections_are_reused_over_tcp_and_unix_sockets(tmp_path):
+    sock = str(tmp_path / "worker.sock")
+    async def main():
+        tcp = await serve(lambda r: web.TCPSite(r, "127.0.0.1", 0))
+        port = tcp.addresses[0][1]
+        uds = await serve(lambda r: web.UnixSite(r, sock))
+        urls = [f"http://127.0.0.1:{port}", f"unix:{sock}"]
+        client = ShardClient(urls, limit_per_host=2)
+        await client.start()
+        try:
+            for i in range(5):
+                for url in urls:
+                    status, _, body = await client.post(url, "/search", f"q{i}".encode(), {}, timeout_s=2)
+                    assert status == 200 and body == f"q{i}".encode()
+            return client.get_stats()
+        finally:
+            await client.close()
+            await tcp.cleanup()
+            await uds.cleanup()
+    stats = asyncio.run(main())
+    assert stats["requests"] == 10 and stats["in_flight"] == 0
+    assert stats["new_connections"] == 2 and stats["reused_connections"] == 8
+def test_hung_worker_times_out():
+    async def main():
+        runner = await serve(lambda r: web.TCPSite(r, "127.0.0.1", 0))
+        url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+        client = ShardClient([url], read_timeout_s=0.2)
+        await client.start()
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await client.post(url, "/hang", b"", {}, timeout_s=None)
+            with pytest.raises(asyncio.TimeoutError):
+                await client.post(url, "/hang", b"", {}, timeout_s=0.1)
+            return client.get_stats()
+        finally:
+            await client.close()
+            await runner.cleanup()
+    assert asyncio.run(main())["timeouts"] == 2
+def test_refuses_before_start():
+    with pytest.raises(RuntimeError):
+        asyncio.run(ShardClient(["http://127.0.0.1:1"]).post("http://127.0.0.1:1", "/search", b"", {}))
+def test_exhausted_budget_fails_without_sending():
+    async def main():
+        runner = await serve(lambda r: web.TCPSite(r, "127.0.0.1", 0))
+        url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+        client = ShardClient([url])
+        await client.start()
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await client.post(url, "/hang", b"", {}, timeout_s=0.0)
+            return client.get_stats()
+        finally:
+            await client.close()
+            await runner.cleanup()
+    stats = asyncio.run(main())
+    assert stats["timeouts"] == 1 and stats["requests"] == 0
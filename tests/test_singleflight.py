@@ -0,0 +1,90 @@
+import asyncio
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.singleflight import SingleFlight, StreamSingleFlight
+def test_concurrent_subscribers_share_one_stream():
+    calls = []
+    async def generate():
+        calls.append(1)
+        for token in ["a", "b", "c"]:
+            await asyncio.sleep(0.01)
+            yield token
+    async def collect(flights):
+        return [t async for t in flights.subscribe("key", generate)]
+    async def run():
+        flights = StreamSingleFlight()
+        first = asyncio.create_task(collect(flights))
+        await asyncio.sleep(0.015)
+        second = asyncio.create_task(collect(flights))
+        return await asyncio.gather(first, second), flights.get_stats()
+    (a, b), stats = asyncio.run(run())
+    assert a == b == ["a", "b", "c"]
+    assert len(calls) == 1
+    assert stats == {"in_flight": 0, "started": 1, "coalesced": 1}
+def test_producer_cancelled_when_last_subscriber_leaves():
+    cancelled = []
+    async def generate():
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield "x"
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+    async def run():
+        flights = StreamSingleFlight()
+        stream = flights.subscribe("key", generate)
+        assert await stream.__anext__() == "x"
+        await stream.aclose()
+        await asyncio.sleep(0.02)
+        return flights.in_flight("key")
+    assert asyncio.run(run()) is False
+    assert cancelled == [True]
+def test_subscriber_after_last_one_left_starts_a_new_stream():
+    async def generate():
+        for i in range(3):
+            await asyncio.sleep(0.005)
+            yield i
+    async def run():
+        flights = StreamSingleFlight()
+        stream = flights.subscribe("key", generate)
+        assert await stream.__anext__() == 0
+        await stream.aclose()
+        # Before the cancelled producer has finished unwinding
+        return [chunk async for chunk in flights.subscribe("key", generate)], flights.started
+    assert asyncio.run(run()) == ([0, 1, 2], 2)
+def test_single_flight_shares_one_result():
+    async def main():
+        flights = SingleFlight()
+        calls = []
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return ["hit"]
+        outcomes = await asyncio.gather(*[flights.do(("query", 10), work) for _ in range(5)])
+        assert len(calls) == 1
+        assert [shared for _, shared in outcomes].count(False) == 1
+        assert all(result == ["hit"] for result, _ in outcomes)
+        assert flights.get_stats() == {"in_flight": 0, "started": 1, "coalesced": 4}
+        await flights.do(("query", 10), work)
+        assert len(calls) == 2
+    asyncio.run(main())
+def test_single_flight_survives_leader_cancellation_and_shares_errors():
+    async def main():
+        flights = SingleFlight()
+        async def work():
+            await asyncio.sleep(0.02)
+            return "done"
+        leader = asyncio.ensure_future(flights.do("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.do("k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == ("done", True)
+        async def boom():
+            raise ValueError("bad")
+        results = await asyncio.gather(flights.do("e", boom), flights.do("e", boom), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        assert not flights.in_flight("e")
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from minivector.binary_engine import BinaryIndex, make_hit, pack_codes
+from minivector.wire import MAX_K, MAX_QUERIES, QUERY_HEADER, VERSION, WireError, decode_query, decode_results, encode_query, encode_results, is_wire
+def test_query_round_trip():
+    vecs = np.random.default_rng(0).standard_normal((3, 384)).astype(np.float32)
+    codes = pack_codes(vecs)
+    body = encode_query(codes, 10, 384, timeout_ms=25.0)
+    assert len(body) == QUERY_HEADER.size + 3 * 48
+    query = decode_query(body)
+    assert np.array_equal(query["codes"], codes)
+    assert query["k"] == 10 and query["dim"] == 384 and query["timeout_ms"] == 25.0
+    assert query["floats"] is None and query["with_docs"]
+    query = decode_query(encode_query(codes[0], 5, 384, floats=vecs[0], with_docs=False))
+    assert query["timeout_ms"] is None and not query["with_docs"]
+    assert np.array_equal(query["floats"], vecs[:1])
+def test_results_round_trip():
+    rows = [np.array([4, 2, 9]), np.array([], dtype=np.int64), np.array([1])]
+    dists = [np.array([3, 5, 5]), np.array([], dtype=np.uint32), np.array([100])]
+    docs = [[{"id": "d4"}, {"id": "d2"}, {"id": "d9"}], [], [{"id": "d1", "title": "Ünïcode"}]]
+    frame = decode_results(encode_results(rows, dists, 2, 384, took_ms=1.5, queue_ms=0.25, docs=docs, generation=3))
+    assert frame["shard_id"] == 2 and frame["vector_dim"] == 384 and frame["generation"] == 3
+    assert frame["took_ms"] == 1.5 and frame["queue_ms"] == 0.25
+    assert [r.tolist() for r in frame["rows"]] == [[4, 2, 9], [], [1]]
+    assert [d.tolist() for d in frame["distances"]] == [[3, 5, 5], [], [100]]
+    assert frame["docs"] == docs
+    assert decode_results(encode_results(rows, dists, 0, 384))["docs"] is None
+def test_rejects_other_versions_and_truncation():
+    body = bytearray(encode_query(np.zeros(48, dtype=np.uint8), 10, 384))
+    body[2] = VERSION + 1
+    with pytest.raises(WireError, match="version"):
+        decode_query(bytes(body))
+    with pytest.raises(WireError):
+        decode_query(encode_query(np.zeros(48, dtype=np.uint8), 10, 384)[:-1])
+    with pytest.raises(WireError):
+        decode_results(encode_query(np.zeros(48, dtype=np.uint8), 10, 384))
+    assert is_wire("application/vnd.minivector.wire; v=1") and not is_wire("application/json")
+def test_wire_hits_match_local_search():
+    vecs = np.random.default_rng(1).standard_normal((200, 384)).astype(np.float32)
+    index = BinaryIndex(vector_dim=384)
+    index.vectors = pack_codes(vecs)
+    index.metadata = [{"id": str(i), "abstract": f"text {i}"} for i in range(200)]
+    index.build_id_index()
+    query = decode_query(encode_query(pack_codes(vecs[7]), 5, 384))
+    rows, dists = index.search_packed(query["codes"], query["k"])
+    frame = decode_results(encode_results(rows, dists, 0, index.vector_dim, docs=[[index.metadata[int(r)] for r in rows[0]]]))
+    hits = [make_hit(doc, 1.0 - float(d) / frame["vector_dim"]) for doc, d in zip(frame["docs"][0], frame["distances"][0])]
+    assert hits == index.search(vecs[7], k=5)
+def test_out_of_range_k_is_rejected_not_truncated():
+    code = np.zeros(48, dtype=np.uint8)
+    assert decode_query(encode_query(code, MAX_K, 384))["k"] == MAX_K
+    with pytest.raises(WireError, match="k=65536"):
+        encode_query(code, MAX_K + 1, 384)
+    with pytest.raises(WireError, match="k=-1"):
+        encode_query(code, -1, 384)
+    with pytest.raises(WireError, match="queries"):
+        encode_query(np.zeros((MAX_QUERIES + 1, 48), dtype=np.uint8), 10, 384)